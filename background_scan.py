@@ -0,0 +1,201 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from collections import deque
+from queue import Empty, Queue
+from typing import Dict, List, Optional, Tuple
+from tm_trees import TMTree, FileSystemTree
+from fs_scanner import FileSystemScanner, new_file_system_tree
+
+# Seconds between two polls of a BackgroundScan by the visualiser when none
+# is given.
+DEFAULT_POLL_INTERVAL = 0.1
+
+# The largest number of seconds a poll spends adding listings to the tree.
+# The rest are left for the next poll, so the visualiser stays responsive
+# while the scan is far ahead of it.
+POLL_BUDGET = 0.02
+
+# A change found by a poll, as for FileSystemWatcher: 'created', together
+# with the tree that was added.
+Change = Tuple[str, FileSystemTree]
+
+
+class BackgroundScan:
+    """A scan of a folder that runs in a background thread, and whose
+    results are added to a FileSystemTree a few folders at a time.
+
+    The worker thread reads the folders breadth-first, so that the top
+    levels of the tree are known first, and queues their listings. They
+    are only added to the tree by poll, which is meant to be called by the
+    thread that owns the tree, e.g. by the visualiser in place of a
+    FileSystemWatcher.
+
+    The folders are listed by a FileSystemScanner, so each one is read
+    once, through the first path to it, and the entries the scanner prunes
+    are left out.
+
+    Until the scan is done, the size of each folder is provisional: it is
+    the total size of the files below it that were added so far, and a
+    folder that was not listed yet has no subtrees and a size of 0.
+
+    === Public Attributes ===
+    tree:
+        The tree the results of the scan are added to.
+    path:
+        The path of the folder that is scanned.
+    interval:
+        The number of seconds between two polls by the visualiser.
+
+    === Private Attributes ===
+    _unlisted:
+        The trees of the folders whose listing was not added yet, by path.
+    _listed:
+        The number of folders whose listing was added to the tree.
+    _files:
+        The number of files added to the tree.
+    _listings:
+        The listings read by the worker thread and not polled yet, with
+        the path of their folder.
+    _scanner:
+        The scanner that lists the folders.
+    _thread:
+        The worker thread.
+
+    === Representation Invariants ===
+    - interval > 0
+    """
+
+    tree: FileSystemTree
+    path: str
+    interval: float
+    _unlisted: Dict[str, FileSystemTree]
+    _listed: int
+    _files: int
+    _listings: Queue
+    _scanner: FileSystemScanner
+    _thread: threading.Thread
+
+    def __init__(self, path: str,
+                 interval: float = DEFAULT_POLL_INTERVAL,
+                 scanner: Optional[FileSystemScanner] = None) -> None:
+        """Initialize a new scan of the folder at <path>, polled every
+        <interval> seconds by the visualiser, and start its worker thread.
+
+        List the folders with <scanner> if it is given, or with a
+        FileSystemScanner with the default settings otherwise. It must not
+        be used by anything else until the scan is done.
+
+        Precondition: <path> is the path of a folder on this computer.
+        """
+        self.tree = new_file_system_tree(os.path.basename(path), [], 0)
+        self.path = path
+        self.interval = interval
+        self._unlisted = {path: self.tree}
+        self._listed = 0
+        self._files = 0
+        self._listings = Queue()
+        if scanner is None:
+            scanner = FileSystemScanner()
+        self._scanner = scanner
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def poll(self, budget: float = POLL_BUDGET) -> List[Change]:
+        """Add the folder listings read since the last poll to the tree, for
+        at most about <budget> seconds, and return the trees created.
+
+        Every folder added has a size of 0 until its own listing is added,
+        and every file added has its size added to its ancestors.
+
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as path:
+        ...     os.mkdir(os.path.join(path, 'src'))
+        ...     os.symlink('..', os.path.join(path, 'src', 'up'))
+        ...     with open(os.path.join(path, 'src', 'a.py'), 'w') as file:
+        ...         _ = file.write('a' * 10)
+        ...     scan = BackgroundScan(path)
+        ...     scan.wait()
+        ...     created = [subtree._name for _, subtree in scan.poll()]
+        ...     expected = FileSystemScanner().scan(path).data_size
+        >>> created, scan.tree.data_size == expected == 10
+        (['src', 'a.py'], True)
+        """
+        changes = []
+        deadline = time.perf_counter() + budget
+        while time.perf_counter() < deadline:
+            try:
+                path, entries = self._listings.get_nowait()
+            except Empty:
+                break
+            folder = self._unlisted.pop(path)
+            self._listed += 1
+            size = 0
+            for name, is_dir, entry_size in entries:
+                subtree = new_file_system_tree(name, [], entry_size)
+                subtree._parent_tree = folder
+                folder._subtrees.append(subtree)
+                if is_dir:
+                    self._unlisted[os.path.join(path, name)] = subtree
+                else:
+                    self._files += 1
+                    size += entry_size
+                changes.append(('created', subtree))
+            folder._add_to_size(size)
+        return changes
+
+    def is_done(self) -> bool:
+        """Return whether every folder was read and added to the tree, so
+        that the sizes in the tree are final.
+        """
+        return not self._unlisted and not self._thread.is_alive()
+
+    def status(self) -> str:
+        """Return a short description of the progress of the scan for the
+        text display, or '' if it is done.
+
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as path:
+        ...     scan = BackgroundScan(path)
+        ...     scan.wait()
+        ...     scan.status() != '', scan.poll(), scan.status()
+        (True, [], '')
+        """
+        if self.is_done():
+            return ''
+        return 'scanning: {} of {} folders, {} files'.format(
+            self._listed, self._listed + len(self._unlisted), self._files)
+
+    def wait(self) -> None:
+        """Wait until the worker thread has read every folder.
+        """
+        self._thread.join()
+
+    def is_attached(self, tree: TMTree) -> bool:
+        """Return True, since polls never remove a tree.
+        """
+        return True
+
+    def _run(self) -> None:
+        """Read every folder below the scanned folder, breadth-first, and
+        queue their listings.
+        """
+        self._scanner.begin(self.path)
+        pending = deque([self.path])
+        while pending:
+            path = pending.popleft()
+            entries = self._scanner.list_folder(path)
+            self._listings.put((path, entries))
+            pending.extend(os.path.join(path, name)
+                           for name, is_dir, _ in entries if is_dir)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'os', 'threading', 'time', 'collections',
+            'queue', 'tm_trees', 'fs_scanner', '__future__'
+        ]
+    })
@@ -0,0 +1,986 @@
+"""Benchmarks for the treemap code.
+
+Run this module as a script to run every benchmark, or pass the name of a
+single benchmark, e.g.:
+
+    python benchmarks.py scan
+
+The benchmark suite times every hot path of tm_trees and papers on
+deterministic synthetic trees, and can save its results as JSON and compare
+them with a saved baseline, flagging every case that got slower:
+
+    python benchmarks.py suite baseline.json
+    python benchmarks.py compare baseline.json [current.json]
+
+compare runs the suite again if no current results are given, and exits
+with status 1 if there is a regression.
+"""
+from __future__ import annotations
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+import papers
+from tm_trees import TMTree, FileSystemTree
+from fs_scanner import FileSystemScanner, scan_file_system, \
+    new_file_system_tree
+from scan_index import ScanIndex
+from compact_tree import CompactTreeStore, NO_NODE, compact_copy
+from layouts import LAYOUT_ENGINES
+from spatial_index import SpatialIndex
+from snapshot import load_snapshot, save_snapshot
+from lazy_fs import LazyFileSystemTree
+from background_scan import BackgroundScan
+from du_import import import_dump
+
+
+def make_directory_tree(root: str, depth: int, fan_out: int,
+                        files_per_dir: int, file_size: int = 16) -> int:
+    """Create a synthetic directory tree below the existing folder <root>
+    and return the number of files created.
+
+    Every folder down to <depth> levels below <root> has <fan_out>
+    subfolders and <files_per_dir> files of <file_size> bytes each.
+    """
+    count = 0
+    for i in range(files_per_dir):
+        with open(os.path.join(root, 'file{}.dat'.format(i)), 'wb') as file:
+            file.write(b'x' * file_size)
+        count += 1
+    if depth > 0:
+        for i in range(fan_out):
+            folder = os.path.join(root, 'dir{}'.format(i))
+            os.mkdir(folder)
+            count += make_directory_tree(folder, depth - 1, fan_out,
+                                         files_per_dir, file_size)
+    return count
+
+
+def same_tree(tree1: Optional[TMTree], tree2: Optional[TMTree]) -> bool:
+    """Return True iff <tree1> and <tree2> have the same names, data sizes
+    and shape, with subtrees in the same order.
+    """
+    if tree1 is None or tree2 is None:
+        return tree1 is tree2
+    if tree1._name != tree2._name or tree1.data_size != tree2.data_size \
+            or len(tree1._subtrees) != len(tree2._subtrees):
+        return False
+    for sub1, sub2 in zip(tree1._subtrees, tree2._subtrees):
+        if not same_tree(sub1, sub2):
+            return False
+    return True
+
+
+def best_time(function: Callable[[], object],
+              repeat: int = 3) -> Tuple[float, object]:
+    """Call <function> <repeat> times and return the fastest time in seconds
+    together with the value returned by the last call.
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_scan(depth: int = 4, fan_out: int = 8,
+               files_per_dir: int = 20) -> None:
+    """Compare the recursive FileSystemTree constructor with the scandir
+    scanner on a synthetic directory tree, with several thread counts, and
+    then with several worker process counts.
+    """
+    with tempfile.TemporaryDirectory() as root:
+        files = make_directory_tree(root, depth, fan_out, files_per_dir)
+        print('scan: {} files, depth {}, fan-out {}'.format(
+            files, depth, fan_out))
+        base, expected = best_time(lambda: FileSystemTree(root))
+        print('  {:<24}{:>9.3f}s'.format('FileSystemTree', base))
+        for workers in (1, 4, 16):
+            seconds, tree = best_time(
+                lambda: scan_file_system(root, workers))
+            assert same_tree(expected, tree)
+            print('  {:<24}{:>9.3f}s  x{:.2f}'.format(
+                'scan_file_system({})'.format(workers), seconds,
+                base / seconds))
+        for processes in (2, 4):
+            seconds, tree = best_time(
+                lambda: scan_file_system(root, processes=processes))
+            assert same_tree(expected, tree)
+            print('  {:<24}{:>9.3f}s  x{:.2f}'.format(
+                '{} processes'.format(processes), seconds, base / seconds))
+
+
+def bench_prune(depth: int = 4, fan_out: int = 8,
+                files_per_dir: int = 20) -> None:
+    """Compare a full scan of a synthetic directory tree with scans pruned
+    by an exclusion rule, by a maximum depth and by a minimum size.
+    """
+    with tempfile.TemporaryDirectory() as root:
+        files = make_directory_tree(root, depth, fan_out, files_per_dir)
+        print('prune: {} files, depth {}, fan-out {}'.format(
+            files, depth, fan_out))
+        base, expected = best_time(lambda: scan_file_system(root), 1)
+        print('  {:<32}{:>9.3f}s'.format('full scan', base))
+        cases = [("exclude=['dir[1-7]']", {'exclude': ['dir[1-7]']}),
+                 ('max_depth=1', {'max_depth': 1}),
+                 ('max_depth=1, aggregate', {'max_depth': 1,
+                                             'aggregate': True}),
+                 ('min_size=160, aggregate', {'min_size': 160,
+                                              'aggregate': True})]
+        for name, settings in cases:
+            scanner = FileSystemScanner(**settings)
+            seconds, tree = best_time(lambda: scanner.scan(root), 1)
+            print('  {:<32}{:>9.3f}s  x{:.2f}  ({:.1%} of the size)'.format(
+                name, seconds, base / seconds,
+                tree.data_size / expected.data_size))
+
+
+def bench_rescan(depth: int = 4, fan_out: int = 8,
+                 files_per_dir: int = 20) -> None:
+    """Compare a full scan with an indexed rescan of a synthetic directory
+    tree in which a single folder has changed.
+    """
+    with tempfile.TemporaryDirectory() as root, \
+            tempfile.TemporaryDirectory() as index_dir:
+        files = make_directory_tree(root, depth, fan_out, files_per_dir)
+        index = ScanIndex(os.path.join(index_dir, 'scan_index.json'))
+        scanner = FileSystemScanner(index=index)
+        print('rescan: {} files, depth {}, fan-out {}'.format(
+            files, depth, fan_out))
+        full, _ = best_time(lambda: scan_file_system(root), 1)
+        print('  {:<24}{:>9.3f}s'.format('full scan', full))
+        first, _ = best_time(lambda: scanner.scan(root), 1)
+        print('  {:<24}{:>9.3f}s'.format('indexed, cold', first))
+        with open(os.path.join(root, 'dir0', 'new.dat'), 'wb') as file:
+            file.write(b'x')
+        seconds, tree = best_time(lambda: scanner.scan(root), 1)
+        assert same_tree(FileSystemTree(root), tree)
+        print('  {:<24}{:>9.3f}s  x{:.2f}  ({} reused, {} read)'.format(
+            'indexed, 1 change', seconds, full / seconds, index.hits,
+            index.misses))
+
+
+def bench_lazy(depth: int = 4, fan_out: int = 8,
+               files_per_dir: int = 20) -> None:
+    """Compare the time to the first layout of a full scan of a synthetic
+    directory tree with that of a LazyFileSystemTree, and time how long the
+    lazy tree takes to get the final sizes of its folders.
+    """
+    rect = (0, 0, 1024, 768)
+    with tempfile.TemporaryDirectory() as root:
+        files = make_directory_tree(root, depth, fan_out, files_per_dir)
+        print('lazy: {} files, depth {}, fan-out {}'.format(
+            files, depth, fan_out))
+        expected = FileSystemTree(root)
+
+        def full() -> None:
+            """Scan the whole tree and lay it out."""
+            scan_file_system(root).update_rectangles(rect)
+
+        def lazy() -> LazyFileSystemTree:
+            """List the top level and lay it out."""
+            tree = LazyFileSystemTree(root)
+            tree.update_rectangles(rect)
+            return tree
+
+        base, _ = best_time(full)
+        print('  {:<24}{:>9.3f}s'.format('full scan + layout', base))
+        seconds, tree = best_time(lazy)
+        print('  {:<24}{:>9.3f}s  x{:.0f}'.format('lazy first frame',
+                                                  seconds, base / seconds))
+        start = time.perf_counter()
+        tree.aggregator.wait()
+        tree.aggregator.poll()
+        print('  {:<24}{:>9.3f}s  (sizes {})'.format(
+            'lazy final sizes', time.perf_counter() - start,
+            'match' if tree.data_size == expected.data_size else 'DIFFER'))
+
+
+def bench_progressive(depth: int = 4, fan_out: int = 8,
+                      files_per_dir: int = 20) -> None:
+    """Compare the time to the first layout of a full scan of a synthetic
+    directory tree with that of a BackgroundScan, polled as the visualiser
+    would, and time the longest poll and the whole scan.
+    """
+    rect = (0, 0, 1024, 768)
+    with tempfile.TemporaryDirectory() as root:
+        files = make_directory_tree(root, depth, fan_out, files_per_dir)
+        print('progressive: {} files, depth {}, fan-out {}'.format(
+            files, depth, fan_out))
+        expected = FileSystemTree(root)
+        base, _ = best_time(lambda: scan_file_system(root)
+                            .update_rectangles(rect))
+        print('  {:<24}{:>9.3f}s'.format('full scan + layout', base))
+
+        start = time.perf_counter()
+        scan = BackgroundScan(root)
+        scan.tree.update_rectangles(rect)
+        first = None
+        worst = 0.0
+        while not scan.is_done():
+            poll_start = time.perf_counter()
+            if scan.poll() and first is None:
+                first = time.perf_counter() - start
+            scan.tree.update_changed_rectangles(rect)
+            worst = max(worst, time.perf_counter() - poll_start)
+            time.sleep(scan.interval)
+        total = time.perf_counter() - start
+        print('  {:<24}{:>9.3f}s'.format('first listing shown', first))
+        print('  {:<24}{:>9.3f}s'.format('longest poll + layout', worst))
+        print('  {:<24}{:>9.3f}s  (sizes {})'.format(
+            'scan done', total,
+            'match' if scan.tree.data_size == expected.data_size
+            else 'DIFFER'))
+
+
+def make_object_tree(fan_out: int, depth: int) -> FileSystemTree:
+    """Return a complete FileSystemTree with <fan_out> subtrees per folder
+    and <depth> levels of folders above the files.
+    """
+    if depth == 0:
+        return new_file_system_tree('file.dat', [], 100)
+    return new_file_system_tree(
+        'dir', [make_object_tree(fan_out, depth - 1)
+                for _ in range(fan_out)])
+
+
+def make_compact_tree(fan_out: int, depth: int) -> CompactTreeStore:
+    """Return a CompactTreeStore with the same tree as
+    make_object_tree(<fan_out>, <depth>).
+    """
+    store = CompactTreeStore(os.sep, ' (file)', ' (folder)')
+    level = [store.add_node(NO_NODE, 'dir' if depth > 0 else 'file.dat',
+                            0 if depth > 0 else 100)]
+    for remaining in range(depth - 1, -1, -1):
+        name = 'dir' if remaining > 0 else 'file.dat'
+        size = 0 if remaining > 0 else 100
+        level = [store.add_node(parent, name, size)
+                 for parent in level for _ in range(fan_out)]
+    store.node(0).update_data_sizes()
+    return store
+
+
+def measure_memory(function: Callable[[], object]) -> Tuple[int, object]:
+    """Return the number of bytes still allocated by <function> once it
+    returns, together with the value it returned.
+    """
+    tracemalloc.start()
+    result = function()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def bench_memory(fan_out: int = 10, depth: int = 5) -> None:
+    """Compare the memory used by a tree of FileSystemTree objects with that
+    of a CompactTreeStore holding the same tree, and the time of the main
+    operations on both.
+    """
+    objects, tree = measure_memory(lambda: make_object_tree(fan_out, depth))
+    compact, store = measure_memory(
+        lambda: make_compact_tree(fan_out, depth))
+    nodes = len(store)
+    print('memory: {} nodes'.format(nodes))
+    print('  {:<24}{:>9.1f}MB  {:>6.0f}B/node'.format(
+        'FileSystemTree', objects / 2 ** 20, objects / nodes))
+    print('  {:<24}{:>9.1f}MB  {:>6.0f}B/node  x{:.1f}'.format(
+        'CompactTreeStore', compact / 2 ** 20, compact / nodes,
+        objects / compact))
+    root = store.node(0)
+    for label, target in (('FileSystemTree', tree), ('CompactTree', root)):
+        target.expand_all()
+        layout, _ = best_time(
+            lambda: target.update_rectangles((0, 0, 1024, 768)))
+        listing, _ = best_time(target.get_rectangles)
+        print('  {:<24}layout {:.3f}s  get_rectangles {:.3f}s'.format(
+            label, layout, listing))
+
+
+def make_wide_tree(leaves: int, seed: int = 0) -> FileSystemTree:
+    """Return a FileSystemTree with a single folder of <leaves> files of
+    random sizes.
+    """
+    rng = random.Random(seed)
+    return new_file_system_tree(
+        'wide', [new_file_system_tree('file', [], rng.randint(1, 10000))
+                 for _ in range(leaves)])
+
+
+def make_deep_tree(depth: int, fan_out: int = 3,
+                   seed: int = 0) -> FileSystemTree:
+    """Return a FileSystemTree with <depth> levels of folders, in which each
+    folder has <fan_out> - 1 files and one subfolder.
+    """
+    rng = random.Random(seed)
+    tree = new_file_system_tree('file', [], rng.randint(1, 10000))
+    for _ in range(depth):
+        files = [new_file_system_tree('file', [], rng.randint(1, 10000))
+                 for _ in range(fan_out - 1)]
+        tree = new_file_system_tree('dir', files + [tree])
+    return tree
+
+
+def make_skewed_tree(leaves: int, fan_out: int = 50, exponent: float = 1.2,
+                     seed: int = 0) -> FileSystemTree:
+    """Return a FileSystemTree with <leaves> files in folders of <fan_out>
+    subtrees each, whose sizes follow a Zipf distribution with <exponent>.
+    """
+    rng = random.Random(seed)
+    level = [new_file_system_tree(
+        'file', [], int(10 ** 6 / rng.randint(1, leaves) ** exponent) + 1)
+        for _ in range(leaves)]
+    while len(level) > 1:
+        level = [new_file_system_tree('dir', level[i:i + fan_out])
+                 for i in range(0, len(level), fan_out)]
+    return level[0]
+
+
+def make_balanced_tree(fan_out: int, depth: int,
+                       seed: int = 0) -> FileSystemTree:
+    """Return a complete FileSystemTree with <fan_out> subtrees per folder
+    and <depth> levels of folders above files of random sizes.
+    """
+    rng = random.Random(seed)
+    level = [new_file_system_tree('file', [], rng.randint(1, 10000))
+             for _ in range(fan_out ** depth)]
+    while len(level) > 1:
+        level = [new_file_system_tree('dir', level[i:i + fan_out])
+                 for i in range(0, len(level), fan_out)]
+    return level[0]
+
+
+def write_papers_csv(path: str, rows: int, seed: int = 0) -> None:
+    """Write a synthetic papers dataset with <rows> papers to <path>, in the
+    format of papers.DATA_FILE.
+
+    Papers are spread over 10 years and a fixed hierarchy of categories up
+    to three levels deep, and have Zipf-distributed citation counts.
+    """
+    rng = random.Random(seed)
+    categories = []
+    for i in range(8):
+        for j in range(5):
+            for k in range(4):
+                names = ['Topic{}'.format(i), 'Area{}'.format(j),
+                         'Field{}'.format(k)]
+                categories.append(':'.join(names[:rng.randint(1, 3)]))
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Author', 'Title', 'Year', 'Category', 'Url',
+                         'Citations'])
+        for row in range(rows):
+            writer.writerow([
+                'Author {}, Author {}'.format(rng.randint(0, rows),
+                                              rng.randint(0, rows)),
+                'Paper {}'.format(row), 2000 + rng.randint(0, 9),
+                rng.choice(categories),
+                'https://doi.org/10.0000/{}'.format(row),
+                int(1000 / rng.randint(1, 1000)) + rng.randint(0, 3)])
+
+
+def aspect_ratios(tree: TMTree) -> Tuple[float, float]:
+    """Return the mean aspect ratio (longer side over shorter side) of the
+    leaves of <tree> that are at least one pixel wide and high, and the
+    fraction of all leaves that are slivers at most one pixel wide or high.
+    """
+    ratios = []
+    leaves = 0
+    slivers = 0
+    stack = [tree]
+    while stack:
+        current = stack.pop()
+        if current._subtrees != []:
+            stack.extend(current._subtrees)
+            continue
+        leaves += 1
+        _, _, width, height = current.rect
+        if min(width, height) <= 1:
+            slivers += 1
+        if min(width, height) >= 1:
+            ratios.append(max(width, height) / min(width, height))
+    mean = sum(ratios) / len(ratios) if ratios else float('inf')
+    return mean, slivers / leaves
+
+
+def bench_layout(width: int = 1024, height: int = 768) -> None:
+    """Compare the time and the aspect ratios of each layout engine on wide,
+    deep and skewed synthetic trees.
+    """
+    trees = (('wide', make_wide_tree(20000)), ('deep', make_deep_tree(400)),
+             ('skewed', make_skewed_tree(20000)))
+    print('layout: {}x{}'.format(width, height))
+    for tree_name, tree in trees:
+        for engine_name, engine in LAYOUT_ENGINES.items():
+            seconds, _ = best_time(
+                lambda: tree.update_rectangles((0, 0, width, height),
+                                               engine))
+            mean, slivers = aspect_ratios(tree)
+            print('  {:<8}{:<16}{:>8.3f}s  mean aspect {:>8.2f}  '
+                  'slivers {:>6.1%}'.format(tree_name, engine_name, seconds,
+                                            mean, slivers))
+
+
+def bench_relayout(leaves: int = 1000000) -> None:
+    """Compare a full update of the data sizes and rectangles with an
+    update of the changed rectangles only, after resizing one leaf as the
+    UP key does in the visualiser.
+    """
+    tree = make_skewed_tree(leaves)
+    rect = (0, 0, 1024, 768)
+    tree.update_rectangles(rect)
+    leaf = tree
+    while leaf._subtrees != []:
+        leaf = leaf._subtrees[len(leaf._subtrees) // 2]
+    print('relayout: {} leaves'.format(leaves))
+
+    def full() -> None:
+        """Resize the leaf and update the whole tree."""
+        leaf.change_size(0.01)
+        tree.update_data_sizes()
+        tree.update_rectangles(rect)
+
+    def changed() -> None:
+        """Resize the leaf and update what changed."""
+        leaf.change_size(0.01)
+        tree.update_changed_rectangles(rect)
+
+    for label, function in (('full', full), ('changed only', changed)):
+        seconds, _ = best_time(function)
+        print('  {:<24}{:>9.4f}s'.format(label, seconds))
+
+
+def bench_hit_test(leaves: int = 100000, lookups: int = 2000) -> None:
+    """Compare TMTree.get_tree_at_position with a SpatialIndex lookup at
+    random positions of a fully expanded skewed tree, and report the time
+    it takes to build the index.
+    """
+    tree = make_skewed_tree(leaves)
+    tree.update_rectangles((0, 0, 1024, 768))
+    tree.expand_all()
+    rng = random.Random(0)
+    positions = [(rng.randint(0, 1024), rng.randint(0, 768))
+                 for _ in range(lookups)]
+    print('hit test: {} leaves, {} lookups'.format(leaves, lookups))
+    build, index = best_time(lambda: SpatialIndex(tree))
+    base, expected = best_time(
+        lambda: [tree.get_tree_at_position(pos) for pos in positions])
+    seconds, found = best_time(
+        lambda: [index.get_tree_at_position(pos) for pos in positions])
+    assert all(a is b for a, b in zip(expected, found))
+    print('  {:<24}{:>9.3f}s'.format('build index', build))
+    print('  {:<24}{:>9.2f}us'.format('tree', base / lookups * 10 ** 6))
+    print('  {:<24}{:>9.2f}us  x{:.1f}'.format(
+        'index', seconds / lookups * 10 ** 6, base / seconds))
+
+
+def bench_render(leaves: int = 100000, frames: int = 100) -> None:
+    """Compare the frame time of render_display, which redraws every
+    rectangle, with that of a TreemapRenderer, while the mouse moves over a
+    fully expanded skewed tree and while nothing changes.
+    """
+    # draw off-screen when there is no display
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    import treemap_visualiser
+    pygame.init()
+    screen = pygame.display.set_mode((treemap_visualiser.WIDTH,
+                                      treemap_visualiser.HEIGHT))
+    tree = make_skewed_tree(leaves)
+    tree.update_rectangles((0, 0, treemap_visualiser.WIDTH,
+                            treemap_visualiser.TREEMAP_HEIGHT))
+    tree.expand_all()
+    rng = random.Random(0)
+    hovered = [rng.choice(tree.get_displayed_leaves()) for _ in range(frames)]
+    selected = hovered[0]
+    print('render: {} leaves, {} frames'.format(leaves, frames))
+
+    def full() -> None:
+        """Draw every frame with render_display."""
+        for hover_node in hovered:
+            treemap_visualiser.render_display(screen, tree, selected,
+                                              hover_node)
+
+    renderer = treemap_visualiser.TreemapRenderer(screen)
+    renderer.render(tree, selected, None)
+
+    def moving() -> None:
+        """Draw every frame with the renderer."""
+        for hover_node in hovered:
+            renderer.render(tree, selected, hover_node)
+
+    def idle() -> None:
+        """Draw the same frame again with the renderer."""
+        for _ in hovered:
+            renderer.render(tree, selected, hovered[-1])
+
+    def relayout() -> None:
+        """Draw every frame after a change to the tree."""
+        for hover_node in hovered[:10]:
+            renderer.invalidate()
+            renderer.render(tree, selected, hover_node)
+
+    base, _ = best_time(full, 1)
+    print('  {:<24}{:>9.3f}ms'.format('render_display',
+                                      base / frames * 1000))
+    for label, function, count in (('renderer, mouse moves', moving, frames),
+                                   ('renderer, idle', idle, frames),
+                                   ('renderer, invalidated', relayout, 10)):
+        seconds, _ = best_time(function, 1)
+        print('  {:<24}{:>9.3f}ms  x{:.1f}'.format(
+            label, seconds / count * 1000, base / frames / (seconds / count)))
+    pygame.quit()
+
+
+def bench_detail(leaves: int = 200000, width: int = 1024,
+                 height: int = 768) -> None:
+    """Compare the time taken by get_rectangles and the number of
+    rectangles it returns at several levels of detail, on a fully expanded
+    skewed tree.
+    """
+    tree = make_skewed_tree(leaves)
+    tree.update_rectangles((0, 0, width, height))
+    tree.expand_all()
+    print('detail: {} leaves, {}x{}'.format(leaves, width, height))
+    base, _ = best_time(tree.get_rectangles)
+    for min_size in (0, 1, 2, 4, 8):
+        seconds, rectangles = best_time(lambda: tree.get_rectangles(min_size))
+        print('  min_size {:<15}{:>9.3f}s  x{:<6.1f}{:>8} rectangles'.format(
+            min_size, seconds, base / seconds, len(rectangles)))
+
+
+def bench_fill(width: int = 1024, height: int = 768) -> None:
+    """Compare drawing every rectangle of get_rectangles with
+    pygame.draw.rect with exporting them with get_rectangle_arrays and
+    drawing them with fill_rectangles, for fully expanded skewed trees of
+    10K, 100K and 1M leaves, stored as TMTree objects and as CompactTrees.
+    """
+    import pygame
+    from surface_fill import fill_rectangles
+    surface = pygame.Surface((width, height), depth=32)
+    print('fill: {}x{}'.format(width, height))
+    for leaves in (10000, 100000, 1000000):
+        tree = make_skewed_tree(leaves)
+        compact = compact_copy(tree)
+        for label, target in (('TMTree', tree), ('CompactTree', compact)):
+            target.update_rectangles((0, 0, width, height))
+            target.expand_all()
+
+            def draw() -> None:
+                """Draw the rectangles one at a time."""
+                for rect, colour in target.get_rectangles():
+                    pygame.draw.rect(surface, colour, rect)
+
+            listing, _ = best_time(target.get_rectangles, 1)
+            drawing, _ = best_time(draw, 1)
+            export, arrays = best_time(target.get_rectangle_arrays, 1)
+            filling, _ = best_time(lambda: fill_rectangles(surface, arrays),
+                                   1)
+            print('  {:>8} {:<12} get_rectangles {:.3f}s + draw {:.3f}s  '
+                  'arrays {:.3f}s + fill {:.3f}s  x{:.1f}'.format(
+                      leaves, label, listing, drawing - listing, export,
+                      filling, drawing / (export + filling)))
+
+
+def bench_papers(sizes: Tuple[int, ...] = (10000, 100000, 1000000)) -> None:
+    """Time reading synthetic papers datasets of each of <sizes> rows with
+    papers.read_papers, and building the paper tree from them, together
+    with the peak memory each one allocated.
+
+    Reading the rows alone should allocate the same memory whatever the
+    size of the dataset.
+
+    Also time loading each dataset into a papers.PaperTable, building a
+    tree grouped by a new ordering of keys from it, and switching back to
+    a tree it already built.
+    """
+    print('papers:')
+    old_data_file = papers.DATA_FILE
+    with tempfile.TemporaryDirectory() as folder:
+        try:
+            for rows in sizes:
+                papers.DATA_FILE = os.path.join(folder,
+                                                'papers{}.csv'.format(rows))
+                write_papers_csv(papers.DATA_FILE, rows)
+                for label, function in (
+                        ('read_papers', lambda: sum(
+                            1 for _ in papers.read_papers())),
+                        ('PaperTree', lambda: papers.PaperTree(
+                            'CS1', [], all_papers=True))):
+                    seconds, _ = best_time(function, 1)
+                    tracemalloc.start()
+                    function()
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    print('  {:>8} {:<12}{:.3f}s  {:>9.0f} rows/s  peak '
+                          '{:.1f}MB'.format(rows, label, seconds,
+                                             rows / seconds, peak / 2 ** 20))
+                load, table = best_time(papers.PaperTable, 1)
+                table.tree(papers.BY_YEAR)
+                pivot, _ = best_time(
+                    lambda: table.tree(('top_category', 'year')), 1)
+                switch, _ = best_time(lambda: table.tree(papers.BY_YEAR), 1)
+                print('  {:>8} PaperTable  load {:.3f}s  new view {:.3f}s  '
+                      'cached view {:.6f}s'.format(rows, load, pivot,
+                                                   switch))
+        finally:
+            papers.DATA_FILE = old_data_file
+
+
+def bench_snapshot(fan_out: int = 10, depth: int = 6) -> None:
+    """Time saving a CompactTreeStore with <fan_out> subtrees per node and
+    <depth> levels to a snapshot file, opening it again, and laying it out,
+    compared with building the same store.
+    """
+    build, store = best_time(lambda: make_compact_tree(fan_out, depth), 1)
+    print('snapshot: {} nodes'.format(len(store)))
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'tree.snapshot')
+        save, _ = best_time(lambda: save_snapshot(store.node(0), path), 1)
+        load, root = best_time(lambda: load_snapshot(path))
+        layout, _ = best_time(
+            lambda: root.update_rectangles((0, 0, 1024, 768)), 1)
+        print('  build {:.3f}s  save {:.3f}s ({:.1f}MB)  load {:.6f}s  '
+              'first layout {:.3f}s'.format(build, save,
+                                            os.path.getsize(path) / 2 ** 20,
+                                            load, layout))
+        del root
+
+
+def write_dumps(folder: str, depth: int, fan_out: int,
+                files_per_dir: int) -> Tuple[int, Dict[str, str]]:
+    """Write a du, a find and an ncdu dump of the same synthetic directory
+    tree to <folder>, without creating it, and return its number of
+    entries together with the path of each dump, by format.
+
+    The tree has the shape of the one created by make_directory_tree.
+    """
+    paths = {dump_format: os.path.join(folder, dump_format + '.dump')
+             for dump_format in ('du', 'find', 'ncdu')}
+    entries = 0
+    with open(paths['du'], 'w') as du_file, \
+            open(paths['find'], 'w') as find_file, \
+            open(paths['ncdu'], 'w') as ncdu_file:
+        ncdu_file.write('[1, 2, {"progname": "benchmarks"}')
+        # each open folder, with its path and the folders still to visit
+        stack = [('/data', depth, None)]
+        while stack:
+            path, level, children = stack.pop()
+            if children is None:
+                entries += 1
+                find_file.write('d\t4096\t{}\n'.format(path))
+                ncdu_file.write(',\n[{}'.format(json.dumps(
+                    {'name': os.path.basename(path)})))
+                for i in range(files_per_dir):
+                    entries += 1
+                    file_path = '{}/file{}.dat'.format(path, i)
+                    find_file.write('f\t{}\t{}\n'.format(i * 16, file_path))
+                    du_file.write('{}\t{}\n'.format(i * 16, file_path))
+                    ncdu_file.write(',\n{}'.format(json.dumps(
+                        {'name': 'file{}.dat'.format(i), 'asize': i * 16})))
+                children = ['{}/dir{}'.format(path, i)
+                            for i in range(fan_out)] if level > 0 else []
+                children.reverse()
+            if children:
+                stack.append((path, level, children))
+                stack.append((children.pop(), level - 1, None))
+            else:
+                du_file.write('0\t{}\n'.format(path))
+                ncdu_file.write(']')
+        ncdu_file.write(']\n')
+    return entries, paths
+
+
+def bench_import(depth: int = 4, fan_out: int = 8,
+                 files_per_dir: int = 40) -> None:
+    """Time importing generated du, find and ncdu dumps of a synthetic
+    directory tree, in entries and megabytes per second.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        entries, paths = write_dumps(folder, depth, fan_out, files_per_dir)
+        print('import: {} entries, depth {}, fan-out {}'.format(
+            entries, depth, fan_out))
+        expected = None
+        for dump_format, path in paths.items():
+            seconds, tree = best_time(lambda: import_dump(path), 1)
+            if expected is None:
+                expected = tree
+            assert same_tree(expected, tree)
+            print('  {:<8}{:>9.3f}s  {:>9.0f} entries/s  {:>6.1f}MB/s'.format(
+                dump_format, seconds, entries / seconds,
+                os.path.getsize(path) / 2 ** 20 / seconds))
+
+
+# The trees of the benchmark suite, by name, as functions that build them.
+SUITE_TREES: Dict[str, Callable[[], FileSystemTree]] = {
+    'wide': lambda: make_wide_tree(20000),
+    'deep': lambda: make_deep_tree(300),
+    'balanced': lambda: make_balanced_tree(8, 5),
+    'zipf': lambda: make_skewed_tree(20000),
+}
+
+# The numbers of papers in the synthetic datasets of the benchmark suite.
+SUITE_PAPERS = (1000, 10000)
+
+# compare flags a case as a regression when it takes more than this many
+# times as long as in the baseline.
+REGRESSION_THRESHOLD = 1.25
+
+# The version of the format of the files written by save_results.
+RESULTS_VERSION = 1
+
+
+def time_case(function: Callable[..., object], repeat: int = 5,
+              min_time: float = 0.05,
+              setup: Optional[Callable[[], object]] = None) \
+        -> Tuple[float, object]:
+    """Return the best time in seconds of one call to <function>, out of
+    <repeat> runs, together with the value returned by the last call.
+
+    Each run calls <function> as many times as it takes to last at least
+    <min_time> seconds, and the garbage collector is disabled while it
+    runs, so that short cases are timed as reliably as long ones.
+
+    If <setup> is given, each call to <function> is passed a new value
+    returned by <setup>, made before the run starts, so that cases which
+    change their input never see the changes made by an earlier call.
+
+    >>> seconds, result = time_case(lambda items: items.pop(), 1, 0.0,
+    ...                             lambda: [1, 2])
+    >>> result
+    2
+    """
+    calls = 1
+    best = float('inf')
+    result = None
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        runs = 0
+        while runs < repeat:
+            if setup is None:
+                inputs = None
+            else:
+                inputs = [setup() for _ in range(calls)]
+            start = time.perf_counter()
+            if inputs is None:
+                for _ in range(calls):
+                    result = function()
+            else:
+                for value in inputs:
+                    result = function(value)
+            elapsed = time.perf_counter() - start
+            if elapsed < min_time and runs == 0:
+                # too short to time: start again with more calls
+                calls *= 2
+                continue
+            best = min(best, elapsed / calls)
+            runs += 1
+    finally:
+        if enabled:
+            gc.enable()
+    return best, result
+
+
+def run_suite(repeat: int = 5) -> Dict[str, float]:
+    """Run the benchmark suite and return the best time in seconds of each
+    case, out of <repeat> runs with time_case, by name.
+
+    Every operation is timed on each tree of SUITE_TREES, and the papers
+    data is loaded from synthetic datasets of each size in SUITE_PAPERS.
+    The cases that change the shape of a tree run on a new copy of it each
+    time, so that they do not change the tree timed by the other cases.
+    """
+    results = {}
+    rect = (0, 0, 1024, 768)
+    for tree_name, build in SUITE_TREES.items():
+        seconds, tree = time_case(build, repeat)
+        results[tree_name + '/init'] = seconds
+        results[tree_name + '/update_rectangles'], _ = time_case(
+            lambda: tree.update_rectangles(rect), repeat)
+        results[tree_name + '/expand_all'], _ = time_case(tree.expand_all,
+                                                          repeat)
+        results[tree_name + '/get_rectangles'], _ = time_case(
+            tree.get_rectangles, repeat)
+        rng = random.Random(0)
+        positions = [(rng.randint(0, rect[2]), rng.randint(0, rect[3]))
+                     for _ in range(1000)]
+        results[tree_name + '/get_tree_at_position'], _ = time_case(
+            lambda: [tree.get_tree_at_position(pos) for pos in positions],
+            repeat)
+        results[tree_name + '/update_data_sizes'], _ = time_case(
+            tree.update_data_sizes, repeat)
+        results[tree_name + '/move'], _ = time_case(
+            lambda copy: _move_leaves(copy, 100), repeat,
+            setup=lambda: _laid_out(build(), rect))
+        results[tree_name + '/collapse_expand_all'], _ = time_case(
+            lambda: _collapse_leaves(tree, 10), repeat)
+
+    old_data_file = papers.DATA_FILE
+    with tempfile.TemporaryDirectory() as folder:
+        try:
+            for rows in SUITE_PAPERS:
+                papers.DATA_FILE = os.path.join(folder,
+                                                'papers{}.csv'.format(rows))
+                write_papers_csv(papers.DATA_FILE, rows)
+                results['papers{}/load'.format(rows)], _ = time_case(
+                    lambda: papers.PaperTree('CS1', [], all_papers=True),
+                    repeat)
+        finally:
+            papers.DATA_FILE = old_data_file
+    return results
+
+
+def _laid_out(tree: TMTree, rect: Tuple[int, int, int, int]) -> TMTree:
+    """Return <tree>, expanded and laid out in <rect>, as the suite trees
+    are when they are moved.
+    """
+    tree.update_rectangles(rect)
+    tree.expand_all()
+    return tree
+
+
+def _leaves(tree: TMTree) -> List[TMTree]:
+    """Return the leaves of <tree>, in order."""
+    leaves = []
+    stack = [tree]
+    while stack:
+        current = stack.pop()
+        if current._subtrees == []:
+            leaves.append(current)
+        else:
+            stack.extend(reversed(current._subtrees))
+    return leaves
+
+
+def _move_leaves(tree: TMTree, count: int) -> None:
+    """Move <count> leaves of <tree>, evenly spread, to the parent of the
+    last leaf, and then back to their own parent.
+
+    A leaf that is the only subtree of its parent cannot be moved back, so
+    this changes the shape of <tree>.
+    """
+    leaves = _leaves(tree)
+    destination = leaves[-1]._parent_tree
+    for leaf in leaves[::max(1, len(leaves) // count)][:count]:
+        parent = leaf._parent_tree
+        leaf.move(destination)
+        leaf.move(parent)
+
+
+def _collapse_leaves(tree: TMTree, count: int) -> None:
+    """Collapse the whole of <tree> from <count> leaves, evenly spread, with
+    collapse_all, expanding it again with expand_all after each one.
+    """
+    leaves = _leaves(tree)
+    for leaf in leaves[::max(1, len(leaves) // count)][:count]:
+        leaf.collapse_all()
+        tree.expand_all()
+
+
+def save_results(results: Dict[str, float], path: str) -> None:
+    """Save the suite <results> to the JSON file at <path>, together with
+    the version of Python and the machine they were measured on.
+    """
+    with open(path, 'w') as file:
+        json.dump({'version': RESULTS_VERSION,
+                   'python': platform.python_version(),
+                   'machine': platform.machine(),
+                   'results': results}, file, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Dict[str, float]:
+    """Return the suite results saved by save_results at <path>.
+    """
+    with open(path) as file:
+        data = json.load(file)
+    if data.get('version') != RESULTS_VERSION:
+        raise ValueError('{} is not a benchmark results file of version {}'
+                         .format(path, RESULTS_VERSION))
+    return data['results']
+
+
+def compare_results(baseline: Dict[str, float], current: Dict[str, float],
+                    threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Print the change of every case from <baseline> to <current>, and
+    return the names of the cases that take more than <threshold> times as
+    long in <current>.
+
+    Cases that are only in one of the results are listed but not compared.
+
+    >>> compare_results({'a': 1.0, 'b': 2.0}, {'a': 1.5, 'b': 1.0, 'c': 1.0})
+    a                                  1.0000s   1.5000s   x1.50  REGRESSION
+    b                                  2.0000s   1.0000s   x0.50
+    c                                        -   1.0000s
+    ['a']
+    """
+    regressions = []
+    for name in sorted(set(baseline) | set(current)):
+        if name not in baseline or name not in current:
+            print('{:<32}{:>10}{:>10}'.format(
+                name, '{:.4f}s'.format(baseline[name])
+                if name in baseline else '-',
+                '{:.4f}s'.format(current[name]) if name in current else '-'))
+            continue
+        ratio = current[name] / baseline[name] if baseline[name] > 0 \
+            else 1.0
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('{:<32}{:>9.4f}s{:>9.4f}s   x{:.2f}{}'.format(
+            name, baseline[name], current[name], ratio, flag))
+    return regressions
+
+
+def main(args: List[str]) -> int:
+    """Run the benchmarks requested by the command line arguments <args>,
+    as described at the top of this module, and return the exit status.
+    """
+    if args[:1] == ['suite']:
+        results = run_suite()
+        for name, seconds in sorted(results.items()):
+            print('{:<32}{:>9.4f}s'.format(name, seconds))
+        if len(args) > 1:
+            save_results(results, args[1])
+        return 0
+    elif args[:1] == ['compare']:
+        baseline = load_results(args[1])
+        current = load_results(args[2]) if len(args) > 2 else run_suite()
+        regressions = compare_results(baseline, current)
+        print('{} regression(s)'.format(len(regressions)))
+        return 1 if regressions else 0
+    for bench_name in args or list(BENCHMARKS):
+        BENCHMARKS[bench_name]()
+    return 0
+
+
+BENCHMARKS = {
+    'scan': bench_scan,
+    'prune': bench_prune,
+    'rescan': bench_rescan,
+    'lazy': bench_lazy,
+    'progressive': bench_progressive,
+    'memory': bench_memory,
+    'layout': bench_layout,
+    'relayout': bench_relayout,
+    'hit_test': bench_hit_test,
+    'render': bench_render,
+    'detail': bench_detail,
+    'fill': bench_fill,
+    'papers': bench_papers,
+    'snapshot': bench_snapshot,
+    'import': bench_import,
+}
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
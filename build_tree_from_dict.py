@@ -1,6 +1,6 @@
-import csv
 from typing import List, Dict
 from tm_trees import TMTree
+from papers import read_papers
 
 
 import random  # For Task 2
@@ -23,9 +23,6 @@ def _rough(str1: str, dic: Dict) -> None:
             dic[split1[i]].append(split1[i + 1])
         else:
             dic[split1[i]] = [split1[i + 1]]
-    for item in dic:
-        if not isinstance(dic[item], tuple):
-            dic[item] = list(set(dic[item]))
 
 
 def _raw_leave(str1: str, split: list, dic: Dict) -> None:
@@ -39,87 +36,6 @@ def _raw_leave(str1: str, split: list, dic: Dict) -> None:
     dic[paper_name] = (split[0], split[-2], split[-1].strip())
 
 
-def _indexing(lst: list, max_len: int) -> List[tuple]:
-    """
-    Return a list contains tuples. The first item of tuple is
-    starting index and second item is ending index and the third item
-    is a bool. If bool is true, then needs to combine string, otherwise
-    dont do anything
-    >>> lst = [0, 3, 7, 9]
-    >>> _indexing(lst, 13)
-    [(0, 4, True), (4, 7, False), (7, 10, True), (10, 13, False)]
-    >>> lst = [4, 5, 6, 7]
-    >>> _indexing(lst, 13)
-    [(0, 5, False), (4, 6, True), (6, 6, False), (6, 8, True), (8, 13, False)]
-    >>> lst = [4, 5, 6, 12]
-    >>> _indexing(lst, 13)
-    [(0, 5, False), (4, 6, True), (6, 6, False), (6, 13, True), (13, 13, False)]
-    """
-    new_lst = []
-    # does includes endpoint
-    if lst[0] != 0:
-        new_lst.append((0, lst[0]+1, False))
-    for i in range(len(lst)):
-        # quote_pair[i] exists and i % 2,
-        # then quote_pair[i+1] must exists
-        if i % 2 == 0:
-            tup = (lst[i], lst[i+1] + 1, True)
-            new_lst.append(tup)
-        # quote_pair[i] exists and i % 2
-        # then quote_pair[i+1] may or may not exists
-        elif i % 2 != 0:
-            if i < len(lst) - 1:
-                tup = (lst[i] + 1, lst[i+1], False)
-                new_lst.append(tup)
-            elif i == len(lst) - 1:
-                tup = (lst[i] + 1, max_len, False)
-                new_lst.append(tup)
-    return new_lst
-
-def _spliting(str1) -> list:
-    """
-    Given a string of the format from data.csv, split it by ',' and
-    allowed ',' inside each category
-    >>> file = open(DATA_FILE, 'r')
-    >>> a = file.readlines()
-    >>> k = a[1]
-    >>> _spliting(k)
-    ['"Fisher, P. and Hankley, W. and Wallentine, V."', 'Separation of Introductory Programming and Language Instruction', '1973', 'FLP: other: language agnostic approaches', 'http://doi.acm.org/10.1145/800010.808066', '6\\n']
-    >>> _spliting(a[46])
-    ['"Luker, P. A."', '"Never Mind the Language, What About the Paradigm?"', '1989', 'FLP: specific paradigms', 'http://doi.acm.org/10.1145/65293.71442', '8\\n']
-    """
-    split = str1.split(',')
-    quote_pair = []
-    for i in range(len(split)):
-        if split[i][0] == '"':
-            if split[i][-1] != '"':
-                quote_pair.append(i)
-        elif split[i][-1] == '"':
-            quote_pair.append(i)
-        else:
-            pass
-    assert len(quote_pair) % 2 == 0
-    if len(quote_pair) == 0:
-        return split
-    new_lst = []
-    partition = _indexing(quote_pair, len(split))
-    for tup in partition:
-        start, end, boolen = tup
-        # means needs to combine
-        if boolen:
-            str_comb = ''
-            for i in range(start, end):
-                str_comb += split[i] + ','
-            str_comb = str_comb[0:-1]
-            new_lst.append(str_comb)
-        # means no need to combine
-        else:
-            for i in range(start, end):
-                new_lst.append(split[i])
-    assert len(new_lst) <= len(split)
-    return new_lst
-
-
 def _load_papers_to_dict(by_year: bool = True) -> Dict:
     """Return a nested dictionary of the data read from the papers dataset file.
 
@@ -127,23 +43,22 @@ def _load_papers_to_dict(by_year: bool = True) -> Dict:
     the whole tree. Otherwise, ignore years and use categories only.
     """
 
-    # TODO: Implement this helper, or remove it if you do not plan to use it
-
-    file = open(DATA_FILE, 'r')
-    a = file.readlines()
     dic = {}
     # use to store CS1's subtrees
     dic['CS1'] = []
-    for i in range(1, len(a)):
-        my_split = _spliting(a[i])
+    for my_split in read_papers(DATA_FILE):
         # update cs1 subtree
         dic['CS1'].append((my_split[3].split(':'))[0])
         _rough(my_split[3], dic)
         last_catogry = (my_split[3].split(':'))[-1]
         _raw_leave(last_catogry, my_split, dic)
-    file.close()
+    # remove the duplicate subtrees once every paper is read
+    for item in dic:
+        if not isinstance(dic[item], tuple):
+            dic[item] = list(set(dic[item]))
     return dic
 
+
 class Tree:
     """A recursive tree data structure.
 
@@ -0,0 +1,743 @@
+from __future__ import annotations
+import math
+from array import array
+from random import getrandbits
+from typing import Dict, List, Optional, Tuple
+from weakref import WeakValueDictionary
+import numpy as np
+from tm_trees import TMTree, NODE_VISITS
+from layouts import LayoutEngine, SLICE_AND_DICE
+
+# The index used in the link arrays for "no such node".
+NO_NODE = -1
+
+
+class CompactTreeStore:
+    """An array-backed representation of a whole treemappable tree.
+
+    Every node of the tree is identified by an integer index, and its
+    attributes are stored in typed arrays at that index, instead of in one
+    Python object per node. Names (and any extra string fields, such as the
+    authors and doi of a paper) are stored once each in a shared string
+    table. This uses a small fraction of the memory of a tree of TMTree
+    objects, which matters for trees with millions of nodes.
+
+    Use node() to get a CompactTree for a node, which supports the same
+    public methods as TMTree and can be displayed by the treemap visualiser.
+
+    === Public Attributes ===
+    separator:
+        The string used to separate names in a path, as in get_separator.
+    leaf_suffix:
+        The suffix of the path of a leaf, as in get_suffix.
+    internal_suffix:
+        The suffix of the path of a node with subtrees, as in get_suffix.
+
+    === Private Attributes ===
+    _parent:
+        The index of the parent of each node, or NO_NODE for a root.
+    _first_child:
+        The index of the first subtree of each node, or NO_NODE for a leaf.
+    _last_child:
+        The index of the last subtree of each node, or NO_NODE for a leaf.
+    _next_sibling:
+        The index of the next subtree of the parent of each node, or NO_NODE
+        if it is the last one.
+    _size:
+        The data_size of each node.
+    _colour:
+        The colour of each node, packed as 0xRRGGBB.
+    _rect:
+        The rect of each node, as four consecutive (x, y, width, height)
+        values.
+    _expanded:
+        1 if the node is expanded, and 0 otherwise.
+    _name:
+        The index in _strings of the name of each node, or NO_NODE for an
+        empty tree.
+    _fields:
+        For each extra string field (e.g. 'authors'), the index in _strings
+        of the value of that field for each node.
+    _strings:
+        The string table.
+    _string_ids:
+        The index of each string in _strings.
+    _handles:
+        The CompactTree objects that currently exist for this store, by
+        node index.
+
+    === Representation Invariants ===
+    - All the arrays except _rect and those in _fields have one item per
+      node; _rect has four.
+    - The subtrees of a node, in order, are _first_child, then each
+      _next_sibling until NO_NODE, the last of which is _last_child.
+    - The other TMTree representation invariants hold for every node.
+    """
+
+    separator: str
+    leaf_suffix: str
+    internal_suffix: str
+    _parent: array
+    _first_child: array
+    _last_child: array
+    _next_sibling: array
+    _size: array
+    _colour: array
+    _rect: array
+    _expanded: bytearray
+    _name: array
+    _fields: Dict[str, array]
+    _strings: List[str]
+    _string_ids: Dict[str, int]
+    _handles: WeakValueDictionary
+
+    def __init__(self, separator: str, leaf_suffix: str,
+                 internal_suffix: str, fields: Tuple[str, ...] = ()) -> None:
+        """Initialize a new store without any nodes, whose nodes have the
+        extra string <fields>.
+        """
+        self.separator = separator
+        self.leaf_suffix = leaf_suffix
+        self.internal_suffix = internal_suffix
+        self._parent = array('i')
+        self._first_child = array('i')
+        self._last_child = array('i')
+        self._next_sibling = array('i')
+        self._size = array('q')
+        self._colour = array('I')
+        self._rect = array('i')
+        self._expanded = bytearray()
+        self._name = array('i')
+        self._fields = {field: array('i') for field in fields}
+        self._strings = []
+        self._string_ids = {}
+        self._handles = WeakValueDictionary()
+
+    def __len__(self) -> int:
+        """Return the number of nodes in this store.
+        """
+        return len(self._size)
+
+    def add_node(self, parent: int, name: Optional[str], data_size: int = 0,
+                 **fields: str) -> int:
+        """Add a node with the given <name>, <data_size> and extra string
+        <fields> as the last subtree of the node <parent>, or as a root if
+        <parent> is NO_NODE, and return the index of the new node.
+
+        The data_size of internal nodes is not computed here; call
+        update_data_sizes on the root once the tree is complete.
+
+        >>> store = CompactTreeStore('/', ' (file)', ' (folder)')
+        >>> root = store.add_node(NO_NODE, 'root')
+        >>> folder = store.add_node(root, 'src')
+        >>> _ = store.add_node(folder, 'a.py', 5)
+        >>> _ = store.add_node(root, 'b.py', 3)
+        >>> store.node(root).update_data_sizes(), len(store)
+        (8, 4)
+        >>> store.node(2).get_path_string()
+        'root/src/a.py (file)'
+        """
+        if not isinstance(self._size, array):
+            self._make_growable()
+        index = len(self._size)
+        self._parent.append(parent)
+        self._first_child.append(NO_NODE)
+        self._last_child.append(NO_NODE)
+        self._next_sibling.append(NO_NODE)
+        self._size.append(data_size)
+        self._colour.append(getrandbits(24))
+        self._rect.extend((0, 0, 0, 0))
+        self._expanded.append(0)
+        self._name.append(NO_NODE if name is None else self._intern(name))
+        for field, values in self._fields.items():
+            values.append(self._intern(fields.get(field, '')))
+        if parent != NO_NODE:
+            self._append_child(parent, index)
+        return index
+
+    def _make_growable(self) -> None:
+        """Copy the arrays and the string table of this store into new
+        arrays and a new list, so that nodes can be added to it.
+
+        The arrays of a store loaded by snapshot.load_snapshot are views of
+        the mapped snapshot file, which cannot grow.
+        """
+        for name in ('_parent', '_first_child', '_last_child',
+                     '_next_sibling', '_size', '_colour', '_rect', '_name'):
+            old = getattr(self, name)
+            setattr(self, name, array(old.format, old))
+        self._expanded = bytearray(self._expanded)
+        self._fields = {field: array('i', values)
+                        for field, values in self._fields.items()}
+        self._strings = [self._strings[i] for i in range(len(self._strings))]
+        self._string_ids = {string: i for i, string
+                            in enumerate(self._strings)}
+
+    def node(self, index: int) -> CompactTree:
+        """Return the CompactTree for the node <index>.
+
+        The same object is returned for as long as it is in use, so that
+        nodes can be compared with "is" like TMTree objects.
+        """
+        handle = self._handles.get(index)
+        if handle is None:
+            handle = CompactTree(self, index)
+            self._handles[index] = handle
+        return handle
+
+    def field(self, index: int, field: str) -> str:
+        """Return the value of the extra string <field> of the node <index>.
+        """
+        return self._strings[self._fields[field][index]]
+
+    def _intern(self, string: str) -> int:
+        """Return the index of <string> in the string table, adding it if
+        needed.
+        """
+        string_id = self._string_ids.get(string)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(string)
+            self._string_ids[string] = string_id
+        return string_id
+
+    def _append_child(self, parent: int, child: int) -> None:
+        """Link the node <child> as the last subtree of <parent>.
+        """
+        last = self._last_child[parent]
+        if last == NO_NODE:
+            self._first_child[parent] = child
+        else:
+            self._next_sibling[last] = child
+        self._last_child[parent] = child
+        self._next_sibling[child] = NO_NODE
+        self._parent[child] = parent
+
+    def _unlink_child(self, parent: int, child: int) -> None:
+        """Remove the node <child> from the subtrees of <parent>.
+        """
+        previous = NO_NODE
+        current = self._first_child[parent]
+        while current != child:
+            previous = current
+            current = self._next_sibling[current]
+        following = self._next_sibling[child]
+        if previous == NO_NODE:
+            self._first_child[parent] = following
+        else:
+            self._next_sibling[previous] = following
+        if following == NO_NODE:
+            self._last_child[parent] = previous
+        self._next_sibling[child] = NO_NODE
+        self._parent[child] = NO_NODE
+
+    def _children(self, index: int) -> List[int]:
+        """Return the indices of the subtrees of the node <index>, in order.
+        """
+        children = []
+        child = self._first_child[index]
+        while child != NO_NODE:
+            children.append(child)
+            child = self._next_sibling[child]
+        return children
+
+    def _add_to_size(self, index: int, amount: int) -> None:
+        """Add <amount> to the data_size of the node <index> and of each of
+        its ancestors.
+        """
+        visits = -1
+        while index != NO_NODE:
+            self._size[index] += amount
+            index = self._parent[index]
+            visits += 1
+        if NODE_VISITS.enabled:
+            NODE_VISITS.count += visits
+
+    def _preorder(self, index: int) -> List[int]:
+        """Return the indices of the node <index> and of its descendants,
+        with every node before its descendants.
+        """
+        order = []
+        stack = [index]
+        while stack:
+            current = stack.pop()
+            order.append(current)
+            child = self._first_child[current]
+            children = []
+            while child != NO_NODE:
+                children.append(child)
+                child = self._next_sibling[child]
+            children.reverse()
+            stack.extend(children)
+        if NODE_VISITS.enabled:
+            NODE_VISITS.count += len(order) - 1
+        return order
+
+    def _displayed_leaves(self, index: int, min_size: int) -> List[int]:
+        """Return the indices of the leaves in the displayed-tree rooted at
+        the node <index>, in order, as CompactTree.get_displayed_leaves
+        does.
+        """
+        leaves = []
+        stack = [index]
+        rects = self._rect
+        visits = 0
+        while stack:
+            current = stack.pop()
+            if self._name[current] == NO_NODE:
+                continue
+            width, height = rects[4 * current + 2], rects[4 * current + 3]
+            if min_size > 0 and (width == 0 or height == 0):
+                continue
+            elif not self._expanded[current] \
+                    or self._first_child[current] == NO_NODE \
+                    or width < min_size or height < min_size:
+                leaves.append(current)
+            else:
+                children = self._children(current)
+                stack.extend(reversed(children))
+                visits += len(children)
+        if NODE_VISITS.enabled:
+            NODE_VISITS.count += visits
+        return leaves
+
+    def _get_rect(self, index: int) -> Tuple[int, int, int, int]:
+        """Return the rect of the node <index>.
+        """
+        start = 4 * index
+        return tuple(self._rect[start:start + 4])
+
+    def _set_rect(self, index: int, rect: Tuple[int, int, int, int]) -> None:
+        """Set the rect of the node <index> to <rect>.
+        """
+        start = 4 * index
+        rects = self._rect
+        rects[start], rects[start + 1], rects[start + 2], rects[start + 3] = \
+            rect
+
+    def _get_colour(self, index: int) -> Tuple[int, int, int]:
+        """Return the colour of the node <index> as an RGB tuple.
+        """
+        colour = self._colour[index]
+        return colour >> 16, (colour >> 8) & 0xFF, colour & 0xFF
+
+
+class CompactTree:
+    """A node of a CompactTreeStore, with the public interface of TMTree.
+
+    === Private Attributes ===
+    _store:
+        The store this node belongs to.
+    _index:
+        The index of this node in <_store>.
+    """
+
+    __slots__ = ('_store', '_index', '__weakref__')
+    _store: CompactTreeStore
+    _index: int
+
+    def __init__(self, store: CompactTreeStore, index: int) -> None:
+        """Initialize a new CompactTree for the node <index> of <store>.
+
+        Use CompactTreeStore.node instead of calling this directly.
+        """
+        self._store = store
+        self._index = index
+
+    @property
+    def rect(self) -> Tuple[int, int, int, int]:
+        """The pygame rectangle representing this node in the treemap
+        visualization.
+        """
+        return self._store._get_rect(self._index)
+
+    @property
+    def data_size(self) -> int:
+        """The size of the data represented by this tree.
+        """
+        return self._store._size[self._index]
+
+    def is_empty(self) -> bool:
+        """Return True iff this tree is empty.
+        """
+        return self._store._name[self._index] == NO_NODE
+
+    def update_rectangles(self, rect: Tuple[int, int, int, int],
+                          engine: LayoutEngine = SLICE_AND_DICE) -> None:
+        """Update the rectangles in this tree and its descendents using the
+        treemap algorithm to fill the area defined by pygame rectangle <rect>.
+
+        <engine> is the layout algorithm that divides the rectangle of each
+        tree among its subtrees. The rectangles are the same as those
+        computed by TMTree.update_rectangles, and are computed one level of
+        the tree at a time in the same way.
+        """
+        store = self._store
+        sizes = store._size
+        indices, rects = [self._index], [rect]
+        visits = 0
+        while indices != []:
+            parents = []
+            parent_rects = []
+            for index, index_rect in zip(indices, rects):
+                if store._name[index] == NO_NODE:
+                    continue
+                store._set_rect(index, index_rect)
+                if store._first_child[index] != NO_NODE:
+                    parents.append(index)
+                    parent_rects.append(index_rect)
+            children = [store._children(index) for index in parents]
+            indices = [child for group in children for child in group]
+            visits += len(indices)
+            rects = engine.layout_level(
+                parent_rects, [len(group) for group in children],
+                [sizes[child] for child in indices],
+                [sizes[index] for index in parents])
+        if NODE_VISITS.enabled:
+            NODE_VISITS.count += visits
+
+    def update_changed_rectangles(self, rect: Tuple[int, int, int, int],
+                                  engine: LayoutEngine = SLICE_AND_DICE) \
+            -> None:
+        """Update the rectangles in this tree and its descendents.
+
+        A CompactTree does not track changes, so this is the same as
+        update_rectangles.
+        """
+        self.update_rectangles(rect, engine)
+
+    def get_rectangles(self, min_size: int = 0) \
+            -> List[Tuple[Tuple[int, int, int, int], Tuple[int, int, int]]]:
+        """Return a list with tuples for every leaf in the displayed-tree
+        rooted at this tree. Each tuple consists of a tuple that defines the
+        appropriate pygame rectangle to display for a leaf, and the colour
+        to fill it with.
+
+        If <min_size> is positive, subtrees whose rectangle is less than
+        <min_size> pixels wide or high are drawn as a single rectangle, and
+        those whose rectangle is empty are left out, as in
+        TMTree.get_rectangles.
+        """
+        store = self._store
+        return [(store._get_rect(index), store._get_colour(index))
+                for index in store._displayed_leaves(self._index, min_size)
+                if store._size[index] != 0]
+
+    def get_rectangle_arrays(self, min_size: int = 0) -> np.ndarray:
+        """Return the rectangles and colours of get_rectangles(<min_size>)
+        as one contiguous array of shape (n, 7), with one row
+        (x, y, width, height, red, green, blue) per rectangle, in order.
+
+        The rows are gathered from the arrays of the store with NumPy,
+        without creating a tuple for each rectangle.
+        """
+        store = self._store
+        indices = np.array(store._displayed_leaves(self._index, min_size),
+                           dtype=np.int64)
+        indices = indices[np.frombuffer(store._size,
+                                        dtype=np.longlong)[indices] != 0]
+        colours = np.frombuffer(store._colour, dtype=np.uintc)[indices]
+        arrays = np.empty((len(indices), 7), dtype=np.int32)
+        arrays[:, :4] = np.frombuffer(store._rect, dtype=np.intc) \
+            .reshape(-1, 4)[indices]
+        arrays[:, 4] = colours >> 16
+        arrays[:, 5] = (colours >> 8) & 0xFF
+        arrays[:, 6] = colours & 0xFF
+        return arrays
+
+    def get_displayed_leaves(self, min_size: int = 0) -> List[CompactTree]:
+        """Return every leaf in the displayed-tree rooted at this tree, in
+        order, including those whose data_size is 0.
+
+        If <min_size> is positive, stop at subtrees whose rectangle is less
+        than <min_size> pixels wide or high, and leave out those whose
+        rectangle is empty, as get_rectangles does.
+        """
+        store = self._store
+        return [store.node(index)
+                for index in store._displayed_leaves(self._index, min_size)]
+
+    def count_leaves(self) -> int:
+        """Return the number of leaves in this tree, whether they are
+        displayed or not; e.g. the number of leaves absorbed by a subtree
+        that get_rectangles draws as a single rectangle.
+        """
+        store = self._store
+        return sum(1 for index in store._preorder(self._index)
+                   if store._first_child[index] == NO_NODE
+                   and store._name[index] != NO_NODE)
+
+    def get_tree_at_position(self, pos: Tuple[int, int]) \
+            -> Optional[CompactTree]:
+        """Return the leaf in the displayed-tree rooted at this tree whose
+        rectangle contains position <pos>, or None if <pos> is outside of this
+        tree's rectangle.
+
+        If <pos> is on the shared edge between two rectangles, return the
+        tree represented by the rectangle that is closer to the origin.
+        """
+        store = self._store
+        x_in, y_in = pos
+        best = NO_NODE
+        best_key = None
+        stack = [self._index]
+        visits = 0
+        while stack:
+            index = stack.pop()
+            if store._name[index] == NO_NODE:
+                continue
+            x, y, width, height = store._get_rect(index)
+            if x + width < x_in or x_in < x or y + height < y_in or y_in < y:
+                continue
+            if store._expanded[index] \
+                    and store._first_child[index] != NO_NODE:
+                children = store._children(index)
+                stack.extend(reversed(children))
+                visits += len(children)
+                continue
+            # prefer a rectangle with <pos> on its right or bottom edge,
+            # then the one closest to the origin
+            on_far_edge = x_in == x + width or y_in == y + height
+            key = (not on_far_edge, x * x + y * y)
+            if best_key is None or key < best_key:
+                best, best_key = index, key
+        if NODE_VISITS.enabled:
+            NODE_VISITS.count += visits
+        if best == NO_NODE:
+            return None
+        return store.node(best)
+
+    def update_data_sizes(self) -> int:
+        """Update the data_size for this tree and its subtrees, based on the
+        size of their leaves, and return the new size.
+
+        If this tree is a leaf, return its size unchanged.
+        """
+        store = self._store
+        sizes = store._size
+        for index in reversed(store._preorder(self._index)):
+            if store._name[index] == NO_NODE:
+                sizes[index] = 0
+            elif store._first_child[index] != NO_NODE:
+                total = 0
+                child = store._first_child[index]
+                while child != NO_NODE:
+                    total += sizes[child]
+                    child = store._next_sibling[child]
+                sizes[index] = total
+        return sizes[self._index]
+
+    def move(self, destination: CompactTree) -> None:
+        """If this tree is a leaf, and <destination> is not a leaf, move this
+        tree to be the last subtree of <destination>. Otherwise, do nothing.
+
+        The data_size of the old and new ancestors of this tree is updated.
+        """
+        store = self._store
+        index = self._index
+        target = destination._index
+        if destination._store is not store or destination.is_empty() \
+                or store._first_child[target] == NO_NODE \
+                or store._first_child[index] != NO_NODE:
+            return None
+        parent = store._parent[index]
+        if parent == NO_NODE:
+            return None
+        size = store._size[index]
+        store._add_to_size(parent, -size)
+        store._unlink_child(parent, index)
+        if store._first_child[parent] == NO_NODE:
+            store._expanded[parent] = 0
+        store._append_child(target, index)
+        store._add_to_size(target, size)
+        return None
+
+    def change_size(self, factor: float) -> None:
+        """Change the value of this tree's data_size attribute by <factor>.
+
+        Always round up the amount to change, so that it's an int, and
+        some change is made. The data_size of its ancestors is updated too.
+
+        Do nothing if this tree is not a leaf.
+        """
+        store = self._store
+        index = self._index
+        if self.is_empty() or store._first_child[index] != NO_NODE:
+            return None
+        old_size = store._size[index]
+        amount = math.ceil(abs(old_size * factor))
+        if factor < 0:
+            amount = -1 * amount
+        new_size = max(1, old_size + amount)
+        store._add_to_size(index, new_size - old_size)
+        return None
+
+    def expand(self) -> None:
+        """
+        Change expanded to True for this tree
+
+        Do nothing if this tree is a leaf
+        """
+        store = self._store
+        if not self.is_empty() and store._first_child[self._index] != NO_NODE:
+            store._expanded[self._index] = 1
+
+    def expand_all(self) -> None:
+        """
+        Change expanded to True for this tree and all its subtrees
+
+        Do nothing if this tree is a leaf
+        """
+        store = self._store
+        if self.is_empty():
+            return None
+        for index in store._preorder(self._index):
+            if store._first_child[index] != NO_NODE:
+                store._expanded[index] = 1
+        return None
+
+    def collapse(self) -> None:
+        """
+        Change expanded to False for the parent of tree
+
+        Do nothing if the parent is None
+        """
+        parent = self._store._parent[self._index]
+        if not self.is_empty() and parent != NO_NODE:
+            self._collapse_subtree(parent)
+
+    def collapse_all(self) -> None:
+        """
+        Change expanded to False for the parent of tree
+        and all its parent trees' subtrees
+        """
+        if self.is_empty():
+            return None
+        root = self._index
+        while self._store._parent[root] != NO_NODE:
+            root = self._store._parent[root]
+        self._collapse_subtree(root)
+        return None
+
+    def _collapse_subtree(self, index: int) -> None:
+        """
+        Change expanded to False for the node <index> and all its subtrees
+        """
+        expanded = self._store._expanded
+        for descendant in self._store._preorder(index):
+            expanded[descendant] = 0
+
+    def get_path_string(self, final_node: bool = True) -> str:
+        """Return a string representing the path containing this tree
+        and its ancestors, using the separator for this tree between each
+        tree's name. If <final_node>, then add the suffix for the tree.
+        """
+        store = self._store
+        names = []
+        index = self._index
+        while index != NO_NODE:
+            names.append(store._strings[store._name[index]])
+            index = store._parent[index]
+        path_str = store.separator.join(reversed(names))
+        if final_node or store._first_child[self._index] == NO_NODE:
+            path_str += self.get_suffix()
+        return path_str
+
+    def get_separator(self) -> str:
+        """Return the string used to separate names in the string
+        representation of a path from the tree root to this tree.
+        """
+        return self._store.separator
+
+    def get_suffix(self) -> str:
+        """Return the string used at the end of the string representation of
+        a path from the tree root to this tree.
+        """
+        if self._store._first_child[self._index] == NO_NODE:
+            return self._store.leaf_suffix
+        else:
+            return self._store.internal_suffix
+
+
+def compact_copy(tree: TMTree, fields: Tuple[str, ...] = ()) -> CompactTree:
+    """Return a CompactTree with the same structure, names, sizes, colours,
+    rectangles and expanded state as <tree>.
+
+    Each name in <fields> is an extra string field to copy from the
+    attribute of the same name with a leading underscore, e.g. 'authors'
+    for PaperTree._authors.
+
+    The copy behaves like <tree> under the same changes:
+
+    >>> from fs_scanner import new_file_system_tree
+    >>> files = [new_file_system_tree(name, [], size) for name, size
+    ...          in [('a', 5), ('b', 3), ('c', 8), ('d', 1)]]
+    >>> tree = new_file_system_tree('root', [
+    ...     new_file_system_tree('x', files[:2]),
+    ...     new_file_system_tree('y', files[2:])])
+    >>> tree.update_rectangles((0, 0, 60, 40))
+    >>> copy = compact_copy(tree)
+    >>> nodes = [tree, tree._subtrees[0]] + files[:2] \\
+    ...     + [tree._subtrees[1]] + files[2:]
+    >>> copies = [copy._store.node(index) for index in range(len(nodes))]
+    >>> def path_at(root, pos):
+    ...     leaf = root.get_tree_at_position(pos)
+    ...     return None if leaf is None else leaf.get_path_string()
+    >>> def agree():
+    ...     for root in [tree, copy]:
+    ...         root.update_rectangles((0, 0, 60, 40))
+    ...     return (tree.get_rectangles() == copy.get_rectangles()
+    ...             and tree.get_rectangle_arrays().tolist()
+    ...             == copy.get_rectangle_arrays().tolist()
+    ...             and [node.data_size for node in nodes]
+    ...             == [node.data_size for node in copies]
+    ...             and [node.get_path_string() for node in nodes]
+    ...             == [node.get_path_string() for node in copies]
+    ...             and all(path_at(tree, (x, y)) == path_at(copy, (x, y))
+    ...                     for x in range(-1, 62, 3)
+    ...                     for y in range(-1, 42, 3)))
+    >>> agree()
+    True
+    >>> tree.expand_all(); copy.expand_all()
+    >>> agree()
+    True
+    >>> nodes[2].move(nodes[4]); copies[2].move(copies[4])
+    >>> nodes[6].change_size(0.5); copies[6].change_size(0.5)
+    >>> agree(), copy.data_size
+    (True, 18)
+    >>> nodes[3].move(nodes[4]); copies[3].move(copies[4])
+    >>> agree(), copies[1].get_suffix()
+    (True, ' (file)')
+    >>> nodes[5].collapse(); copies[5].collapse()
+    >>> agree(), len(copy.get_rectangles())
+    (True, 1)
+    """
+    leaf = tree
+    while leaf._subtrees != []:
+        leaf = leaf._subtrees[0]
+    internal_suffix = tree.get_suffix() if tree._subtrees != [] else ''
+    store = CompactTreeStore(tree.get_separator(), leaf.get_suffix(),
+                             internal_suffix, fields)
+    stack = [(tree, NO_NODE)]
+    while stack:
+        current, parent = stack.pop()
+        values = {field: getattr(current, '_' + field) for field in fields}
+        index = store.add_node(parent, current._name, current.data_size,
+                               **values)
+        r, g, b = current._colour
+        store._colour[index] = (r << 16) | (g << 8) | b
+        store._set_rect(index, current.rect)
+        store._expanded[index] = current._expanded
+        stack.extend((subtree, index)
+                     for subtree in reversed(current._subtrees))
+    return store.node(0)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'math', 'array', 'random', 'weakref',
+            'numpy', 'tm_trees', 'layouts', '__future__'
+        ]
+    })
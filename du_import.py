@@ -0,0 +1,346 @@
+"""Build FileSystemTrees from disk usage dumps made on another machine,
+without reading the file system they describe.
+
+Three formats are read:
+
+- the output of "du -ab ROOT" (or "du -a ROOT" with a block_size), one
+  "SIZE<TAB>PATH" line per file or folder, each folder after its contents;
+- the output of "find ROOT -printf '%y\\t%s\\t%p\\n'", one
+  "TYPE<TAB>SIZE<TAB>PATH" line per file or folder, each folder before its
+  contents;
+- the JSON export of ncdu ("ncdu -o FILE ROOT"), in which each folder is an
+  array of its own information followed by its entries.
+
+Every importer reads its dump as a stream, one line or one JSON value at a
+time. Besides the tree it builds, it only keeps the entries of the folders
+that are still open, i.e. one list per level of the tree, so a dump of
+any length can be read. As in any TMTree, the data_size of a folder is the
+sum of the sizes of its entries; the sizes the dumps give to folders are
+ignored.
+"""
+from __future__ import annotations
+import json
+from typing import Iterator, List, Optional, TextIO, Tuple
+from tm_trees import TMTree, FileSystemTree
+from fs_scanner import new_file_system_tree
+
+# The number of characters read from an ncdu export at a time.
+CHUNK_SIZE = 1 << 16
+
+# The formats recognised by import_dump.
+DUMP_FORMATS = ('du', 'find', 'ncdu')
+
+# A JSON event of an ncdu export: '[' or ']', with None, or 'value',
+# together with a value that is not an array.
+JsonEvent = Tuple[str, object]
+
+
+def import_dump(path: str,
+                dump_format: Optional[str] = None) -> FileSystemTree:
+    """Return the tree described by the dump at <path>, of <dump_format>,
+    one of DUMP_FORMATS, or of the format guessed from its first line if
+    <dump_format> is None.
+
+    Raise ValueError if the format cannot be guessed, or if the dump is not
+    valid.
+    """
+    if dump_format is None:
+        dump_format = guess_format(path)
+    if dump_format == 'du':
+        return import_du(path)
+    elif dump_format == 'find':
+        return import_find(path)
+    elif dump_format == 'ncdu':
+        return import_ncdu(path)
+    raise ValueError('unknown dump format: {}'.format(dump_format))
+
+
+def guess_format(path: str) -> str:
+    """Return the format of the dump at <path>, one of DUMP_FORMATS, from
+    its first line.
+
+    Raise ValueError if it is in none of them.
+    """
+    with open(path, encoding='utf-8', errors='surrogateescape') as file:
+        line = file.readline()
+    fields = line.split('\t')
+    if line.lstrip().startswith('['):
+        return 'ncdu'
+    elif len(fields) >= 2 and fields[0].isdigit():
+        return 'du'
+    elif len(fields) >= 3 and len(fields[0]) == 1 and fields[1].isdigit():
+        return 'find'
+    raise ValueError('{} is not a du, find or ncdu dump'.format(path))
+
+
+def import_du(path: str, block_size: int = 1) -> FileSystemTree:
+    """Return the tree described by the du output at <path>.
+
+    The sizes in the dump are multiplied by <block_size>: 1 for "du -ab",
+    or 1024 for "du -ak". Without -a, du only lists folders, so the deepest
+    folders would be read as files and the files of the other folders would
+    be missing. A folder without entries cannot be told apart from a file,
+    so it is read as one.
+
+    Raise ValueError if the dump is not valid.
+    """
+    with open(path, encoding='utf-8', errors='surrogateescape') as file:
+        return _read_du(file, block_size)
+
+
+def _read_du(lines: Iterator[str], block_size: int = 1) -> FileSystemTree:
+    """Return the tree described by the du output <lines>.
+
+    du lists every folder after its contents, so the trees built from the
+    lines read so far wait on a stack until their folder's line is read.
+    Only the contents of the folders that are open are ever on it.
+
+    >>> tree = _read_du(['5\\t./a/x\\n', '4\\t./a\\n', '7\\t./y\\n',
+    ...                  '9\\t.\\n'])
+    >>> [(t._name, t.data_size) for t in tree._subtrees], tree.data_size
+    ([('a', 5), ('y', 7)], 12)
+    >>> tree = _read_du(['5\\tdata/a/x\\n', '4\\tdata/a\\n',
+    ...                  '9\\tdata/\\n'])
+    >>> tree._name, [(t._name, t.data_size) for t in tree._subtrees]
+    ('data', [('a', 5)])
+    """
+    # the tree of each file or folder waiting for its folder, with the path
+    # of that folder
+    waiting: List[Tuple[str, FileSystemTree]] = []
+    for line in lines:
+        line = line.rstrip('\n')
+        if line == '':
+            continue
+        size, tab, entry_path = line.partition('\t')
+        if tab == '' or not size.isdigit():
+            raise ValueError('not a du line: {!r}'.format(line))
+        entry_path = _strip_slash(entry_path)
+        parent, name = _split(entry_path)
+        subtrees = []
+        while waiting and waiting[-1][0] == entry_path:
+            subtrees.append(waiting.pop()[1])
+        subtrees.reverse()
+        waiting.append((parent, new_file_system_tree(
+            name, subtrees, int(size) * block_size)))
+    if len(waiting) != 1:
+        raise ValueError('a du dump must have exactly one root, not {}'
+                         .format(len(waiting)))
+    return waiting[0][1]
+
+
+def import_find(path: str) -> FileSystemTree:
+    """Return the tree described by the find output at <path>.
+
+    Symbolic links and other special files are read as files, with the
+    size find gives them. A path with a newline in it cannot be read.
+
+    Raise ValueError if the dump is not valid.
+    """
+    with open(path, encoding='utf-8', errors='surrogateescape') as file:
+        return _read_find(file)
+
+
+def _read_find(lines: Iterator[str]) -> FileSystemTree:
+    """Return the tree described by the find output <lines>.
+
+    find lists every folder before its contents, so the entries of each
+    folder are gathered on a stack of open folders until a line that is
+    not inside it is read.
+
+    >>> tree = _read_find(['d\\t4096\\t.\\n', 'd\\t4096\\t./a\\n',
+    ...                    'f\\t5\\t./a/x\\n', 'f\\t7\\t./y\\n'])
+    >>> [(t._name, t.data_size) for t in tree._subtrees], tree.data_size
+    ([('a', 5), ('y', 7)], 12)
+    """
+    # the path, name and entries of each open folder, outermost first
+    folders: List[Tuple[str, str, List[TMTree]]] = []
+    root = None
+    for line in lines:
+        line = line.rstrip('\n')
+        if line == '':
+            continue
+        fields = line.split('\t', 2)
+        if len(fields) != 3 or not fields[1].isdigit():
+            raise ValueError('not a find line: {!r}'.format(line))
+        kind, size, entry_path = fields
+        entry_path = _strip_slash(entry_path)
+        parent, name = _split(entry_path)
+        while folders and folders[-1][0] != parent:
+            root = _close_folder(folders)
+        if root is not None and not folders:
+            raise ValueError('{} is outside of the root'.format(entry_path))
+        if kind == 'd':
+            folders.append((entry_path, name, []))
+        elif folders:
+            folders[-1][2].append(new_file_system_tree(name, [], int(size)))
+        else:
+            root = new_file_system_tree(name, [], int(size))
+    while folders:
+        root = _close_folder(folders)
+    if root is None:
+        raise ValueError('the find dump is empty')
+    return root
+
+
+def import_ncdu(path: str, disk_usage: bool = False) -> FileSystemTree:
+    """Return the tree described by the ncdu JSON export at <path>.
+
+    The files have their apparent size, or the space they use on disk if
+    <disk_usage> is True.
+
+    Raise ValueError if the export is not valid.
+    """
+    with open(path, encoding='utf-8', errors='surrogateescape') as file:
+        return _read_ncdu(_json_events(file), disk_usage)
+
+
+def _read_ncdu(events: Iterator[JsonEvent],
+               disk_usage: bool = False) -> FileSystemTree:
+    """Return the tree described by the JSON <events> of an ncdu export.
+
+    The export is an array of a format version, metadata and the root
+    folder. Each folder is an array of an object with its own information,
+    followed by an object for each file and an array for each folder in it.
+
+    >>> import io
+    >>> export = '[1, 0, {}, [{"name": "/srv"}, {"name": "y", "asize": 7}, \
+[{"name": "a"}, {"name": "x", "asize": 5}]]]'
+    >>> tree = _read_ncdu(_json_events(io.StringIO(export)))
+    >>> [(t._name, t.data_size) for t in tree._subtrees], tree.data_size
+    ([('y', 7), ('a', 5)], 12)
+    """
+    size_key = 'dsize' if disk_usage else 'asize'
+    # the name and entries of each open folder, outermost first
+    folders: List[Tuple[str, List[TMTree]]] = []
+    depth = 0
+    opened = False
+    root = None
+    for kind, value in events:
+        if kind == '[':
+            depth += 1
+            opened = depth >= 2
+        elif kind == ']':
+            if depth >= 2:
+                if opened:
+                    raise ValueError('a folder without its information')
+                name, subtrees = folders.pop()
+                tree = new_file_system_tree(name, subtrees)
+                if folders:
+                    folders[-1][1].append(tree)
+                else:
+                    root = tree
+            depth -= 1
+        elif depth >= 2:
+            if not isinstance(value, dict) or 'name' not in value:
+                raise ValueError('not an ncdu entry: {!r}'.format(value))
+            if opened:
+                name = value['name']
+                if not folders:
+                    name = _split(_strip_slash(name))[1]
+                folders.append((name, []))
+                opened = False
+            else:
+                folders[-1][1].append(new_file_system_tree(
+                    value['name'], [], int(value.get(size_key, 0))))
+    if root is None or depth != 0:
+        raise ValueError('the ncdu export is incomplete')
+    return root
+
+
+def _json_events(file: TextIO) -> Iterator[JsonEvent]:
+    """Yield the JSON events of the arrays and values in <file>, reading it
+    CHUNK_SIZE characters at a time.
+
+    Arrays are not decoded, but yielded as a '[' event, the events of their
+    items, and a ']' event. Any other value, such as an object, is decoded
+    and yielded as a 'value' event, so objects must be small enough to be
+    read whole.
+
+    >>> import io
+    >>> list(_json_events(io.StringIO('[1, [{"a": [2]}], "b"]')))
+    [('[', None), ('value', 1), ('[', None), ('value', {'a': [2]}), \
+(']', None), ('value', 'b'), (']', None)]
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    at_end = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        char = buffer[position] if position < len(buffer) else ''
+        if char == '[' or char == ']':
+            yield char, None
+            position += 1
+            continue
+        if char != '':
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                end = None
+            # a value that reaches the end of the buffer may be cut short
+            if end is not None and (end < len(buffer) or at_end):
+                yield 'value', value
+                position = end
+                continue
+            if at_end:
+                raise ValueError('invalid JSON at {!r}'.format(
+                    buffer[position:position + 40]))
+        elif at_end:
+            return
+        chunk = file.read(CHUNK_SIZE)
+        at_end = chunk == ''
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def _close_folder(folders: List[Tuple[str, str, List[TMTree]]]) \
+        -> FileSystemTree:
+    """Remove the innermost open folder from <folders>, add its tree to the
+    entries of the folder it is in, if any, and return its tree.
+    """
+    _, name, subtrees = folders.pop()
+    tree = new_file_system_tree(name, subtrees)
+    if folders:
+        folders[-1][2].append(tree)
+    return tree
+
+
+def _strip_slash(path: str) -> str:
+    """Return <path> without its trailing slashes, unless it is the root
+    folder.
+
+    >>> _strip_slash('data/'), _strip_slash('/')
+    ('data', '/')
+    """
+    stripped = path.rstrip('/')
+    return stripped if stripped != '' else path[:1]
+
+
+def _split(path: str) -> Tuple[str, str]:
+    """Return the path of the folder that holds the file or folder at
+    <path>, and its name, which is <path> itself if it is the root folder
+    or '.'.
+
+    This is os.path.split for the paths of a dump, which always use '/',
+    but much faster.
+
+    >>> _split('./a/x'), _split('/a'), _split('.'), _split('/')
+    (('./a', 'x'), ('/', 'a'), ('', '.'), ('/', '/'))
+    """
+    parent, slash, name = path.rpartition('/')
+    if slash != '' and parent == '':
+        parent = '/'
+    return parent, name or path
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'json', 'io', 'tm_trees',
+            'fs_scanner', '__future__'
+        ],
+        'allowed-io': ['guess_format', 'import_du', 'import_find',
+                       'import_ncdu']
+    })
@@ -0,0 +1,672 @@
+from __future__ import annotations
+import fnmatch
+import os
+import re
+import stat
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, \
+    FIRST_COMPLETED, wait
+from typing import Any, Dict, FrozenSet, List, Optional, Pattern, \
+    Sequence, Tuple, Union
+from tm_trees import TMTree, FileSystemTree
+from scan_index import ScanIndex, Entry
+from compact_tree import CompactTree, CompactTreeStore, NO_NODE
+
+# Number of threads used to read directories when none is given. This is the
+# same default that concurrent.futures uses for its thread pools.
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# The number of folders a sharded scan splits the root into for each worker
+# process, so that the processes stay busy when the folders differ in size.
+SHARDS_PER_PROCESS = 4
+
+# A folder scanned by a worker process: the names of it and of every file
+# and folder below it in preorder, the size of each of them (0 for a
+# folder), and the number of entries of each folder, or -1 for a file, as
+# the bytes of an array('q') and an array('i').
+Shard = Tuple[List[str], bytes, bytes]
+
+# The device and inode numbers of a file or folder, which are the same for
+# every path that leads to it.
+FileKey = Tuple[int, int]
+
+# The number of bytes in a block counted by os.stat_result.st_blocks.
+BLOCK_SIZE = 512
+
+# What a worker process needs to scan a shard like the scanner that split
+# the scan: the arguments to create a scanner with the same settings, the
+# device and depth of the root, and the keys of the folders visited by the
+# scanner before the shards were split.
+ShardOptions = Tuple[Dict[str, Any], int, int, FrozenSet[FileKey]]
+
+# The name of the leaf that holds the files of a folder that are smaller
+# than the min_size of an aggregating scanner, given their number.
+SMALL_FILES_NAME = '({} small files)'
+
+
+class FileSystemScanner:
+    """A scanner that builds FileSystemTree objects with os.scandir.
+
+    Each directory is read with a single os.scandir call, and the cached
+    type information of each DirEntry is used instead of separate
+    os.path.isdir calls. Directory reads are spread across a thread pool,
+    so that slow (e.g. network) file systems can serve several of them
+    at once.
+
+    Every folder, and every file with several hard links, is only visited
+    once per scan, through the first path to it that is read, so that
+    symbolic links to folders cannot make a scan loop forever, and bind
+    mounts and hard links are not counted twice. Other paths to them are
+    left out of the tree. Otherwise, the resulting tree has the same shape,
+    names and data_size values as FileSystemTree(path).
+
+    If the scanner has an index, folders that did not change since the
+    previous scan reuse their listing from the index instead of being read
+    again, and the index is saved at the end of every scan.
+
+    If the scanner has several processes and no index, the folders below
+    the root are instead split into shards that are scanned by a pool of
+    worker processes, so that the scan is not limited by the GIL of one
+    process. Each worker sends its shard back as flat arrays, and the
+    trees are created from them by this process. Each worker only knows
+    the folders visited by this process and by itself, so a file with hard
+    links in two shards is counted in both.
+
+    Entries can be pruned while the scan runs. Files and folders matched by
+    an exclusion rule are left out without being read or even stat'ed.
+    Folders more than max_depth levels below the root are not listed, and
+    files smaller than min_size are left out. If the scanner aggregates,
+    such a folder is instead a leaf that holds the total size of the files
+    below it, which are walked without creating a tree for them, and the
+    small files of each folder are one leaf named after SMALL_FILES_NAME.
+
+    FileSystemWatcher, BackgroundScan and LazyFileSystemTree read folders
+    through the begin, list_folder and scan_folder methods of a scanner,
+    so they visit folders once and prune entries in the same way.
+
+    Note that the folders whose listing is reused from the index are not
+    read, so the hard links in them are not recognised, and that an index
+    should only be reused with the same settings.
+
+    === Public Attributes ===
+    workers:
+        The number of threads used to read directories.
+    index:
+        The index of folder listings used to skip unchanged folders, or None
+        if every folder is read.
+    processes:
+        The number of worker processes used to scan shards of the root, or
+        1 to scan it in this process.
+    one_file_system:
+        Whether the files and folders on other file systems than the root
+        are left out, as with "du -x".
+    allocated:
+        Whether the size of a file is the space allocated to it on disk,
+        from st_blocks, instead of its apparent size.
+    exclude:
+        The exclusion rules: glob patterns, which are matched against the
+        name of each file and folder, and compiled regular expressions,
+        which are searched for in its path.
+    max_depth:
+        The number of levels of folders below the root that are listed, or
+        None to list them all.
+    min_size:
+        The size below which files are left out or aggregated.
+    aggregate:
+        Whether the folders below max_depth and the files below min_size
+        are kept as aggregate leaves.
+
+    === Private Attributes ===
+    _device:
+        The device of the root of the current scan.
+    _root_depth:
+        The number of separators in the path of the root of the current
+        scan, without trailing ones.
+    _name_pattern:
+        The glob patterns of <exclude> as one regular expression, or None if
+        there are none.
+    _path_patterns:
+        The regular expressions of <exclude>.
+    _seen:
+        The path through which each folder and hard-linked file was first
+        visited by the current scan, by key.
+    _lock:
+        The lock that the threads hold while they use <_seen>.
+
+    === Representation Invariants ===
+    - workers >= 1
+    - processes >= 1
+    - max_depth is None or max_depth >= 0
+    """
+
+    workers: int
+    index: Optional[ScanIndex]
+    processes: int
+    one_file_system: bool
+    allocated: bool
+    exclude: List[Union[str, Pattern[str]]]
+    max_depth: Optional[int]
+    min_size: int
+    aggregate: bool
+    _device: int
+    _root_depth: int
+    _name_pattern: Optional[Pattern[str]]
+    _path_patterns: List[Pattern[str]]
+    _seen: Dict[FileKey, str]
+    _lock: threading.Lock
+
+    def __init__(self, workers: int = DEFAULT_WORKERS,
+                 index: Optional[ScanIndex] = None,
+                 processes: int = 1, one_file_system: bool = False,
+                 allocated: bool = False,
+                 exclude: Sequence[Union[str, Pattern[str]]] = (),
+                 max_depth: Optional[int] = None, min_size: int = 0,
+                 aggregate: bool = False) -> None:
+        """Initialize a new scanner that reads directories with <workers>
+        threads, and uses <index> to skip unchanged folders if it is given.
+
+        If <processes> is more than 1 and there is no <index>, split each
+        scan into shards scanned by that many worker processes. If
+        <one_file_system> is True, stay on the file system of the root. If
+        <allocated> is True, count the space allocated to files instead of
+        their apparent size.
+
+        Prune the scan with the exclusion rules <exclude>, <max_depth> and
+        <min_size>, keeping aggregate leaves for what is pruned if
+        <aggregate> is True.
+        """
+        self.workers = max(1, workers)
+        self.index = index
+        self.processes = max(1, processes)
+        self.one_file_system = one_file_system
+        self.allocated = allocated
+        self.exclude = list(exclude)
+        self.max_depth = max_depth
+        self.min_size = min_size
+        self.aggregate = aggregate
+        self._device = 0
+        self._root_depth = 0
+        globs = [fnmatch.translate(rule) for rule in exclude
+                 if isinstance(rule, str)]
+        self._name_pattern = re.compile('|'.join(globs)) if globs else None
+        self._path_patterns = [rule for rule in exclude
+                               if not isinstance(rule, str)]
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def scan(self, path: str) -> FileSystemTree:
+        """Return the FileSystemTree for the file or folder at <path>.
+
+        Precondition: <path> is a valid path for this computer.
+        """
+        name = os.path.basename(path)
+        if not os.path.isdir(path):
+            return new_file_system_tree(name, [], self.file_size(path))
+        listings, shards = self._read_tree(path)
+        return self._build(path, name, listings, shards)
+
+    def scan_compact(self, path: str) -> CompactTree:
+        """Return the file structure of the file or folder at <path> as a
+        CompactTree, without creating a FileSystemTree for each entry.
+
+        Precondition: <path> is a valid path for this computer.
+        """
+        store = CompactTreeStore(os.sep, ' (file)', ' (folder)')
+        name = os.path.basename(path)
+        if not os.path.isdir(path):
+            store.add_node(NO_NODE, name, self.file_size(path))
+            return store.node(0)
+        listings, shards = self._read_tree(path)
+        stack = [(path, store.add_node(NO_NODE, name))]
+        while stack:
+            dir_path, parent = stack.pop()
+            for entry_name, is_dir, entry_size in listings[dir_path]:
+                child = os.path.join(dir_path, entry_name)
+                if is_dir and child in shards:
+                    _add_shard(store, parent, shards[child])
+                    continue
+                index = store.add_node(parent, entry_name, entry_size)
+                if is_dir:
+                    stack.append((child, index))
+        root = store.node(0)
+        root.update_data_sizes()
+        return root
+
+    def _read_tree(self, path: str) \
+            -> Tuple[Dict[str, List[Entry]], Dict[str, Shard]]:
+        """Return the listings of the folders at and below <path> that were
+        read by this process, keyed by the path of the folder, and the
+        shards scanned by worker processes, keyed by the path of their root.
+
+        Every folder below <path> is either in the listings or in a shard.
+        """
+        if self.processes == 1 or self.index is not None:
+            return self.read_listings(path), {}
+        self.begin(path)
+        return self._read_sharded(path)
+
+    def _read_sharded(self, path: str) \
+            -> Tuple[Dict[str, List[Entry]], Dict[str, Shard]]:
+        """Return the listings and shards of the folder at <path>, as
+        _read_tree does, using this scanner's worker processes.
+
+        The top levels of the folder are listed by this process, one level
+        at a time, until there are at least SHARDS_PER_PROCESS folders for
+        each worker process on the deepest level. Each of those folders is
+        then scanned as one shard by the pool.
+        """
+        listings = {}
+        frontier = [path]
+        while frontier and len(frontier) < SHARDS_PER_PROCESS * \
+                self.processes:
+            next_level = []
+            for dir_path in frontier:
+                entries = self._read_dir(dir_path)
+                listings[dir_path] = entries
+                next_level.extend(os.path.join(dir_path, name)
+                                  for name, is_dir, _ in entries if is_dir)
+            frontier = next_level
+        if not frontier:
+            return listings, {}
+        seen = frozenset(self._seen)
+        with ProcessPoolExecutor(max_workers=self.processes) as pool:
+            shards = pool.map(_scan_shard, frontier,
+                              [self._options(seen)] * len(frontier))
+            return listings, dict(zip(frontier, shards))
+
+    def _options(self, seen: FrozenSet[FileKey]) -> ShardOptions:
+        """Return the options that a worker process needs to scan a shard
+        like this scanner, with the keys of the folders visited so far,
+        <seen>.
+        """
+        settings = {'workers': self.workers,
+                    'one_file_system': self.one_file_system,
+                    'allocated': self.allocated, 'exclude': self.exclude,
+                    'max_depth': self.max_depth, 'min_size': self.min_size,
+                    'aggregate': self.aggregate}
+        return settings, self._device, self._root_depth, seen
+
+    def read_listings(self, path: str) -> Dict[str, List[Entry]]:
+        """Return the listing of the folder at <path> and of every folder
+        below it, keyed by the path of the folder.
+
+        If this scanner has an index, it is used and then saved.
+        """
+        self.begin(path)
+        if self.index is not None:
+            self.index.begin(path)
+        listings = self._read_all(path)
+        if self.index is not None:
+            self.index.save()
+        return listings
+
+    def _read_all(self, path: str) -> Dict[str, List[Entry]]:
+        """Return the listing of the folder at <path> and of every folder
+        below it, keyed by the path of the folder.
+        """
+        listings = {}
+        if self.workers == 1:
+            pending = [path]
+            while pending:
+                dir_path = pending.pop()
+                entries = self._record(dir_path, self._read(dir_path))
+                listings[dir_path] = entries
+                pending.extend(os.path.join(dir_path, name)
+                               for name, is_dir, _ in entries if is_dir)
+            return listings
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._read, path): path}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dir_path = futures.pop(future)
+                    entries = self._record(dir_path, future.result())
+                    listings[dir_path] = entries
+                    for name, is_dir, _ in entries:
+                        if is_dir:
+                            child = os.path.join(dir_path, name)
+                            futures[pool.submit(self._read, child)] = child
+        return listings
+
+    def _read(self, path: str) -> Tuple[int, List[Entry], bool]:
+        """Return the modification time of the folder at <path>, its
+        entries, and whether they were reused from this scanner's index.
+
+        The modification time is only looked up (and is otherwise 0) if this
+        scanner has an index. A folder reached through the listing of a
+        folder reused from the index is treated as empty if it was already
+        visited through another path.
+        """
+        if self.index is None:
+            return 0, self._read_dir(path), False
+        try:
+            info = os.stat(path)
+        except OSError:
+            return 0, [], False
+        if not self._visit((info.st_dev, info.st_ino), path):
+            return 0, [], False
+        mtime = info.st_mtime_ns
+        entries = self.index.lookup(path, mtime)
+        if entries is not None:
+            return mtime, entries, True
+        return mtime, self._read_dir(path), False
+
+    def begin(self, path: str) -> None:
+        """Start a new scan of the folder at <path>, which no folder or file
+        was visited by yet, except for that folder itself.
+
+        scan and read_listings call this themselves. Code that reads the
+        folder with list_folder and scan_folder instead, e.g. to poll it or
+        to list it lazily, calls it before it reads the folder.
+        """
+        self._seen = {}
+        self._root_depth = path.rstrip(os.sep).count(os.sep)
+        try:
+            info = os.stat(path)
+        except OSError:
+            return
+        self._device = info.st_dev
+        self._visit((info.st_dev, info.st_ino), path)
+
+    def list_folder(self, path: str) -> List[Entry]:
+        """Return the entries of the folder at <path>, which belongs to the
+        current scan, as this scanner lists them: pruned by its rules, and
+        without the folders and hard-linked files already visited by the
+        scan through another path.
+
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as path:
+        ...     os.mkdir(os.path.join(path, 'src'))
+        ...     os.symlink('..', os.path.join(path, 'src', 'up'))
+        ...     scanner = FileSystemScanner()
+        ...     scanner.begin(path)
+        ...     root = scanner.list_folder(path)
+        ...     src = scanner.list_folder(os.path.join(path, 'src'))
+        >>> root, src
+        ([('src', True, 0)], [])
+        """
+        return self._read_dir(path)
+
+    def scan_folder(self, path: str) -> FileSystemTree:
+        """Return the FileSystemTree for the folder at <path>, which belongs
+        to the current scan, e.g. one that was created since the tree of the
+        scan was built.
+
+        Unlike scan, this does not start a new scan, so the folders and
+        files visited so far are still left out, and the index is not used.
+        """
+        listings = {}
+        pending = [path]
+        while pending:
+            dir_path = pending.pop()
+            entries = self._read_dir(dir_path)
+            listings[dir_path] = entries
+            pending.extend(os.path.join(dir_path, name)
+                           for name, is_dir, _ in entries if is_dir)
+        return self._build(path, os.path.basename(path), listings, {})
+
+    def _visit(self, key: FileKey, path: str) -> bool:
+        """Record that the folder or file with <key> is visited through
+        <path>, and return True, unless it was already visited through
+        another path, in which case return False.
+        """
+        with self._lock:
+            first_path = self._seen.setdefault(key, path)
+        return first_path == path
+
+    def _read_dir(self, path: str) -> List[Entry]:
+        """Return the entries of the folder at <path>, as _list_dir does,
+        pruned by the max_depth and min_size of this scanner.
+        """
+        entries = self._list_dir(path)
+        cut = self.max_depth is not None and \
+            path.rstrip(os.sep).count(os.sep) - self._root_depth \
+            >= self.max_depth
+        if not cut and self.min_size <= 0:
+            return entries
+        kept = []
+        small_files = 0
+        small_size = 0
+        for name, is_dir, size in entries:
+            if is_dir and cut:
+                if self.aggregate:
+                    kept.append((name, False,
+                                 self._walk(os.path.join(path, name))))
+            elif is_dir or size >= self.min_size:
+                kept.append((name, is_dir, size))
+            else:
+                small_files += 1
+                small_size += size
+        if self.aggregate and small_files > 0:
+            kept.append((SMALL_FILES_NAME.format(small_files), False,
+                         small_size))
+        return kept
+
+    def _walk(self, path: str) -> int:
+        """Return the total size of the files below the folder at <path>,
+        left out as _list_dir does, without listing them in the scan.
+        """
+        total = 0
+        pending = [path]
+        while pending:
+            dir_path = pending.pop()
+            for name, is_dir, size in self._list_dir(dir_path):
+                if is_dir:
+                    pending.append(os.path.join(dir_path, name))
+                else:
+                    total += size
+        return total
+
+    def _list_dir(self, path: str) -> List[Entry]:
+        """Return the entries of the folder at <path>, in os.listdir order,
+        without those this scan should leave out: those that match an
+        exclusion rule, folders and hard-linked files already visited
+        through another path, and, if this scanner stays on one file
+        system, anything on another one.
+
+        Like os.path.isdir and os.path.getsize, symbolic links are followed.
+        An entry that cannot be stat'ed (e.g. a dangling link) is a file of
+        size 0, and a folder that cannot be listed is treated as empty.
+        Sizes are allocated sizes if this scanner counts them.
+        """
+        entries = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if self._excluded(entry.name, entry.path):
+                        continue
+                    try:
+                        info = entry.stat()
+                    except OSError:
+                        entries.append((entry.name, False, 0))
+                        continue
+                    if self.one_file_system and info.st_dev != self._device:
+                        continue
+                    is_dir = stat.S_ISDIR(info.st_mode)
+                    if (is_dir or info.st_nlink > 1) and not self._visit(
+                            (info.st_dev, info.st_ino), entry.path):
+                        continue
+                    if is_dir:
+                        entries.append((entry.name, True, 0))
+                    elif self.allocated:
+                        entries.append((entry.name, False,
+                                        info.st_blocks * BLOCK_SIZE))
+                    else:
+                        entries.append((entry.name, False, info.st_size))
+        except OSError:
+            pass
+        return entries
+
+    def _excluded(self, name: str, path: str) -> bool:
+        """Return whether the file or folder named <name> at <path> matches
+        one of the exclusion rules of this scanner.
+
+        >>> scanner = FileSystemScanner(exclude=['.git', '*.tmp',
+        ...                                      re.compile('/build/')])
+        >>> [scanner._excluded(name, 'src/' + name)
+        ...  for name in ['.git', 'a.tmp', 'a.py', '.github']]
+        [True, True, False, False]
+        >>> scanner._excluded('main.o', 'src/build/main.o')
+        True
+        """
+        if self._name_pattern is not None and \
+                self._name_pattern.match(name) is not None:
+            return True
+        return any(rule.search(path) is not None
+                   for rule in self._path_patterns)
+
+    def file_size(self, path: str) -> int:
+        """Return the size of the file at <path>, as counted by this
+        scanner.
+        """
+        if self.allocated:
+            return os.stat(path).st_blocks * BLOCK_SIZE
+        return os.path.getsize(path)
+
+    def _record(self, path: str,
+                result: Tuple[int, List[Entry], bool]) -> List[Entry]:
+        """Record the <result> of reading the folder at <path> in this
+        scanner's index, if it has one, and return the folder's entries.
+        """
+        mtime, entries, reused = result
+        if self.index is not None:
+            self.index.record(path, mtime, entries, reused)
+        return entries
+
+    def _build(self, path: str, name: str,
+               listings: Dict[str, List[Entry]],
+               shards: Dict[str, Shard]) -> FileSystemTree:
+        """Return the FileSystemTree for the folder at <path>, named <name>,
+        using the folder listings in <listings> and the shards in <shards>.
+        """
+        subtrees = []
+        size = 0
+        for entry_name, is_dir, entry_size in listings[path]:
+            child = os.path.join(path, entry_name)
+            if is_dir and child in shards:
+                subtree = _tree_from_shard(shards[child])
+            elif is_dir:
+                subtree = self._build(child, entry_name, listings, shards)
+            else:
+                subtree = new_file_system_tree(entry_name, [], entry_size)
+            size += subtree.data_size
+            subtrees.append(subtree)
+        return new_file_system_tree(name, subtrees, size)
+
+
+def scan_file_system(path: str, workers: int = DEFAULT_WORKERS,
+                     processes: int = 1) -> FileSystemTree:
+    """Return the FileSystemTree for the file or folder at <path>, reading
+    directories with <workers> threads in each of <processes> processes.
+
+    Precondition: <path> is a valid path for this computer.
+    """
+    return FileSystemScanner(workers, processes=processes).scan(path)
+
+
+def _scan_shard(path: str, options: ShardOptions) -> Shard:
+    """Return the shard of the folder at <path>, read with the <options>
+    of the scanner that split the scan.
+
+    This runs in a worker process, so it returns flat lists and bytes,
+    which are much faster to send back than a tree of FileSystemTrees.
+    """
+    settings, device, root_depth, seen = options
+    scanner = FileSystemScanner(**settings)
+    scanner._device = device
+    scanner._root_depth = root_depth
+    scanner._seen = dict.fromkeys(seen, '')
+    listings = scanner._read_all(path)
+    names = [os.path.basename(path)]
+    sizes = array('q', [0])
+    counts = array('i', [len(listings[path])])
+    stack = [(path, entry) for entry in reversed(listings[path])]
+    while stack:
+        dir_path, (name, is_dir, size) = stack.pop()
+        names.append(name)
+        if is_dir:
+            child = os.path.join(dir_path, name)
+            sizes.append(0)
+            counts.append(len(listings[child]))
+            stack.extend((child, entry) for entry in reversed(listings[child]))
+        else:
+            sizes.append(size)
+            counts.append(-1)
+    return names, sizes.tobytes(), counts.tobytes()
+
+
+def _tree_from_shard(shard: Shard) -> FileSystemTree:
+    """Return the FileSystemTree for the folder scanned as <shard>.
+
+    >>> tree = _tree_from_shard((['a', 'b', 'c', 'd'],
+    ...                          array('q', [0, 0, 5, 7]).tobytes(),
+    ...                          array('i', [2, 1, -1, -1]).tobytes()))
+    >>> [subtree._name for subtree in tree._subtrees], tree.data_size
+    (['b', 'd'], 12)
+    >>> tree._subtrees[0]._subtrees[0]._parent_tree._name
+    'b'
+    """
+    names, sizes, counts = shard
+    sizes = array('q', sizes)
+    counts = array('i', counts)
+    # the nodes are built last to first, so that the children of a folder
+    # are on top of the stack, last child first, when it is built
+    stack = []
+    for i in range(len(names) - 1, -1, -1):
+        count = counts[i]
+        if count < 0:
+            stack.append(new_file_system_tree(names[i], [], sizes[i]))
+            continue
+        subtrees = stack[len(stack) - count:]
+        del stack[len(stack) - count:]
+        subtrees.reverse()
+        stack.append(new_file_system_tree(
+            names[i], subtrees,
+            sum(subtree.data_size for subtree in subtrees)))
+    return stack[0]
+
+
+def _add_shard(store: CompactTreeStore, parent: int, shard: Shard) -> None:
+    """Add the nodes of the folder scanned as <shard> to <store>, as the
+    last child of the node at <parent>.
+
+    The sizes of the folders are left at 0, to be set by
+    update_data_sizes.
+    """
+    names, sizes, counts = shard
+    sizes = array('q', sizes)
+    counts = array('i', counts)
+    # the folders that are still missing children, with how many
+    unfinished = [[parent, 1]]
+    for i, name in enumerate(names):
+        index = store.add_node(unfinished[-1][0], name, sizes[i])
+        unfinished[-1][1] -= 1
+        if counts[i] > 0:
+            unfinished.append([index, counts[i]])
+        while unfinished and unfinished[-1][1] == 0:
+            unfinished.pop()
+
+
+def new_file_system_tree(name: str, subtrees: List[TMTree],
+                         data_size: int = 0) -> FileSystemTree:
+    """Return a new FileSystemTree with the given <name>, <subtrees> and
+    <data_size>, without reading anything from disk.
+
+    <subtrees> and <data_size> have the same meaning as in TMTree.__init__.
+    """
+    tree = FileSystemTree.__new__(FileSystemTree)
+    TMTree.__init__(tree, name, subtrees, data_size)
+    return tree
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'fnmatch', 'os', 're', 'stat', 'threading',
+            'array', 'concurrent.futures', 'tm_trees', 'scan_index',
+            'compact_tree', '__future__'
+        ]
+    })
@@ -0,0 +1,183 @@
+from __future__ import annotations
+import os
+from typing import List, Optional, Tuple
+from tm_trees import FileSystemTree
+from fs_scanner import FileSystemScanner, new_file_system_tree
+
+# Seconds between two polls of the file system when none is given.
+DEFAULT_INTERVAL = 2.0
+
+# A change found by a poll: one of 'created', 'deleted' or 'resized',
+# together with the tree that was added, removed or resized.
+Change = Tuple[str, FileSystemTree]
+
+
+class FileSystemWatcher:
+    """A watcher that keeps a FileSystemTree up to date with the file system
+    by polling it.
+
+    Every poll walks the folder the tree was built from and compares each
+    folder listing with the subtrees of the matching tree. Created entries
+    are scanned and added as new subtrees, deleted entries are removed and
+    files whose size changed are resized in place. Only the ancestors of
+    these trees have their data_size updated, and only they are marked for
+    update_changed_rectangles.
+
+    Folders are listed by the scanner the tree was built with, and each
+    poll is a new scan of it, so that a symbolic link to a folder cannot
+    make a poll loop forever, and the entries the scanner prunes never show
+    up as changes.
+
+    Polling needs no support from the operating system, but reads the
+    metadata of every entry below the root on each poll.
+
+    === Public Attributes ===
+    tree:
+        The tree that is kept up to date.
+    path:
+        The path of the file or folder that <tree> represents.
+    interval:
+        The number of seconds between two polls.
+
+    === Private Attributes ===
+    _scanner:
+        The scanner used to list folders and to read newly created ones.
+
+    === Representation Invariants ===
+    - interval > 0
+    """
+
+    tree: FileSystemTree
+    path: str
+    interval: float
+    _scanner: FileSystemScanner
+
+    def __init__(self, tree: FileSystemTree, path: str,
+                 interval: float = DEFAULT_INTERVAL,
+                 scanner: Optional[FileSystemScanner] = None) -> None:
+        """Initialize a new watcher that keeps <tree>, which was built from
+        the file or folder at <path>, up to date every <interval> seconds.
+
+        <scanner> is the scanner <tree> was built with, if it was not a
+        FileSystemScanner with the default settings.
+        """
+        self.tree = tree
+        self.path = path
+        self.interval = interval
+        if scanner is None:
+            scanner = FileSystemScanner()
+        self._scanner = scanner
+
+    def poll(self) -> List[Change]:
+        """Apply the changes made to the file system since the last poll to
+        this watcher's tree, and return them.
+
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as path:
+        ...     os.mkdir(os.path.join(path, 'src'))
+        ...     os.symlink('..', os.path.join(path, 'src', 'up'))
+        ...     with open(os.path.join(path, 'src', 'a.py'), 'w') as file:
+        ...         _ = file.write('a' * 10)
+        ...     tree = FileSystemScanner().scan(path)
+        ...     watcher = FileSystemWatcher(tree, path)
+        ...     before = watcher.poll()
+        ...     with open(os.path.join(path, 'src', 'b.py'), 'w') as file:
+        ...         _ = file.write('b' * 5)
+        ...     after = [(change, subtree._name)
+        ...              for change, subtree in watcher.poll()]
+        >>> before, after, tree.data_size
+        ([], [('created', 'b.py')], 15)
+
+        What the scanner prunes is not reported as a change:
+
+        >>> with tempfile.TemporaryDirectory() as path:
+        ...     for folder in ['.git', 'src', os.path.join('src', 'lib')]:
+        ...         os.mkdir(os.path.join(path, folder))
+        ...     for name, size in [('.git/HEAD', 10), ('src/a.py', 100),
+        ...                        ('src/b.py', 1), ('src/lib/c.py', 7)]:
+        ...         with open(os.path.join(path, name), 'w') as file:
+        ...             _ = file.write('a' * size)
+        ...     scanner = FileSystemScanner(exclude=['.git'], max_depth=1,
+        ...                                 min_size=5, aggregate=True)
+        ...     tree = scanner.scan(path)
+        ...     watcher = FileSystemWatcher(tree, path, scanner=scanner)
+        ...     changes = watcher.poll()
+        >>> changes, tree.data_size
+        ([], 108)
+        """
+        changes = []
+        if self.tree._subtrees == [] and not os.path.isdir(self.path):
+            try:
+                size = self._scanner.file_size(self.path)
+            except OSError:
+                size = 0
+            self._resize(self.tree, size, changes)
+        else:
+            self._scanner.begin(self.path)
+            self._sync(self.tree, self.path, changes)
+        return changes
+
+    def status(self) -> str:
+        """Return '', since a watcher has no progress to show in the text
+        display.
+        """
+        return ''
+
+    def is_attached(self, tree: FileSystemTree) -> bool:
+        """Return True iff <tree> is still part of this watcher's tree, i.e.
+        it was not removed by a poll.
+        """
+        while tree._parent_tree is not None:
+            tree = tree._parent_tree
+        return tree is self.tree
+
+    def _sync(self, tree: FileSystemTree, path: str,
+              changes: List[Change]) -> None:
+        """Make the subtrees of <tree> match the contents of the folder at
+        <path>, appending every change made to <changes>.
+        """
+        old_subtrees = {subtree._name: subtree for subtree in tree._subtrees}
+        for name, is_dir, size in self._scanner.list_folder(path):
+            child_path = os.path.join(path, name)
+            subtree = old_subtrees.pop(name, None)
+            # a file that became a folder, or the other way around
+            if subtree is not None and (
+                    (not is_dir and subtree._subtrees != [])
+                    or (is_dir and subtree._subtrees == []
+                        and subtree.data_size != 0)):
+                tree._remove_subtree(subtree)
+                changes.append(('deleted', subtree))
+                subtree = None
+            if subtree is None:
+                if is_dir:
+                    subtree = self._scanner.scan_folder(child_path)
+                else:
+                    subtree = new_file_system_tree(name, [], size)
+                tree._add_subtree(subtree)
+                changes.append(('created', subtree))
+            elif is_dir:
+                self._sync(subtree, child_path, changes)
+            else:
+                self._resize(subtree, size, changes)
+        for subtree in old_subtrees.values():
+            tree._remove_subtree(subtree)
+            changes.append(('deleted', subtree))
+
+    def _resize(self, tree: FileSystemTree, size: int,
+                changes: List[Change]) -> None:
+        """Set the data_size of the file <tree> to <size>, appending the
+        change to <changes> if there is one.
+        """
+        if tree.data_size != size:
+            tree._add_to_size(size - tree.data_size)
+            changes.append(('resized', tree))
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'os', 'tm_trees', 'fs_scanner',
+            '__future__'
+        ]
+    })
@@ -0,0 +1,322 @@
+"""Render treemaps to image files without opening a window.
+
+Run this module as a script to write a PNG image of the treemap of each
+given path, at each given size, e.g.:
+
+    python headless.py --size 1024x768 --size 4096x3072 --out shots /home
+
+Pass --papers to also render the CS Education research papers data. The
+build, layout and raster time of each image is printed as it is written.
+"""
+from __future__ import annotations
+import argparse
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+import pygame
+from tm_trees import TMTree
+from papers import PaperTree
+from fs_scanner import FileSystemScanner
+from layouts import LayoutEngine, LAYOUT_ENGINES, SLICE_AND_DICE
+from surface_fill import fill_rectangles
+
+# The size, in pixels, below which subtrees are drawn as a single rectangle.
+# At 1, only subtrees that would not be drawn at all are skipped.
+DETAIL_SIZE = 1
+
+# The colour of the pixels that no rectangle covers.
+BACKGROUND = (0, 0, 0)
+
+
+class RenderTiming:
+    """The time taken by each step of writing one image.
+
+    === Public Attributes ===
+    name:
+        The name of the tree that was rendered.
+    path:
+        The path of the image file written.
+    size:
+        The width and height of the image, in pixels.
+    build:
+        The number of seconds taken to build the tree, or 0.0 if it was
+        built for an earlier image.
+    layout:
+        The number of seconds taken to update the rectangles of the tree,
+        or 0.0 if they were reused from an earlier image.
+    raster:
+        The number of seconds taken to draw the rectangles.
+    save:
+        The number of seconds taken to write the image file.
+    """
+
+    name: str
+    path: str
+    size: Tuple[int, int]
+    build: float
+    layout: float
+    raster: float
+    save: float
+
+    def __init__(self, name: str, path: str, size: Tuple[int, int]) -> None:
+        """Initialize the timing of the image of the tree <name> of <size>
+        written to <path>, with every step taking no time.
+        """
+        self.name = name
+        self.path = path
+        self.size = size
+        self.build = 0.0
+        self.layout = 0.0
+        self.raster = 0.0
+        self.save = 0.0
+
+    def __str__(self) -> str:
+        """Return a one-line summary of this timing.
+
+        >>> timing = RenderTiming('home', 'home_800x600.png', (800, 600))
+        >>> timing.layout = 0.25
+        >>> print(timing)
+        home_800x600.png (800x600): build 0.000s, layout 0.250s, \
+raster 0.000s, save 0.000s
+        """
+        return '{} ({}x{}): build {:.3f}s, layout {:.3f}s, raster {:.3f}s, ' \
+            'save {:.3f}s'.format(self.path, self.size[0], self.size[1],
+                                  self.build, self.layout, self.raster,
+                                  self.save)
+
+
+class HeadlessRenderer:
+    """A renderer that writes treemaps to image files, without a window.
+
+    The rectangles are drawn to an off-screen pygame surface, so no video
+    driver is needed. Every tree is built once, and its rectangles are
+    updated only when it is rendered at a new size or with a new layout
+    engine, so that rendering many images of the same trees in one process
+    reuses as much of the work as it can.
+
+    === Public Attributes ===
+    engine:
+        The layout engine used to lay the trees out.
+    min_size:
+        The size passed to get_rectangle_arrays when a tree is drawn.
+    timings:
+        The timing of every image written, in order.
+
+    === Private Attributes ===
+    _trees:
+        The trees built so far, by name.
+    _layouts:
+        For each tree in <_trees>, the rectangle and the layout engine its
+        rectangles were last updated with, if they were.
+    """
+
+    engine: LayoutEngine
+    min_size: int
+    timings: List[RenderTiming]
+    _trees: Dict[str, TMTree]
+    _layouts: Dict[str, Tuple[Tuple[int, int, int, int], LayoutEngine]]
+
+    def __init__(self, engine: LayoutEngine = SLICE_AND_DICE,
+                 min_size: int = DETAIL_SIZE) -> None:
+        """Initialize a new renderer that lays trees out with <engine>, and
+        draws subtrees less than <min_size> pixels wide or high as one
+        rectangle.
+        """
+        self.engine = engine
+        self.min_size = min_size
+        self.timings = []
+        self._trees = {}
+        self._layouts = {}
+
+    def add_tree(self, name: str, tree: TMTree) -> None:
+        """Make <tree> available to render under <name>, fully expanded.
+
+        If a tree was already added under <name>, replace it.
+        """
+        tree.expand_all()
+        self._trees[name] = tree
+        self._layouts.pop(name, None)
+
+    def render_file_system(self, path: str, size: Tuple[int, int],
+                           image_path: str,
+                           scanner: Optional[FileSystemScanner] = None) \
+            -> RenderTiming:
+        """Write an image of <size> of the treemap of the file or folder at
+        <path> to <image_path>, and return its timing.
+
+        The folder is scanned with <scanner> the first time it is rendered.
+
+        Precondition: <path> is a valid path to a file or folder.
+        """
+        start = time.perf_counter()
+        if path not in self._trees:
+            if scanner is None:
+                scanner = FileSystemScanner()
+            self.add_tree(path, scanner.scan(path))
+        build = time.perf_counter() - start
+        timing = self.render(path, size, image_path)
+        timing.build = build
+        return timing
+
+    def render_papers(self, size: Tuple[int, int], image_path: str,
+                      by_year: bool = True) -> RenderTiming:
+        """Write an image of <size> of the treemap of the CS Education
+        research papers data to <image_path>, and return its timing.
+        """
+        name = 'CS1 by year' if by_year else 'CS1'
+        start = time.perf_counter()
+        if name not in self._trees:
+            self.add_tree(name, PaperTree('CS1', [], all_papers=True,
+                                          by_year=by_year))
+        build = time.perf_counter() - start
+        timing = self.render(name, size, image_path)
+        timing.build = build
+        return timing
+
+    def render(self, name: str, size: Tuple[int, int],
+               image_path: str) -> RenderTiming:
+        """Write an image of <size> of the treemap of the tree added under
+        <name> to <image_path>, and return its timing.
+
+        The format of the image is chosen from the extension of
+        <image_path>, as in pygame.image.save.
+
+        Precondition: a tree was added under <name>.
+        """
+        tree = self._trees[name]
+        timing = RenderTiming(name, image_path, size)
+        rect = (0, 0, size[0], size[1])
+
+        start = time.perf_counter()
+        if self._layouts.get(name) != (rect, self.engine):
+            tree.update_rectangles(rect, self.engine)
+            self._layouts[name] = (rect, self.engine)
+        timing.layout = time.perf_counter() - start
+
+        start = time.perf_counter()
+        surface = pygame.Surface(size, depth=32)
+        surface.fill(BACKGROUND)
+        fill_rectangles(surface, tree.get_rectangle_arrays(self.min_size))
+        timing.raster = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pygame.image.save(surface, image_path)
+        timing.save = time.perf_counter() - start
+
+        self.timings.append(timing)
+        return timing
+
+
+def _parse_size(text: str) -> Tuple[int, int]:
+    """Return the width and height in <text>, written as WIDTHxHEIGHT.
+
+    >>> _parse_size('1024x768')
+    (1024, 768)
+    """
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def _image_name(name: str, size: Tuple[int, int]) -> str:
+    """Return the file name of the image of <size> of the tree <name>.
+
+    >>> _image_name('/data/home/', (800, 600))
+    'home_800x600.png'
+    """
+    base = os.path.basename(os.path.normpath(name)) or 'root'
+    return '{}_{}x{}.png'.format(base.replace(' ', '_'), size[0], size[1])
+
+
+def _distinct_names(paths: List[str]) -> List[str]:
+    """Return a distinct name for the images of each of <paths>: its
+    basename, preceded by as many of its parent folders as needed to tell
+    it apart from the other paths, and followed by a counter if it is
+    still not unique.
+
+    >>> _distinct_names(['/srv/home/', 'a/data', 'b/data', 'b/data', '/'])
+    ['home', 'a_data', 'b_data', 'b_data_2', 'root']
+    """
+    parts = [[part for part in os.path.normpath(path).split(os.sep)
+              if part not in ('', '.')] or ['root'] for path in paths]
+    names = []
+    taken = set()
+    for path_parts in parts:
+        others = [other for other in parts if other != path_parts]
+        depth = 1
+        while depth < len(path_parts) and any(
+                other[-depth:] == path_parts[-depth:] for other in others):
+            depth += 1
+        name = '_'.join(path_parts[-depth:])
+        unique = name
+        count = 1
+        while unique in taken:
+            count += 1
+            unique = '{}_{}'.format(name, count)
+        taken.add(unique)
+        names.append(unique)
+    return names
+
+
+def main(args: Optional[List[str]] = None) -> List[RenderTiming]:
+    """Render the images requested by the command line arguments <args>, or
+    those of this process if <args> is None, and return their timings.
+    """
+    parser = argparse.ArgumentParser(
+        description='Write treemap images of folders without a window.')
+    parser.add_argument('paths', nargs='*',
+                        help='the files or folders to render')
+    parser.add_argument('--papers', action='store_true',
+                        help='also render the research papers data')
+    parser.add_argument('--size', action='append', type=_parse_size,
+                        help='an image size, as WIDTHxHEIGHT; may be repeated'
+                             ' (default 1024x768)')
+    parser.add_argument('--out', default='.',
+                        help='the folder to write the images to')
+    parser.add_argument('--one-file-system', action='store_true',
+                        help='skip folders on other file systems')
+    parser.add_argument('--allocated', action='store_true',
+                        help='count the disk space allocated to files '
+                             'instead of their apparent size')
+    parser.add_argument('--exclude', action='append', default=[],
+                        help='a glob pattern of the names of files and '
+                             'folders to skip; may be repeated')
+    parser.add_argument('--max-depth', type=int,
+                        help='the number of levels of folders to list')
+    parser.add_argument('--min-size', type=int, default=0,
+                        help='the size in bytes below which files are '
+                             'skipped')
+    parser.add_argument('--aggregate', action='store_true',
+                        help='keep what --max-depth and --min-size skip '
+                             'as aggregate leaves')
+    parser.add_argument('--engine', choices=list(LAYOUT_ENGINES),
+                        default='slice_and_dice',
+                        help='the layout engine to use')
+    options = parser.parse_args(args)
+
+    renderer = HeadlessRenderer(LAYOUT_ENGINES[options.engine])
+    os.makedirs(options.out, exist_ok=True)
+    scanner = FileSystemScanner(one_file_system=options.one_file_system,
+                                allocated=options.allocated,
+                                exclude=options.exclude,
+                                max_depth=options.max_depth,
+                                min_size=options.min_size,
+                                aggregate=options.aggregate)
+    sizes = options.size or [(1024, 768)]
+    names = _distinct_names(options.paths
+                            + (['papers'] if options.papers else []))
+    # every size of a tree is rendered in turn, so that its tree and its
+    # rectangles are reused while they are still the last ones computed
+    for path, name in zip(options.paths, names):
+        for size in sizes:
+            print(renderer.render_file_system(
+                path, size, os.path.join(options.out, _image_name(name, size)),
+                scanner))
+    if options.papers:
+        for size in sizes:
+            print(renderer.render_papers(
+                size, os.path.join(options.out, _image_name(names[-1], size))))
+    return renderer.timings
+
+
+if __name__ == '__main__':
+    main()
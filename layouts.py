@@ -0,0 +1,302 @@
+from __future__ import annotations
+import math
+from typing import Dict, List, Tuple
+import numpy as np
+
+# A pygame rectangle: (x, y, width, height).
+Rect = Tuple[int, int, int, int]
+
+# The smallest number of subtrees in a level for which SliceAndDiceLayout
+# computes the whole level with NumPy. Below it, the per-tree loop is faster.
+BATCH_THRESHOLD = 256
+
+
+class LayoutEngine:
+    """A treemap layout algorithm, which divides the rectangle of a tree
+    among its subtrees in proportion to their data_size.
+
+    This is an abstract class that should not be instantiated directly.
+
+    Every layout engine guarantees that the rectangles of the subtrees
+    exactly tile the rectangle of their parent: they do not overlap, and
+    together they cover it without gaps, down to the pixel.
+    """
+
+    def layout(self, rect: Rect, sizes: List[int], total: int) -> List[Rect]:
+        """Return the rectangles of subtrees with data sizes <sizes>, in
+        order, when their parent of data size <total> fills <rect>.
+
+        Precondition: <sizes> is not empty, and every size is >= 0.
+        """
+        raise NotImplementedError
+
+    def layout_level(self, rects: List[Rect], counts: List[int],
+                     sizes: List[int], totals: List[int]) -> List[Rect]:
+        """Return the rectangles of the subtrees of several trees, as one
+        list: the first counts[0] rectangles are layout(rects[0], ...,
+        totals[0]) for the first counts[0] <sizes>, and so on.
+
+        A layout pass calls this once per level of the tree, so that
+        engines can lay out a whole level at once.
+
+        Precondition: every count is >= 1, and sum(counts) == len(sizes).
+        """
+        result = []
+        start = 0
+        for rect, count, total in zip(rects, counts, totals):
+            result.extend(self.layout(rect, sizes[start:start + count],
+                                      total))
+            start += count
+        return result
+
+
+class SliceAndDiceLayout(LayoutEngine):
+    """The slice-and-dice layout: the rectangle is divided along its longer
+    side into one slice per subtree, in the order of the subtrees.
+
+    Each slice is rounded down to a whole number of pixels, and the last
+    subtree gets the leftover width/height.
+    """
+
+    def layout(self, rect: Rect, sizes: List[int], total: int) -> List[Rect]:
+        """Return the rectangles of subtrees with data sizes <sizes>, in
+        order, when their parent of data size <total> fills <rect>.
+
+        Precondition: <sizes> is not empty, and every size is >= 0.
+
+        >>> SliceAndDiceLayout().layout((0, 0, 100, 20), [1, 2, 1], 4)
+        [(0, 0, 25, 20), (25, 0, 50, 20), (75, 0, 25, 20)]
+        >>> SliceAndDiceLayout().layout((0, 0, 10, 30), [1, 2], 3)
+        [(0, 0, 10, 10), (0, 10, 10, 20)]
+        """
+        x, y, width, height = rect
+        rects = []
+        # case vertical partition
+        if width > height:
+            x_kept = x
+            for size in sizes[:-1]:
+                if total != 0:
+                    partiton = size / total
+                else:
+                    partiton = 0
+                new_width = math.floor(width * partiton)
+                rects.append((x_kept, y, new_width, height))
+                # change x to new x_kept
+                x_kept += new_width
+            # last rectangle has leftover width
+            rects.append((x_kept, y, x + width - x_kept, height))
+        # case horizontal partition
+        else:
+            y_kept = y
+            for size in sizes[:-1]:
+                if total != 0:
+                    partiton = size / total
+                else:
+                    partiton = 0
+                new_height = math.floor(height * partiton)
+                rects.append((x, y_kept, width, new_height))
+                # change y to new y_kept
+                y_kept += new_height
+            # last rectangle has leftover height
+            rects.append((x, y_kept, width, y + height - y_kept))
+        return rects
+
+    def layout_level(self, rects: List[Rect], counts: List[int],
+                     sizes: List[int], totals: List[int]) -> List[Rect]:
+        """Return the rectangles of the subtrees of several trees, as one
+        list: the first counts[0] rectangles are layout(rects[0], ...,
+        totals[0]) for the first counts[0] <sizes>, and so on.
+
+        Large levels are computed with NumPy: each slice is rounded down
+        with the same floating point operations as layout, and the slices
+        of every tree are placed with a single cumulative sum over the
+        whole level, so the result is exactly the same.
+
+        Precondition: every count is >= 1, and sum(counts) == len(sizes).
+
+        >>> engine = SliceAndDiceLayout()
+        >>> rects = [(0, 0, 100, 20), (0, 0, 10, 30)]
+        >>> sizes = [1, 2, 1] * 100 + [1, 2] * 100
+        >>> result = engine.layout_level(rects, [300, 200], sizes, [400, 300])
+        >>> result == (engine.layout(rects[0], sizes[:300], 400)
+        ...            + engine.layout(rects[1], sizes[300:], 300))
+        True
+        """
+        if sizes == [] or len(sizes) < BATCH_THRESHOLD:
+            return LayoutEngine.layout_level(self, rects, counts, sizes,
+                                             totals)
+        counts = np.array(counts, dtype=np.int64)
+        parents = np.array(rects, dtype=np.int64)
+        vertical = parents[:, 2] > parents[:, 3]
+        # the length of the side that each tree is divided along
+        lengths = np.where(vertical, parents[:, 2], parents[:, 3])
+        child_sizes = np.array(sizes, dtype=np.float64)
+        child_totals = np.repeat(np.array(totals, dtype=np.float64), counts)
+        partitions = np.divide(child_sizes, child_totals,
+                               out=np.zeros_like(child_sizes),
+                               where=child_totals != 0)
+        pieces = np.floor(np.repeat(lengths, counts) * partitions) \
+            .astype(np.int64)
+        # offset of each slice from the start of its tree's rectangle
+        starts = np.cumsum(pieces) - pieces
+        firsts = np.cumsum(counts) - counts
+        offsets = starts - np.repeat(starts[firsts], counts)
+        # last rectangle has leftover width/height
+        lasts = firsts + counts - 1
+        pieces[lasts] = lengths - offsets[lasts]
+
+        child_vertical = np.repeat(vertical, counts)
+        child_parents = np.repeat(parents, counts, axis=0)
+        xs = child_parents[:, 0] + np.where(child_vertical, offsets, 0)
+        ys = child_parents[:, 1] + np.where(child_vertical, 0, offsets)
+        widths = np.where(child_vertical, pieces, child_parents[:, 2])
+        heights = np.where(child_vertical, child_parents[:, 3], pieces)
+        return list(zip(xs.tolist(), ys.tolist(), widths.tolist(),
+                        heights.tolist()))
+
+
+class SquarifiedLayout(LayoutEngine):
+    """The squarified layout of Bruls, Huizing and van Wijk, which keeps the
+    rectangles of subtrees as close to squares as it can.
+
+    The subtrees are placed from largest to smallest in rows along the
+    shorter side of the space that is left, and a row is closed as soon as
+    adding the next subtree would make its worst aspect ratio worse. Sorting
+    makes this O(n log n) in the number of subtrees.
+
+    The layout is computed with real numbers, and then every edge is rounded
+    to the nearest pixel. Neighbouring rectangles share their edges, so they
+    still exactly tile the parent rectangle. Subtrees of size 0 get an empty
+    rectangle in the bottom-right corner.
+
+    The sizes are taken relative to their sum rather than to the parent's
+    data size. If they are all 0, the slice-and-dice layout is used instead.
+    """
+
+    def layout(self, rect: Rect, sizes: List[int], total: int) -> List[Rect]:
+        """Return the rectangles of subtrees with data sizes <sizes>, in
+        order, when their parent of data size <total> fills <rect>.
+
+        Precondition: <sizes> is not empty, and every size is >= 0.
+
+        >>> SquarifiedLayout().layout((0, 0, 60, 40), [6, 6, 4, 3, 2, 2, 1],
+        ...                           24)
+        [(0, 0, 30, 20), (0, 20, 30, 20), (30, 0, 17, 23), \
+(47, 0, 13, 23), (30, 23, 12, 17), (42, 23, 12, 17), (54, 23, 6, 17)]
+        >>> SquarifiedLayout().layout((5, 5, 10, 10), [0, 3, 0], 3)
+        [(15, 15, 0, 0), (5, 5, 10, 10), (15, 15, 0, 0)]
+        """
+        x, y, width, height = rect
+        order = sorted((i for i in range(len(sizes)) if sizes[i] > 0),
+                       key=lambda i: sizes[i], reverse=True)
+        if order == [] or width <= 0 or height <= 0:
+            return SLICE_AND_DICE.layout(rect, sizes, total)
+        scale = width * height / sum(sizes[i] for i in order)
+        areas = [sizes[i] * scale for i in order]
+        rects = [(x + width, y + height, 0, 0)] * len(sizes)
+
+        # the space that is left, as (left, top, right, bottom)
+        left, top, right, bottom = float(x), float(y), x + width, y + height
+        start = 0
+        while start < len(order):
+            end, row_area = _fill_row(areas, start,
+                                      min(right - left, bottom - top))
+            last_row = end == len(order)
+            if right - left >= bottom - top:
+                # a column along the left side of the space
+                column_right = right if last_row \
+                    else left + row_area / (bottom - top)
+                edges = _split(top, bottom, areas[start:end], row_area)
+                for k in range(start, end):
+                    rects[order[k]] = _snap(left, edges[k - start],
+                                            column_right,
+                                            edges[k - start + 1])
+                left = column_right
+            else:
+                # a row along the top side of the space
+                row_bottom = bottom if last_row \
+                    else top + row_area / (right - left)
+                edges = _split(left, right, areas[start:end], row_area)
+                for k in range(start, end):
+                    rects[order[k]] = _snap(edges[k - start], top,
+                                            edges[k - start + 1], row_bottom)
+                top = row_bottom
+            start = end
+        return rects
+
+
+def _fill_row(areas: List[float], start: int,
+              side: float) -> Tuple[int, float]:
+    """Return the end index and the total area of the row of <areas> that
+    begins at index <start> and is laid along a side of length <side>.
+
+    Precondition: <areas> is sorted in non-increasing order, and
+    start < len(areas).
+    """
+    largest = areas[start]
+    row_area = largest
+    worst = _worst_ratio(row_area, largest, largest, side)
+    end = start + 1
+    while end < len(areas):
+        new_area = row_area + areas[end]
+        new_worst = _worst_ratio(new_area, largest, areas[end], side)
+        if new_worst > worst:
+            break
+        row_area, worst = new_area, new_worst
+        end += 1
+    return end, row_area
+
+
+def _worst_ratio(row_area: float, largest: float, smallest: float,
+                 side: float) -> float:
+    """Return the worst aspect ratio in a row of total area <row_area>, laid
+    along a side of length <side>, whose largest and smallest areas are
+    <largest> and <smallest>.
+    """
+    side_squared = side * side
+    row_squared = row_area * row_area
+    if side_squared * smallest == 0:
+        return math.inf
+    return max(side_squared * largest / row_squared,
+               row_squared / (side_squared * smallest))
+
+
+def _split(low: float, high: float, areas: List[float],
+           row_area: float) -> List[float]:
+    """Return the edges that split the interval from <low> to <high> in
+    proportion to <areas>, whose sum is <row_area>, starting with <low> and
+    ending with <high>.
+    """
+    edges = [low]
+    covered = 0.0
+    for area in areas[:-1]:
+        covered += area
+        edges.append(low + (high - low) * covered / row_area)
+    edges.append(high)
+    return edges
+
+
+def _snap(left: float, top: float, right: float, bottom: float) -> Rect:
+    """Return the pygame rectangle with the given edges, each rounded to the
+    nearest pixel.
+    """
+    x, y = round(left), round(top)
+    return x, y, round(right) - x, round(bottom) - y
+
+
+# The layout engines that can be selected by name.
+SLICE_AND_DICE = SliceAndDiceLayout()
+SQUARIFIED = SquarifiedLayout()
+LAYOUT_ENGINES: Dict[str, LayoutEngine] = {
+    'slice_and_dice': SLICE_AND_DICE,
+    'squarified': SQUARIFIED,
+}
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'math', 'numpy', '__future__'
+        ]
+    })
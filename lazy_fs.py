@@ -0,0 +1,363 @@
+from __future__ import annotations
+import os
+import threading
+from queue import Empty, Queue
+from typing import Dict, List, Optional, Tuple
+from tm_trees import TMTree, FileSystemTree
+from fs_scanner import FileSystemScanner
+
+# Seconds between two polls of a SizeAggregator by the visualiser when none
+# is given.
+DEFAULT_POLL_INTERVAL = 0.1
+
+# A change found by a poll, as for FileSystemWatcher: 'resized', together
+# with the folder whose final size arrived.
+Change = Tuple[str, FileSystemTree]
+
+
+class LazyFileSystemTree(FileSystemTree):
+    """A FileSystemTree whose folders read their entries only when they are
+    first expanded.
+
+    A folder that was not listed yet is a leaf of the tree. Its data_size is
+    provisional (0) until a SizeAggregator has added up the sizes of every
+    file below it in the background, and it is then set to that final size.
+    A folder that was listed has the sum of the sizes of its entries, as in
+    any TMTree, so it is final once all of them are.
+
+    Only the root folder is listed when the tree is created, so the time
+    taken to show the first frame does not depend on what is below the top
+    level.
+
+    Folders are listed by the scanner of the aggregator, as one scan that
+    starts when the tree is created, so each folder is only listed once,
+    through the first path to it, and the entries the scanner prunes are
+    left out.
+
+    Note that expand_all lists every folder below the tree it is called on.
+
+    === Public Attributes ===
+    aggregator:
+        The aggregator that computes the final sizes of the folders of this
+        tree, shared by all of its nodes.
+
+    === Private Attributes ===
+    _path:
+        The path of the file or folder this tree represents.
+    _is_dir:
+        Whether this tree represents a folder.
+    _listed:
+        Whether the entries of this folder were read, or True for a file.
+    _final:
+        Whether data_size is the final size of this file or folder, if it
+        was not listed.
+
+    === Representation Invariants ===
+    - _subtrees == [] if not _listed
+    - _final if not _is_dir
+    """
+
+    aggregator: SizeAggregator
+    _path: str
+    _is_dir: bool
+    _listed: bool
+    _final: bool
+
+    def __init__(self, path: str,
+                 aggregator: Optional[SizeAggregator] = None) -> None:
+        """Initialize a new tree for the file or folder at <path>, listing
+        only the entries of the folder itself.
+
+        Use <aggregator> to compute the sizes of folders if it is given, or
+        a new SizeAggregator otherwise.
+
+        Precondition: <path> is a valid path for this computer.
+        """
+        if aggregator is None:
+            aggregator = SizeAggregator()
+        aggregator.scanner.begin(path)
+        is_dir = os.path.isdir(path)
+        size = 0 if is_dir else aggregator.scanner.file_size(path)
+        self._init_lazy(path, os.path.basename(path), is_dir, size,
+                        aggregator)
+        self._list()
+
+    def _init_lazy(self, path: str, name: str, is_dir: bool, size: int,
+                   aggregator: SizeAggregator) -> None:
+        """Initialize this tree for the file or folder at <path>, named
+        <name>, without listing it.
+
+        A folder gets its final size from <aggregator> if it already knows
+        it, and is otherwise given a provisional size of 0. A file gets
+        <size>.
+        """
+        final = True
+        if is_dir:
+            size = aggregator.known_size(path)
+            final = size is not None
+            if not final:
+                size = 0
+        TMTree.__init__(self, name, [], size)
+        self.aggregator = aggregator
+        self._path = path
+        self._is_dir = is_dir
+        self._listed = not is_dir
+        self._final = final
+
+    def _list(self) -> None:
+        """Read the entries of this folder and add a subtree for each of
+        them, if that was not done yet. The folders whose size is not known
+        yet are queued in the aggregator.
+
+        The data_size of this tree and its ancestors is updated to the sum
+        of the sizes of the entries, and they are marked for
+        update_changed_rectangles.
+
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as path:
+        ...     os.mkdir(os.path.join(path, 'src'))
+        ...     os.symlink('..', os.path.join(path, 'src', 'up'))
+        ...     with open(os.path.join(path, 'src', 'a.py'), 'w') as file:
+        ...         _ = file.write('a' * 10)
+        ...     tree = LazyFileSystemTree(path)
+        ...     tree.aggregator.wait()
+        ...     _ = tree.aggregator.poll()
+        ...     sized = tree.data_size
+        ...     tree.expand_all()
+        ...     src = tree._subtrees[0]
+        ...     names = [subtree._name for subtree in src._subtrees]
+        >>> sized, names, tree.data_size
+        (10, ['a.py'], 10)
+        """
+        if self._listed:
+            return
+        self._listed = True
+        for name, is_dir, size in self.aggregator.scanner.list_folder(
+                self._path):
+            subtree = LazyFileSystemTree.__new__(LazyFileSystemTree)
+            subtree._init_lazy(os.path.join(self._path, name), name, is_dir,
+                               size, self.aggregator)
+            subtree._parent_tree = self
+            self._subtrees.append(subtree)
+            if not subtree._final:
+                self.aggregator.request(subtree)
+        self._add_to_size(sum(subtree.data_size for subtree in self._subtrees)
+                          - self.data_size)
+
+    def set_final_size(self, size: int) -> bool:
+        """Set the data_size of this folder to its final <size>, unless it
+        was listed since it was queued, and return whether it was set.
+        """
+        if self._listed:
+            return False
+        self._final = True
+        self._add_to_size(size - self.data_size)
+        return True
+
+    def is_final(self) -> bool:
+        """Return whether the data_size of this tree is final, i.e. whether
+        no folder below it is still waiting for its size.
+        """
+        if not self._listed:
+            return self._final
+        return all(subtree.is_final() for subtree in self._subtrees)
+
+    def expand(self) -> None:
+        """List this folder if it was not listed yet, and then expand it as
+        TMTree.expand does.
+        """
+        self._list()
+        FileSystemTree.expand(self)
+
+    def expand_all(self) -> None:
+        """List this folder and every folder below it if they were not listed
+        yet, and then expand them all as TMTree.expand_all does.
+        """
+        self._list()
+        FileSystemTree.expand_all(self)
+
+    def get_suffix(self) -> str:
+        """Return the final descriptor of this tree, which says whether the
+        size of a folder that was not listed is still provisional.
+        """
+        if not self._is_dir:
+            return ' (file)'
+        elif not self._listed and not self._final:
+            return ' (folder, provisional size)'
+        else:
+            return ' (folder)'
+
+
+class SizeAggregator:
+    """A background worker that adds up the sizes of the files below the
+    folders of LazyFileSystemTrees.
+
+    Folders are queued with request, and walked one at a time, in the order
+    they were queued, by a daemon thread, which remembers the size of every
+    folder it walks so that no folder is walked twice. The final sizes are
+    only given to the trees by poll, which is meant to be called by the
+    thread that owns them, e.g. by the visualiser in place of a
+    FileSystemWatcher.
+
+    The folders are listed by a FileSystemScanner, which the trees also use
+    to list their own folders.
+
+    === Public Attributes ===
+    interval:
+        The number of seconds between two polls by the visualiser.
+    scanner:
+        The scanner that lists the folders of the trees and the folders
+        below them.
+
+    === Private Attributes ===
+    _sizes:
+        The total size of every folder walked so far, by path.
+    _requests:
+        The paths of the folders queued for the worker thread.
+    _results:
+        The paths of the folders whose size the worker thread computed,
+        and that were not polled yet.
+    _waiting:
+        The trees waiting for the size of each queued folder, by path.
+    _thread:
+        The worker thread, or None if it was not started yet.
+
+    === Representation Invariants ===
+    - interval > 0
+    """
+
+    interval: float
+    scanner: FileSystemScanner
+    _sizes: Dict[str, int]
+    _requests: Queue
+    _results: Queue
+    _waiting: Dict[str, List[LazyFileSystemTree]]
+    _thread: Optional[threading.Thread]
+
+    def __init__(self, interval: float = DEFAULT_POLL_INTERVAL,
+                 scanner: Optional[FileSystemScanner] = None) -> None:
+        """Initialize a new aggregator with nothing queued, polled every
+        <interval> seconds by the visualiser.
+
+        List folders with <scanner> if it is given, or with a
+        FileSystemScanner with the default settings otherwise.
+        """
+        self.interval = interval
+        if scanner is None:
+            scanner = FileSystemScanner()
+        self.scanner = scanner
+        self._sizes = {}
+        self._requests = Queue()
+        self._results = Queue()
+        self._waiting = {}
+        self._thread = None
+
+    def known_size(self, path: str) -> Optional[int]:
+        """Return the total size of the folder at <path>, or None if it was
+        not computed yet.
+        """
+        return self._sizes.get(path)
+
+    def request(self, tree: LazyFileSystemTree) -> None:
+        """Queue the folder of <tree> for the worker thread, which is started
+        if needed, so that the next poll after its size is known sets it.
+        """
+        if tree._path in self._waiting:
+            self._waiting[tree._path].append(tree)
+            return
+        self._waiting[tree._path] = [tree]
+        self._requests.put(tree._path)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def pending(self) -> int:
+        """Return the number of folders whose size was not polled yet.
+        """
+        return len(self._waiting)
+
+    def poll(self) -> List[Change]:
+        """Give their final size to the trees whose folder was walked since
+        the last poll, and return the changes made.
+        """
+        changes = []
+        while True:
+            try:
+                path = self._results.get_nowait()
+            except Empty:
+                return changes
+            for tree in self._waiting.pop(path, []):
+                if tree.set_final_size(self._sizes[path]):
+                    changes.append(('resized', tree))
+
+    def status(self) -> str:
+        """Return a short description of the folders still waiting for their
+        size, for the text display, or '' if there are none.
+        """
+        if not self._waiting:
+            return ''
+        return 'sizing {} folders'.format(len(self._waiting))
+
+    def wait(self) -> None:
+        """Wait until the worker thread has walked every queued folder.
+        """
+        self._requests.join()
+
+    def is_attached(self, tree: TMTree) -> bool:
+        """Return True, since polls never remove a tree.
+        """
+        return True
+
+    def _run(self) -> None:
+        """Walk the queued folders, one at a time, forever.
+        """
+        while True:
+            path = self._requests.get()
+            try:
+                self._walk(path)
+            finally:
+                self._results.put(path)
+                self._requests.task_done()
+
+    def _walk(self, path: str) -> None:
+        """Add up the size of the files below the folder at <path>, and
+        remember the total size of it and of every folder below it.
+
+        Folders whose size is already known are not walked again.
+        """
+        if path in self._sizes:
+            return
+        totals = {path: 0}
+        parents = {}
+        order = []
+        stack = [path]
+        while stack:
+            folder = stack.pop()
+            order.append(folder)
+            for name, is_dir, size in self.scanner.list_folder(folder):
+                if not is_dir:
+                    totals[folder] += size
+                    continue
+                child = os.path.join(folder, name)
+                known = self._sizes.get(child)
+                if known is not None:
+                    totals[folder] += known
+                else:
+                    totals[child] = 0
+                    parents[child] = folder
+                    stack.append(child)
+        # every folder comes after its parent in <order>
+        for folder in reversed(order):
+            self._sizes[folder] = totals[folder]
+            if folder != path:
+                totals[parents[folder]] += totals[folder]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'os', 'threading', 'queue', 'tm_trees',
+            'fs_scanner', '__future__'
+        ]
+    })
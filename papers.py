@@ -1,10 +1,25 @@
+from __future__ import annotations
 import csv
-from typing import List, Dict
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from tm_trees import TMTree
+from compact_tree import CompactTree, CompactTreeStore, NO_NODE
 
 # Filename for the dataset
 DATA_FILE = 'cs1_papers.csv'
 
+# The keys that papers can be grouped by, from the root of a paper tree down:
+# the year, every level of the category, the first level of the category,
+# the levels of the category below the first one, and the first author.
+GROUPING_KEYS = ('year', 'category', 'top_category', 'subcategory', 'author')
+
+# The grouping keys of the paper trees built with and without by_year.
+BY_YEAR = ('year', 'category')
+BY_CATEGORY = ('category',)
+
+# The number of paper trees a PaperTable keeps when none is given.
+VIEW_CACHE_SIZE = 4
+
 
 class PaperTree(TMTree):
     """A tree representation of Computer Science Education research paper data.
@@ -59,12 +74,11 @@ class PaperTree(TMTree):
         """
         # case root of the paper tree, only the 0 depth
         if all_papers:
-            dic = _load_papers_to_dict(by_year)
-            size = 0
-            lst = _build_tree_from_dict(dic)
-            TMTree.__init__(self, name, lst, size)
+            TMTree.__init__(self, name, [], 0)
             self._authors = authors
             self._doi = doi
+            _add_papers(self, _group_rows(
+                read_papers(), BY_YEAR if by_year else BY_CATEGORY))
         # case not root
         elif not all_papers:
             TMTree.__init__(self, name, subtrees, citations)
@@ -87,41 +101,243 @@ class PaperTree(TMTree):
             return ' (category)'
 
 
+class PaperTable:
+    """The papers dataset, held in memory as one list per column, that can
+    be turned into a paper tree grouped by any ordering of GROUPING_KEYS.
+
+    The dataset is read once. Each tree is built from the columns, without
+    reading the file again, and the most recently used trees are kept, so
+    switching back to one of them takes no time. A kept tree is returned
+    as it was left, including any changes made to it.
+
+    === Public Attributes ===
+    name:
+        The name of the root of every tree built from this table.
+
+    === Private Attributes ===
+    _authors:
+        The authors of each paper.
+    _titles:
+        The title of each paper.
+    _years:
+        The year of each paper.
+    _categories:
+        The levels of the category of each paper, from the top one down.
+        Papers with the same category share the same tuple.
+    _dois:
+        The doi of each paper.
+    _citations:
+        The number of citations of each paper.
+    _groups:
+        The names of the levels added above each paper by each grouping
+        key used so far.
+    _trees:
+        The trees built most recently, keyed by their grouping keys, from
+        the least to the most recently used.
+    _cache_size:
+        The largest number of trees kept in <_trees>.
+
+    === Representation Invariants ===
+    - _authors, _titles, _years, _categories, _dois and _citations all have
+      one item per paper, in the order of the dataset.
+    - len(_trees) <= _cache_size
+    """
+
+    name: str
+    _authors: List[str]
+    _titles: List[str]
+    _years: List[str]
+    _categories: List[Tuple[str, ...]]
+    _dois: List[str]
+    _citations: List[int]
+    _groups: Dict[str, List[Tuple[str, ...]]]
+    _trees: OrderedDict[Tuple[str, ...], PaperTree]
+    _cache_size: int
+
+    def __init__(self, name: str = 'CS1',
+                 rows: Optional[Iterable[List[str]]] = None,
+                 cache_size: int = VIEW_CACHE_SIZE) -> None:
+        """Initialize a new table of the papers in <rows>, rows of the papers
+        dataset as yielded by read_papers, or of the papers in DATA_FILE if
+        <rows> is None. The root of every tree is named <name>, and the
+        <cache_size> most recently used trees are kept.
+        """
+        if rows is None:
+            rows = read_papers()
+        self.name = name
+        self._authors = []
+        self._titles = []
+        self._years = []
+        self._categories = []
+        self._dois = []
+        self._citations = []
+        self._groups = {}
+        self._trees = OrderedDict()
+        self._cache_size = max(1, cache_size)
+        categories = {}
+        for row in rows:
+            self._authors.append(row[0])
+            self._titles.append(row[1])
+            self._years.append(row[2])
+            if row[3] not in categories:
+                categories[row[3]] = tuple(row[3].split(':'))
+            self._categories.append(categories[row[3]])
+            self._dois.append(row[-2])
+            self._citations.append(int(row[-1]))
+
+    def __len__(self) -> int:
+        """Return the number of papers in this table.
+        """
+        return len(self._titles)
+
+    def tree(self, keys: Tuple[str, ...] = BY_YEAR) -> PaperTree:
+        """Return the paper tree of the papers in this table, grouped by
+        each of <keys> in turn, from the root down.
+
+        The tree is built the first time <keys> are used, and then returned
+        for as long as it is among the most recently used trees.
+
+        Raise ValueError if a key is not in GROUPING_KEYS.
+
+        >>> table = PaperTable('CS1', [['A', 'T1', '2001', 'X:Y', 'd1', '3'],
+        ...                            ['B', 'T2', '2002', 'X', 'd2', '4']])
+        >>> tree = table.tree(('category', 'year'))
+        >>> [subtree._name for subtree in tree._subtrees[0]._subtrees]
+        ['Y', '2002']
+        >>> tree.data_size
+        7
+        >>> table.tree(('category', 'year')) is tree
+        True
+        """
+        keys = tuple(keys)
+        if keys in self._trees:
+            self._trees.move_to_end(keys)
+            return self._trees[keys]
+        for key in keys:
+            if key not in GROUPING_KEYS:
+                raise ValueError('{} is not one of the grouping keys {}'
+                                 .format(key, GROUPING_KEYS))
+        columns = [self._group(key) for key in keys]
+        root = PaperTree(self.name, [])
+        _add_papers(root, zip((sum(groups, ()) for groups in zip(*columns)),
+                              self._titles, self._authors, self._dois,
+                              self._citations))
+        self._trees[keys] = root
+        if len(self._trees) > self._cache_size:
+            self._trees.popitem(last=False)
+        return root
+
+    def _group(self, key: str) -> List[Tuple[str, ...]]:
+        """Return the names of the levels added above each paper by the
+        grouping <key>.
+        """
+        if key not in self._groups:
+            self._groups[key] = [
+                _group_names(key, year, categories, authors)
+                for year, categories, authors
+                in zip(self._years, self._categories, self._authors)]
+        return self._groups[key]
+
+
+def build_compact_paper_tree(name: str = 'CS1',
+                             by_year: bool = True) -> CompactTree:
+    """Return the tree of all papers in DATA_FILE as a CompactTree whose root
+    is named <name>, without creating a PaperTree for each paper.
+
+    <by_year> has the same meaning as for PaperTree.
+    """
+    store = CompactTreeStore('/', ' (paper)', ' (category)',
+                             ('authors', 'doi'))
+    stack = [(_load_papers_to_dict(by_year), store.add_node(NO_NODE, name))]
+    while stack:
+        nested_dict, parent = stack.pop()
+        for item in nested_dict:
+            if isinstance(nested_dict[item], tuple):
+                author, doi, citations = nested_dict[item]
+                store.add_node(parent, item, citations, authors=author,
+                               doi=doi)
+            else:
+                stack.append((nested_dict[item], store.add_node(parent, item)))
+    root = store.node(0)
+    root.update_data_sizes()
+    return root
+
+
+def read_papers(path: Optional[str] = None) -> Iterator[List[str]]:
+    """Yield the rows of the papers dataset file at <path>, or at DATA_FILE
+    if <path> is None, one at a time, without the header row.
+
+    Each row is a list of the fields of one paper: its authors, title, year,
+    categories (separated by ':'), doi and number of citations. The file is
+    read with the csv module, so quoted fields may contain commas, quotes
+    and newlines, and only one row is kept in memory at a time.
+    """
+    if path is None:
+        path = DATA_FILE
+    with open(path, 'r', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            # skip blank lines
+            if row != []:
+                yield row
+
+
+def _group_rows(rows: Iterable[List[str]], keys: Tuple[str, ...]) \
+        -> Iterator[Tuple[List[str], str, str, str, int]]:
+    """Yield each paper in <rows>, rows of the papers dataset as yielded by
+    read_papers, in the form taken by _add_papers, grouped by each of the
+    GROUPING_KEYS in <keys> in turn.
+    """
+    for row in rows:
+        categories = tuple(row[3].split(':'))
+        path = []
+        for key in keys:
+            path.extend(_group_names(key, row[2], categories, row[0]))
+        yield path, row[1], row[0], row[-2], int(row[-1])
+
+
+def _group_names(key: str, year: str, categories: Tuple[str, ...],
+                 authors: str) -> Tuple[str, ...]:
+    """Return the names of the levels that the grouping <key> adds above a
+    paper of <year>, with the levels of its category in <categories>, by
+    <authors>, who are separated by ' and '.
+
+    >>> _group_names('subcategory', '2001', ('X', 'Y', 'Z'), 'A')
+    ('Y', 'Z')
+    >>> _group_names('author', '2001', ('X',), 'Fisher, P. and Luker, P. A.')
+    ('Fisher, P.',)
+    """
+    if key == 'year':
+        return (year,)
+    elif key == 'category':
+        return categories
+    elif key == 'top_category':
+        return categories[:1]
+    elif key == 'subcategory':
+        return categories[1:]
+    else:
+        return (authors.split(' and ')[0].strip(),)
+
+
 def _load_papers_to_dict(by_year: bool = True) -> Dict:
     """Return a nested dictionary of the data read from the papers dataset file.
 
     If <by_year>, then use years as the roots of the subtrees of the root of
     the whole tree. Otherwise, ignore years and use categories only.
+
+    The file is read in a single pass with read_papers, adding each paper
+    to the dictionary as soon as it is read.
     """
     dic = {}
-    file = open(DATA_FILE, 'r')
-    read = csv.reader(file)
-    next(read)
-    # case by_year
-    if by_year:
-        for line in read:
-            # create a list to feed the dictionary
-            lst = []
-            # extend year
-            lst.extend([line[2]])
-            lst.extend(line[3].split(':'))
-            # the last item is tuple of the form paper_name, author
-            # doi, citations
-            tup = (line[1], line[0], line[-2], int(line[-1]))
-            lst.extend([tup])
-            _add_lst_to_dic(lst, dic)
-    # case not by_year
-    else:
-        for line in read:
-            # create a list to feed the dictionary
-            lst = []
-            lst.extend(line[3].split(':'))
-            # the last item is tuple of the form paper_name, author
-            # doi, citations
-            tup = (line[1], line[0], line[-2], int(line[-1]))
-            lst.extend([tup])
-            _add_lst_to_dic(lst, dic)
-    file.close()
+    for line in read_papers():
+        # create a list to feed the dictionary
+        lst = [line[2]] if by_year else []
+        lst.extend(line[3].split(':'))
+        # the last item is tuple of the form paper_name, author
+        # doi, citations
+        lst.append((line[1], line[0], line[-2], int(line[-1])))
+        _add_lst_to_dic(lst, dic)
     return dic
 
 
@@ -154,40 +370,105 @@ def _add_lst_to_dic(lst: list, dic: dict) -> None:
     >>> dic['m']['n']['g']['q'][1]
     (2, 3, 4)
     """
-    if lst == []:
-        pass
-    elif isinstance(lst[0], tuple):
-        name, author, doi, cite = lst[0]
-        dic[name] = author, doi, cite
-    elif lst[0] not in dic:
-        dic[lst[0]] = {}
-        slic = lst[1:]
-        _add_lst_to_dic(slic, dic[lst[0]])
-    else:
-        slic = lst[1:]
-        _add_lst_to_dic(slic, dic[lst[0]])
+    for item in lst:
+        if isinstance(item, tuple):
+            name, author, doi, cite = item
+            dic[name] = author, doi, cite
+            return
+        if item not in dic:
+            dic[item] = {}
+        dic = dic[item]
+
+
+def _add_papers(root: PaperTree,
+                papers: Iterable[Tuple[List[str], str, str, str, int]]) \
+        -> None:
+    """Add every paper in <papers> to the paper tree <root>, and update the
+    data_size of <root> and its subtrees.
+
+    Each paper is given as the names of the categories on the path from
+    <root> down to it, followed by its title, authors, doi and number of
+    citations. Categories with the same name under the same parent are
+    merged.
 
+    Each paper is inserted in one walk down from <root>, looking the
+    categories up by name in a trie of the nodes created so far, so each
+    PaperTree is created once and the data sizes are summed once, at the
+    end. A paper with the same title as an earlier paper in the same
+    category replaces it. Categories and papers are kept apart in the trie,
+    so a paper may have the same name as a category next to it.
 
-def _build_tree_from_dict(nested_dict: Dict) -> List[PaperTree]:
-    """Return a list of trees from the nested dictionary <nested_dict>.
+    Precondition: <root> has no subtrees.
+
+    >>> root = PaperTree('CS1', [])
+    >>> _add_papers(root, [(['2001', 'X', 'Y'], 'T1', 'A', 'doi1', 3),
+    ...                    (['2001', 'X'], 'T2', 'B', 'doi2', 4),
+    ...                    (['2002', 'X', 'Y'], 'T3', 'C', 'doi3', 5)])
+    >>> root.data_size
+    12
+    >>> [subtree._name for subtree in root._subtrees]
+    ['2001', '2002']
+    >>> year = root._subtrees[0]
+    >>> [subtree._name for subtree in year._subtrees[0]._subtrees]
+    ['Y', 'T2']
+
+    >>> root = PaperTree('CS1', [])
+    >>> _add_papers(root, [(['2001'], 'X', 'A', 'doi1', 3),
+    ...                    (['2001', 'X'], 'T1', 'B', 'doi2', 4),
+    ...                    (['2001'], 'X', 'C', 'doi3', 5),
+    ...                    (['2001', 'X'], 'T2', 'D', 'doi4', 6)])
+    >>> year = root._subtrees[0]
+    >>> [(subtree._name, subtree.data_size) for subtree in year._subtrees]
+    [('X', 5), ('X', 10)]
+    >>> [subtree._name for subtree in year._subtrees[1]._subtrees]
+    ['T1', 'T2']
     """
-    lst = []
-    for item in nested_dict:
-        if isinstance(nested_dict[item], tuple):
-            author, doi, citations = nested_dict[item]
-            a = PaperTree(item, [], author, doi, citations)
-            lst.append(a)
+    # the trie maps the name of each subtree of a node, paired with whether
+    # that subtree is a paper, to the subtree and the trie of its own
+    # subtrees, or None if the subtree is a paper
+    trie: Dict[Tuple[str, bool], Tuple[PaperTree, Optional[dict]]] = {}
+    for path, title, authors, doi, citations in papers:
+        parent, level = root, trie
+        for category in path:
+            entry = level.get((category, False))
+            if entry is None:
+                entry = PaperTree(category, []), {}
+                _add_paper_tree(parent, entry, level)
+            parent, level = entry
+        entry = level.get((title, True))
+        if entry is None:
+            _add_paper_tree(parent, (PaperTree(title, [], authors, doi,
+                                               citations), None), level)
         else:
-            k = PaperTree(item, _build_tree_from_dict(nested_dict[item]),
-                          '', '')
-            lst.append(k)
-    return lst
+            paper = entry[0]
+            paper._authors = authors
+            paper._doi = doi
+            paper.data_size = citations
+    root.update_data_sizes()
+
+
+def _add_paper_tree(parent: PaperTree,
+                    entry: Tuple[PaperTree, Optional[dict]],
+                    level: Dict[Tuple[str, bool],
+                                Tuple[PaperTree, Optional[dict]]]) -> None:
+    """Add the PaperTree of <entry> as the last subtree of <parent>, and
+    <entry> to <level>, the trie of the subtrees of <parent> used by
+    _add_papers.
+
+    The data_size of the ancestors of the new subtree is not updated.
+    """
+    subtree = entry[0]
+    subtree._parent_tree = parent
+    parent._subtrees.append(subtree)
+    level[subtree._name, entry[1] is None] = entry
 
 
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
-        'allowed-import-modules': ['python_ta', 'typing', 'csv', 'tm_trees'],
-        'allowed-io': ['_load_papers_to_dict'],
+        'allowed-import-modules': ['python_ta', 'typing', 'csv', 'tm_trees',
+                                   'compact_tree', 'collections',
+                                   '__future__'],
+        'allowed-io': ['read_papers'],
         'max-args': 8
     })
@@ -0,0 +1,390 @@
+from __future__ import annotations
+import functools
+import json
+import time
+from typing import Any, Callable, Dict, List, Tuple
+from tm_trees import NODE_VISITS
+
+# The TMTree methods that Profiler.instrument times when none are given.
+INSTRUMENTED_METHODS = (
+    'update_rectangles', 'update_changed_rectangles', 'get_rectangles',
+    'get_rectangle_arrays', 'get_displayed_leaves', 'get_tree_at_position',
+    'update_data_sizes', 'move', 'change_size', 'expand', 'expand_all',
+    'collapse', 'collapse_all'
+)
+
+# The number of buckets of a latency histogram. Bucket 0 counts latencies
+# under 1 microsecond, and bucket i > 0 those from 2 ** (i - 1) up to
+# 2 ** i microseconds; the last bucket also counts everything slower.
+HISTOGRAM_BUCKETS = 32
+
+# The version of the format of the files written by Profiler.dump.
+STATS_VERSION = 1
+
+
+class PhaseStats:
+    """The latencies of one phase of the visualiser, or of one instrumented
+    method, and the number of nodes it visited.
+
+    === Public Attributes ===
+    count:
+        The number of times the phase ran.
+    total:
+        The total number of seconds it took.
+    worst:
+        The number of seconds taken by its slowest run.
+    visits:
+        The number of nodes visited while it ran, as counted in
+        tm_trees.NODE_VISITS while a tree class is instrumented, plus those
+        reported to Profiler.record.
+    items:
+        The total length of the lists returned by an instrumented method.
+    histogram:
+        The number of runs in each latency bucket, as described at
+        HISTOGRAM_BUCKETS.
+
+    === Representation Invariants ===
+    - len(histogram) == HISTOGRAM_BUCKETS
+    - sum(histogram) == count
+    """
+
+    count: int
+    total: float
+    worst: float
+    visits: int
+    items: int
+    histogram: List[int]
+
+    def __init__(self) -> None:
+        """Initialize the statistics of a phase that never ran.
+        """
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.visits = 0
+        self.items = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def record(self, seconds: float) -> None:
+        """Record a run of the phase that took <seconds>.
+        """
+        self.count += 1
+        self.total += seconds
+        self.worst = max(self.worst, seconds)
+        bucket = min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)
+        self.histogram[bucket] += 1
+
+    def mean(self) -> float:
+        """Return the mean number of seconds taken by a run, or 0.0 if the
+        phase never ran.
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """Return an upper bound on the number of seconds within which
+        <fraction> of the runs finished, from the histogram: the upper
+        limit of the bucket that holds that run.
+
+        Precondition: 0 <= fraction <= 1
+
+        >>> stats = PhaseStats()
+        >>> for seconds in [0.000003, 0.000003, 0.000003, 0.001]:
+        ...     stats.record(seconds)
+        >>> stats.percentile(0.5)
+        4e-06
+        >>> stats.percentile(1.0)
+        0.001024
+        """
+        needed = fraction * self.count
+        seen = 0
+        for bucket, runs in enumerate(self.histogram):
+            seen += runs
+            if runs and seen >= needed:
+                return 2 ** bucket / 1e6
+        return 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return these statistics as a dictionary that can be written as
+        JSON, with the non-empty histogram buckets keyed by their upper
+        limit in microseconds.
+        """
+        return {
+            'count': self.count, 'total': self.total, 'mean': self.mean(),
+            'p50': self.percentile(0.5), 'p95': self.percentile(0.95),
+            'worst': self.worst, 'visits': self.visits, 'items': self.items,
+            'histogram_us': {str(2 ** bucket): runs for bucket, runs
+                             in enumerate(self.histogram) if runs}
+        }
+
+
+class _Phase:
+    """A context manager that records the time taken by its body, and the
+    nodes it visited, as a run of a phase of a Profiler.
+
+    === Private Attributes ===
+    _stats:
+        The statistics of the phase.
+    _start:
+        The value of time.perf_counter() when the body started.
+    _visits:
+        The value of NODE_VISITS.count when the body started.
+    """
+
+    _stats: PhaseStats
+    _start: float
+    _visits: int
+
+    def __init__(self, stats: PhaseStats) -> None:
+        """Initialize a context manager that records runs into <stats>.
+        """
+        self._stats = stats
+        self._start = 0.0
+        self._visits = 0
+
+    def __enter__(self) -> _Phase:
+        """Start timing the body."""
+        self._visits = NODE_VISITS.count
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Record the time taken by the body and the nodes it visited."""
+        self._stats.record(time.perf_counter() - self._start)
+        self._stats.visits += NODE_VISITS.count - self._visits
+
+
+class _NoPhase:
+    """A context manager that does nothing, used in place of a _Phase when
+    profiling is turned off.
+    """
+
+    def __enter__(self) -> _NoPhase:
+        """Do nothing."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Do nothing."""
+
+
+_NO_PHASE = _NoPhase()
+
+
+def no_phase(name: str) -> _NoPhase:
+    """Return a context manager that does nothing, for the phase <name>.
+
+    Use this in place of Profiler.phase when profiling is turned off.
+    """
+    return _NO_PHASE
+
+
+class Profiler:
+    """A collector of the latencies of the phases of the visualiser and of
+    the main TMTree operations.
+
+    Code times a phase with "with profiler.phase(name):". The methods of a
+    tree class are timed by instrument, which replaces them with wrappers
+    until uninstrument is called, and the traversals of trees count the
+    nodes they visit in tm_trees.NODE_VISITS while any class is
+    instrumented. Nothing is changed until then, so a profiler that is not
+    used costs nothing.
+
+    === Private Attributes ===
+    _stats:
+        The statistics of each phase and method, by name.
+    _running:
+        The instrumented methods that are running, with the number of
+        calls of each that have not returned yet.
+    _originals:
+        For each method replaced by instrument, its class, its name and
+        the attribute of the class it replaced, or None if the method was
+        inherited.
+    """
+
+    _stats: Dict[str, PhaseStats]
+    _running: Dict[str, int]
+    _originals: List[Tuple[type, str, Any]]
+
+    def __init__(self) -> None:
+        """Initialize a new profiler that has recorded nothing.
+        """
+        self._stats = {}
+        self._running = {}
+        self._originals = []
+
+    def stats(self, name: str) -> PhaseStats:
+        """Return the statistics of the phase or method <name>.
+        """
+        if name not in self._stats:
+            self._stats[name] = PhaseStats()
+        return self._stats[name]
+
+    def phase(self, name: str) -> _Phase:
+        """Return a context manager that records the time taken by its body
+        as a run of the phase <name>.
+
+        >>> profiler = Profiler()
+        >>> with profiler.phase('render'):
+        ...     pass
+        >>> profiler.stats('render').count
+        1
+
+        While a tree class is instrumented, the phase also records the
+        nodes visited by the traversals in its body:
+
+        >>> from tm_trees import TMTree
+        >>> tree = TMTree('root', [TMTree(str(i), [], 1) for i in range(5)])
+        >>> tree.expand()
+        >>> profiler.instrument(TMTree, ())
+        >>> with profiler.phase('leaves'):
+        ...     _ = tree.get_displayed_leaves()
+        >>> profiler.uninstrument()
+        >>> profiler.stats('leaves').visits
+        5
+        """
+        return _Phase(self.stats(name))
+
+    def record(self, name: str, seconds: float, visits: int = 0) -> None:
+        """Record a run of the phase <name> that took <seconds> and visited
+        <visits> nodes.
+        """
+        stats = self.stats(name)
+        stats.record(seconds)
+        stats.visits += visits
+
+    def instrument(self, cls: type,
+                   methods: Tuple[str, ...] = INSTRUMENTED_METHODS) -> None:
+        """Time every call of the <methods> of <cls>, and of the classes
+        that inherit them, until uninstrument is called.
+
+        Only the outermost call of a recursive method is timed. Every call,
+        recursive or not, counts as a visit to the node it is called on;
+        the visits of the outermost call also count the nodes visited by
+        the traversals of the trees while it runs. The length of the list it
+        returns, if any, is added to the items of the method.
+
+        >>> from tm_trees import TMTree
+        >>> profiler = Profiler()
+        >>> profiler.instrument(TMTree, ('get_tree_at_position',))
+        >>> tree = TMTree('root', [TMTree('a', [], 1), TMTree('b', [], 1)])
+        >>> tree.update_rectangles((0, 0, 10, 10))
+        >>> tree.expand()
+        >>> tree.get_tree_at_position((1, 1))._name
+        'a'
+        >>> stats = profiler.stats(TMTree.__name__ + '.get_tree_at_position')
+        >>> stats.count, stats.visits
+        (1, 2)
+        >>> profiler.uninstrument()
+        >>> 'get_tree_at_position' in TMTree.__dict__
+        True
+
+        The visits of a traversal grow with the number of nodes it touches:
+
+        >>> profiler = Profiler()
+        >>> profiler.instrument(TMTree, ('update_rectangles',))
+        >>> for leaves in [10, 100]:
+        ...     tree = TMTree('root', [TMTree(str(i), [], 1)
+        ...                            for i in range(leaves)])
+        ...     tree.update_rectangles((0, 0, 100, 100))
+        >>> stats = profiler.stats(TMTree.__name__ + '.update_rectangles')
+        >>> stats.count, stats.visits
+        (2, 112)
+        >>> profiler.uninstrument()
+        """
+        NODE_VISITS.enabled = True
+        for name in methods:
+            if not hasattr(cls, name):
+                continue
+            self._originals.append((cls, name, cls.__dict__.get(name)))
+            setattr(cls, name, self._wrap(cls.__name__ + '.' + name,
+                                          getattr(cls, name)))
+
+    def uninstrument(self) -> None:
+        """Restore every method replaced by instrument.
+        """
+        for cls, name, original in reversed(self._originals):
+            if original is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, original)
+        self._originals = []
+        NODE_VISITS.enabled = False
+
+    def _wrap(self, name: str, method: Callable) -> Callable:
+        """Return a function that calls <method> and records the call as a
+        run of <name>.
+        """
+        stats = self.stats(name)
+        running = self._running
+
+        @functools.wraps(method)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            """Call the instrumented method and record the call."""
+            NODE_VISITS.count += 1
+            if running.get(name, 0) > 0:
+                # a recursive call, timed as part of the outermost one
+                return method(*args, **kwargs)
+            running[name] = 1
+            visits = NODE_VISITS.count - 1
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                stats.record(time.perf_counter() - start)
+                stats.visits += NODE_VISITS.count - visits
+                running[name] = 0
+            if isinstance(result, list):
+                stats.items += len(result)
+            return result
+
+        return wrapper
+
+    def summary(self, limit: int = 3) -> str:
+        """Return a one-line summary of the <limit> phases and methods that
+        took the most time in total, with their mean and 95th percentile
+        latencies in milliseconds.
+
+        >>> profiler = Profiler()
+        >>> profiler.record('render', 0.002)
+        >>> profiler.record('hit_test', 0.0001)
+        >>> profiler.summary()
+        'render 2.00/2.05ms  hit_test 0.10/0.13ms'
+        """
+        busiest = sorted(self._stats.items(), key=lambda item: -item[1].total)
+        return '  '.join('{} {:.2f}/{:.2f}ms'.format(
+            name, stats.mean() * 1000, stats.percentile(0.95) * 1000)
+                         for name, stats in busiest[:limit] if stats.count)
+
+    def report(self) -> str:
+        """Return a table of the statistics of every phase and method, with
+        latencies in milliseconds.
+        """
+        lines = ['{:<36}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}'.format(
+            'phase', 'count', 'mean', 'p95', 'worst', 'visits', 'items')]
+        for name, stats in sorted(self._stats.items()):
+            lines.append('{:<36}{:>8}{:>10.3f}{:>10.3f}{:>10.3f}{:>10}{:>10}'
+                         .format(name, stats.count, stats.mean() * 1000,
+                                 stats.percentile(0.95) * 1000,
+                                 stats.worst * 1000, stats.visits,
+                                 stats.items))
+        return '\n'.join(lines)
+
+    def dump(self, path: str) -> None:
+        """Write the statistics of every phase and method to the JSON file
+        at <path>.
+        """
+        with open(path, 'w') as file:
+            json.dump({'version': STATS_VERSION,
+                       'phases': {name: stats.to_dict() for name, stats
+                                  in sorted(self._stats.items())}},
+                      file, indent=2)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'functools', 'json', 'time', 'tm_trees',
+            '__future__'
+        ],
+        'allowed-io': ['dump']
+    })
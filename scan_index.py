@@ -0,0 +1,176 @@
+from __future__ import annotations
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Format version of the index file. Files with another version are ignored.
+INDEX_VERSION = 1
+
+# One entry of a folder listing: (name, is_directory, size in bytes).
+# The size of a folder entry is always 0; folders get their size from
+# their subtrees.
+Entry = Tuple[str, bool, int]
+
+
+class ScanIndex:
+    """An on-disk index of folder listings, used to rescan a folder without
+    rereading the folders that have not changed.
+
+    For every folder seen by the last scan, the index stores the folder's
+    modification time together with the names, types and sizes of its
+    entries. During the next scan, a folder whose modification time is
+    unchanged reuses its stored listing, so only one stat call is made for
+    it instead of listing it and stat'ing every file in it.
+
+    Note that a folder's modification time only changes when entries are
+    created, deleted or renamed in it. A file that is rewritten in place
+    keeps its old size in the index until its folder changes.
+
+    >>> import tempfile
+    >>> from fs_scanner import FileSystemScanner
+    >>> def write(path, size):
+    ...     with open(path, 'w') as file:
+    ...         _ = file.write('a' * size)
+    >>> def scan(root, index_path):
+    ...     index = ScanIndex(index_path)
+    ...     tree = FileSystemScanner(workers=1, index=index).scan(root)
+    ...     return tree.data_size, index.hits, index.misses
+    >>> with tempfile.TemporaryDirectory() as root, \\
+    ...         tempfile.TemporaryDirectory() as index_folder:
+    ...     src = os.path.join(root, 'src')
+    ...     os.mkdir(src)
+    ...     os.mkdir(os.path.join(root, 'docs'))
+    ...     write(os.path.join(src, 'a.py'), 5)
+    ...     write(os.path.join(root, 'docs', 'b.md'), 3)
+    ...     index_path = os.path.join(index_folder, 'index.json')
+    ...     first = scan(root, index_path)
+    ...     # a.py grows in place, which does not change the mtime of src
+    ...     write(os.path.join(src, 'a.py'), 50)
+    ...     unchanged = scan(root, index_path)
+    ...     write(os.path.join(src, 'c.py'), 7)
+    ...     mtime = os.stat(src).st_mtime_ns + 10 ** 9
+    ...     os.utime(src, ns=(mtime, mtime))
+    ...     changed = scan(root, index_path)
+    ...     with open(index_path, 'w') as file:
+    ...         _ = file.write('{not json')
+    ...     corrupt = scan(root, index_path)
+    >>> first, unchanged, changed, corrupt
+    ((8, 0, 3), (8, 3, 0), (60, 2, 1), (60, 0, 3))
+
+    The first scan has no index file yet, so it reads all three folders.
+    The second reuses every listing, so it still sees the old size of a.py.
+    The third rereads src, whose mtime changed, and finds c.py and the new
+    size of a.py. The last one falls back to a full scan, since the index
+    file is corrupt.
+
+    === Public Attributes ===
+    path:
+        The path of the file this index is stored in.
+    hits:
+        The number of folders whose listing was reused by the current scan.
+    misses:
+        The number of folders that were read from disk by the current scan.
+
+    === Private Attributes ===
+    _root:
+        The folder that the stored listings belong to, or None if no
+        index has been loaded.
+    _dirs:
+        The listings stored by the previous scan, keyed by folder path, each
+        with the modification time (in nanoseconds) it was read at.
+    _fresh:
+        The listings recorded by the current scan.
+    """
+
+    path: str
+    hits: int
+    misses: int
+    _root: Optional[str]
+    _dirs: Dict[str, Tuple[int, List[Entry]]]
+    _fresh: Dict[str, Tuple[int, List[Entry]]]
+
+    def __init__(self, path: str) -> None:
+        """Initialize a new index stored in the file at <path>.
+
+        The file is only read when a scan begins, and does not need to
+        exist yet.
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._root = None
+        self._dirs = {}
+        self._fresh = {}
+
+    def begin(self, root: str) -> None:
+        """Prepare this index for a scan of the folder at <root>.
+
+        Load the listings stored by the previous scan, unless they belong to
+        another folder or the index file is missing or unreadable.
+        """
+        self.hits = 0
+        self.misses = 0
+        self._fresh = {}
+        if self._root != root:
+            self._root = root
+            self._dirs = {}
+            try:
+                with open(self.path, 'r') as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                return
+            if data.get('version') == INDEX_VERSION \
+                    and data.get('root') == root:
+                for dir_path, (mtime, entries) in data['dirs'].items():
+                    self._dirs[dir_path] = \
+                        (mtime, [tuple(entry) for entry in entries])
+
+    def lookup(self, dir_path: str, mtime: int) -> Optional[List[Entry]]:
+        """Return the stored listing of the folder at <dir_path>, or None if
+        there is none or the folder was modified after <mtime>.
+        """
+        stored = self._dirs.get(dir_path)
+        if stored is not None and stored[0] == mtime:
+            return stored[1]
+        return None
+
+    def record(self, dir_path: str, mtime: int, entries: List[Entry],
+               reused: bool) -> None:
+        """Record <entries> as the listing of the folder at <dir_path> at
+        modification time <mtime>. <reused> tells whether the listing came
+        from this index rather than from disk.
+        """
+        self._fresh[dir_path] = (mtime, entries)
+        if reused:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def save(self) -> None:
+        """Replace the stored listings by the ones recorded during the
+        current scan, and write them to this index's file.
+
+        Folders that were not seen by the current scan are dropped. The file
+        is left untouched if every listing was reused.
+        """
+        unchanged = self.misses == 0 and len(self._fresh) == len(self._dirs)
+        self._dirs = self._fresh
+        self._fresh = {}
+        if unchanged:
+            return
+        data = {'version': INDEX_VERSION, 'root': self._root,
+                'dirs': self._dirs}
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(json.dumps(data, separators=(',', ':')))
+        os.replace(temp_path, self.path)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'json', 'os', '__future__'
+        ],
+        'allowed-io': ['begin', 'save']
+    })
@@ -0,0 +1,227 @@
+"""Save trees to binary snapshot files, and open them again without
+rebuilding them.
+
+A snapshot holds the structure, data sizes, names, colours, rectangles and
+expanded state of every node of a tree, together with the extra string
+fields of its class, such as the authors and doi of a PaperTree. It is laid
+out like the arrays of a CompactTreeStore, so that load_snapshot can map the
+file into memory and use it as the arrays of a store directly: opening a
+snapshot only reads its header, and the pages of the file are read as the
+nodes on them are visited.
+
+The file starts with a fixed header (SNAPSHOT_MAGIC, the format version, the
+length of the metadata, and the numbers of nodes and strings), followed by
+the metadata as JSON, and then by each array in turn, in SECTIONS order,
+then one array of indices per extra field, then the offsets and the UTF-8
+bytes of the string table. Every part starts at a multiple of 8 bytes.
+"""
+from __future__ import annotations
+import json
+import mmap
+import struct
+import sys
+from typing import BinaryIO, Dict, Tuple, Union
+from tm_trees import TMTree
+from compact_tree import CompactTree, CompactTreeStore, compact_copy
+
+# The first bytes of every snapshot file.
+SNAPSHOT_MAGIC = b'TMSNAP\x00\x00'
+
+# The version of the snapshot format. Files with another version are
+# rejected by load_snapshot.
+SNAPSHOT_VERSION = 1
+
+# The header: magic, version, length of the metadata in bytes, number of
+# nodes and number of strings.
+_HEADER = struct.Struct('<8sIIQQ')
+
+# The arrays of a CompactTreeStore stored for every node, in file order,
+# with their typecode and number of items per node.
+SECTIONS = (('_parent', 'i', 1), ('_first_child', 'i', 1),
+            ('_last_child', 'i', 1), ('_next_sibling', 'i', 1),
+            ('_size', 'q', 1), ('_colour', 'I', 1), ('_rect', 'i', 4),
+            ('_expanded', 'B', 1), ('_name', 'i', 1))
+
+# The attributes every TMTree has, which are never saved as extra fields.
+_TMTREE_ATTRIBUTES = ('rect', 'data_size', '_colour', '_name', '_subtrees',
+                      '_parent_tree', '_expanded', '_dirty')
+
+
+class SnapshotStrings:
+    """The string table of a snapshot, read from the mapped file one string
+    at a time, when it is first looked up.
+
+    === Private Attributes ===
+    _offsets:
+        The offset in <_data> of each string, followed by the end of the
+        last one.
+    _data:
+        The UTF-8 bytes of every string, one after the other.
+    _decoded:
+        The strings looked up so far, by index.
+
+    === Representation Invariants ===
+    - _offsets is non-decreasing, and its last item is len(_data)
+    """
+
+    _offsets: memoryview
+    _data: memoryview
+    _decoded: Dict[int, str]
+
+    def __init__(self, offsets: memoryview, data: memoryview) -> None:
+        """Initialize the string table with the string <offsets> in <data>.
+        """
+        self._offsets = offsets
+        self._data = data
+        self._decoded = {}
+
+    def __len__(self) -> int:
+        """Return the number of strings in this table.
+        """
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        """Return the string at <index>.
+        """
+        string = self._decoded.get(index)
+        if string is None:
+            if index < 0:
+                index += len(self)
+            string = bytes(self._data[self._offsets[index]:
+                                      self._offsets[index + 1]]).decode()
+            self._decoded[index] = string
+        return string
+
+
+def save_snapshot(tree: Union[TMTree, CompactTree], path: str) -> None:
+    """Save the whole tree that <tree> is the root of to a snapshot file at
+    <path>.
+
+    A TMTree is first copied into a CompactTreeStore with compact_copy,
+    keeping every string attribute that its class adds to TMTree, such as
+    PaperTree._authors, as an extra field.
+
+    Precondition: <tree> is the root of its tree, and if it is a
+    CompactTree, it is the node 0 of its store.
+    """
+    if isinstance(tree, TMTree):
+        tree = compact_copy(tree, _extra_fields(tree))
+    store = tree._store
+    strings = [store._strings[i] for i in range(len(store._strings))]
+    encoded = [string.encode() for string in strings]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    metadata = json.dumps({
+        'separator': store.separator, 'leaf_suffix': store.leaf_suffix,
+        'internal_suffix': store.internal_suffix,
+        'fields': list(store._fields), 'byteorder': sys.byteorder
+    }).encode()
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                len(metadata), len(store), len(strings)))
+        _write_section(file, metadata)
+        for name, _, _ in SECTIONS:
+            _write_section(file, getattr(store, name))
+        for field in store._fields:
+            _write_section(file, store._fields[field])
+        _write_section(file, struct.pack('={}Q'.format(len(offsets)),
+                                         *offsets))
+        _write_section(file, b''.join(encoded))
+
+
+def load_snapshot(path: str) -> CompactTree:
+    """Return the root of the tree saved to the snapshot file at <path>.
+
+    The file is mapped into memory, copy-on-write, and its arrays are used
+    as those of a CompactTreeStore without copying them, so this takes the
+    same short time whatever the size of the tree. Changes made to the tree
+    are never written back to the file.
+
+    Raise ValueError if the file is not a snapshot of version
+    SNAPSHOT_VERSION written on a machine of the same byte order.
+    """
+    with open(path, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    view = memoryview(mapped)
+    if len(view) < _HEADER.size:
+        raise ValueError('{} is not a snapshot file'.format(path))
+    magic, version, metadata_size, nodes, strings = \
+        _HEADER.unpack_from(view)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError('{} is not a snapshot file of version {}'
+                         .format(path, SNAPSHOT_VERSION))
+    offset = _HEADER.size
+    metadata = json.loads(bytes(view[offset:offset + metadata_size]))
+    if metadata['byteorder'] != sys.byteorder:
+        raise ValueError('{} was saved with another byte order'.format(path))
+    offset = _align(offset + metadata_size)
+
+    store = CompactTreeStore(metadata['separator'], metadata['leaf_suffix'],
+                             metadata['internal_suffix'])
+    sections = [(name, typecode, nodes * per_node)
+                for name, typecode, per_node in SECTIONS]
+    sections.extend(('', 'i', nodes) for _ in metadata['fields'])
+    arrays = []
+    for _, typecode, length in sections:
+        size = length * struct.calcsize(typecode)
+        if offset + size > len(view):
+            raise ValueError('{} is truncated'.format(path))
+        arrays.append(view[offset:offset + size].cast(typecode))
+        offset = _align(offset + size)
+    for (name, _, _), array in zip(SECTIONS, arrays):
+        setattr(store, name, array)
+    store._fields = dict(zip(metadata['fields'], arrays[len(SECTIONS):]))
+
+    size = (strings + 1) * struct.calcsize('Q')
+    if offset + size > len(view):
+        raise ValueError('{} is truncated'.format(path))
+    offsets = view[offset:offset + size].cast('Q')
+    offset = _align(offset + size)
+    if offset + offsets[-1] > len(view):
+        raise ValueError('{} is truncated'.format(path))
+    store._strings = SnapshotStrings(offsets,
+                                     view[offset:offset + offsets[-1]])
+    return store.node(0)
+
+
+def _extra_fields(tree: TMTree) -> Tuple[str, ...]:
+    """Return the names, without their leading underscore, of the string
+    attributes that the class of <tree> adds to those of TMTree.
+
+    >>> from papers import PaperTree
+    >>> _extra_fields(PaperTree('paper', [], 'Fisher, P.', 'doi', 6))
+    ('authors', 'doi')
+    """
+    return tuple(name[1:] for name, value in vars(tree).items()
+                 if name.startswith('_') and name not in _TMTREE_ATTRIBUTES
+                 and isinstance(value, str))
+
+
+def _write_section(file: BinaryIO, data: Union[bytes, memoryview]) -> None:
+    """Write <data>, any object with the buffer interface, to <file>, and
+    pad it with zeros up to a multiple of 8 bytes.
+    """
+    size = memoryview(data).nbytes
+    file.write(data)
+    file.write(bytes(_align(size) - size))
+
+
+def _align(offset: int) -> int:
+    """Return the smallest multiple of 8 that is at least <offset>.
+
+    >>> _align(13), _align(16)
+    (16, 16)
+    """
+    return (offset + 7) // 8 * 8
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'json', 'mmap', 'struct', 'sys',
+            'tm_trees', 'compact_tree', 'papers', '__future__'
+        ],
+        'allowed-io': ['save_snapshot', 'load_snapshot']
+    })
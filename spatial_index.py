@@ -0,0 +1,130 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+from tm_trees import TMTree, NODE_VISITS
+
+# The width and height, in pixels, of a cell of the grid when none is given.
+DEFAULT_CELL_SIZE = 16
+
+
+class SpatialIndex:
+    """A uniform grid over the rectangles of the leaves in a displayed-tree,
+    used to find the leaf at a position without walking down the tree.
+
+    Each cell of the grid lists the leaves whose rectangle touches it, so a
+    lookup only checks the leaves of one cell. Leaves that have exactly the
+    same rectangle as an earlier leaf (such as the empty rectangles of
+    subtrees of size 0) are never returned by TMTree.get_tree_at_position,
+    so they are left out.
+
+    The index is a snapshot: build a new one whenever the rectangles or the
+    expanded state of the tree change.
+
+    While the traversals of trees count their visits, a lookup counts each
+    leaf it checks as a visit.
+
+    === Private Attributes ===
+    _cell_size:
+        The width and height of a cell, in pixels.
+    _leaves:
+        The leaves in the index, in displayed-tree order.
+    _rects:
+        The rectangle of each leaf in <_leaves>.
+    _cells:
+        The indices in <_leaves> of the leaves whose rectangle touches each
+        cell, in increasing order, keyed by the (column, row) of the cell.
+
+    === Representation Invariants ===
+    - _cell_size >= 1
+    - len(_leaves) == len(_rects)
+    """
+
+    _cell_size: int
+    _leaves: List[TMTree]
+    _rects: List[Tuple[int, int, int, int]]
+    _cells: Dict[Tuple[int, int], List[int]]
+
+    def __init__(self, tree: TMTree,
+                 cell_size: int = DEFAULT_CELL_SIZE) -> None:
+        """Initialize a new index of the leaves in the displayed-tree rooted
+        at <tree>, with cells of <cell_size> by <cell_size> pixels.
+        """
+        self._cell_size = max(1, cell_size)
+        self._leaves = []
+        self._rects = []
+        self._cells = {}
+        seen = set()
+        for leaf in tree.get_displayed_leaves():
+            rect = leaf.rect
+            if rect in seen:
+                continue
+            seen.add(rect)
+            leaf_id = len(self._leaves)
+            self._leaves.append(leaf)
+            self._rects.append(rect)
+            x, y, width, height = rect
+            # rectangles contain their edges, so a rectangle ending exactly
+            # on a cell boundary also touches the next cell
+            for column in range(x // self._cell_size,
+                                (x + width) // self._cell_size + 1):
+                for row in range(y // self._cell_size,
+                                 (y + height) // self._cell_size + 1):
+                    self._cells.setdefault((column, row), []).append(leaf_id)
+
+    def __len__(self) -> int:
+        """Return the number of leaves in this index.
+        """
+        return len(self._leaves)
+
+    def get_tree_at_position(self, pos: Tuple[int, int]) -> Optional[TMTree]:
+        """Return the same leaf as tree.get_tree_at_position(<pos>), where
+        tree is the tree this index was built from.
+
+        If <pos> is on the shared edge between two rectangles, return the
+        tree represented by the rectangle that is closer to the origin.
+
+        >>> leaves = [TMTree(str(i), [], 1) for i in range(4)]
+        >>> tree = TMTree('root', leaves)
+        >>> tree.update_rectangles((0, 0, 100, 30))
+        >>> tree.expand()
+        >>> index = SpatialIndex(tree)
+        >>> all(index.get_tree_at_position((x, y)) is
+        ...     tree.get_tree_at_position((x, y))
+        ...     for x in range(-1, 102) for y in range(-1, 32))
+        True
+        >>> NODE_VISITS.enabled = True
+        >>> before = NODE_VISITS.count
+        >>> index.get_tree_at_position((30, 10))._name
+        '1'
+        >>> NODE_VISITS.count - before
+        2
+        >>> NODE_VISITS.enabled = False
+        """
+        x_in, y_in = pos
+        candidates = self._cells.get((x_in // self._cell_size,
+                                      y_in // self._cell_size), [])
+        if NODE_VISITS.enabled:
+            NODE_VISITS.count += len(candidates)
+        best = None
+        best_key = None
+        for leaf_id in candidates:
+            x, y, width, height = self._rects[leaf_id]
+            if x + width < x_in or x_in < x or y + height < y_in or y_in < y:
+                continue
+            # prefer a rectangle with <pos> on its right or bottom edge,
+            # then the one closest to the origin
+            on_far_edge = x_in == x + width or y_in == y + height
+            key = (not on_far_edge, x ** 2 + y ** 2)
+            if best_key is None or key < best_key:
+                best, best_key = leaf_id, key
+        if best is None:
+            return None
+        return self._leaves[best]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'python_ta', 'typing', 'tm_trees', '__future__'
+        ]
+    })
@@ -1,12 +1,54 @@
+from __future__ import annotations
+import math
+import os
+from random import getrandbits
+from typing import List, Tuple, Optional
+import numpy as np
+from layouts import LayoutEngine, SLICE_AND_DICE
+
+
+class NodeVisits:
+    """A count of the nodes visited by the traversals of trees.
+
+    The traversals only add to the count while it is enabled, which it is
+    while a Profiler instruments a tree class. They check this once per
+    call, never once per node, so that they cost nothing more otherwise.
+    Recursive methods do not count themselves: the Profiler counts each
+    call of an instrumented method as a visit to the node it is called on,
+    and the iterative traversals add the nodes they visit below it.
+
+    === Public Attributes ===
+    enabled:
+        Whether the traversals add to the count.
+    count:
+        The number of nodes visited while the count was enabled.
+    """
+
+    enabled: bool
+    count: int
+
+    def __init__(self) -> None:
+        """Initialize a new disabled count of 0 nodes.
+        """
+        self.enabled = False
+        self.count = 0
+
+
+# The count of the nodes visited by the traversals of every tree, which a
+# Profiler reads before and after each call and phase it times.
+NODE_VISITS = NodeVisits()
+
+
 class TMTree:
     """A TreeMappableTree: a tree that is compatible with the treemap
     visualiser.
 
     This is an abstract class that should not be instantiated directly.
 
-    You may NOT add any attributes, public or private, to this class.
-    However, part of this assignment will involve you implementing new public
-    *methods* for this interface.
+    Besides the attributes of the original interface, every tree has a
+    private _dirty flag, which update_changed_rectangles uses to skip the
+    subtrees that did not change. Subclasses, such as FileSystemTree, may
+    add attributes of their own.
     You should not add any new public methods other than those required by
     the client code.
     You can, however, freely add private methods as needed.
@@ -30,6 +72,11 @@ class TMTree:
         as a subtree, or None if this tree is not part of a larger tree.
     _expanded:
         Whether or not this tree is considered expanded for visualization.
+    _dirty:
+        Whether the data_size or the subtrees of this tree or one of its
+        descendants changed since its rectangles were last updated. It is
+        set by the methods that change sizes or subtrees (_add_to_size,
+        change_size, move) and cleared when the rectangles are updated.
 
     === Representation Invariants ===
     - data_size >= 0
@@ -48,6 +95,9 @@ class TMTree:
     - if _expanded is False, then _expanded is False for every tree
       in _subtrees
     - if _subtrees is empty, then _expanded is False
+
+    - if _dirty is True, then _parent_tree is None or _parent_tree._dirty
+      is True
     """
 
     rect: Tuple[int, int, int, int]
@@ -57,6 +107,7 @@ class TMTree:
     _subtrees: List[TMTree]
     _parent_tree: Optional[TMTree]
     _expanded: bool
+    _dirty: bool
 
     def __init__(self, name: str, subtrees: List[TMTree],
                  data_size: int = 0) -> None:
@@ -78,13 +129,13 @@ class TMTree:
         self._parent_tree = None
         # change made Task 5
         self._expanded = False
+        self._dirty = True
         # 1. Initialize self._colour and self.data_size, according to the
         # docstring.
         # 2. Set this tree as the parent for each of its subtrees.
-        r = randint(0, 255)
-        g = randint(0, 255)
-        b = randint(0, 255)
-        self._colour = r, g, b
+        # one call for the three random channels, as randint is slow
+        rgb = getrandbits(24)
+        self._colour = rgb >> 16, (rgb >> 8) & 255, rgb & 255
         if subtrees == []:
             self.data_size = data_size
         else:
@@ -99,84 +150,221 @@ class TMTree:
         """
         return self._name is None
 
-    def update_rectangles(self, rect: Tuple[int, int, int, int]) -> None:
+    def update_rectangles(self, rect: Tuple[int, int, int, int],
+                          engine: LayoutEngine = SLICE_AND_DICE) -> None:
         """Update the rectangles in this tree and its descendents using the
         treemap algorithm to fill the area defined by pygame rectangle <rect>.
+
+        <engine> is the layout algorithm that divides the rectangle of each
+        tree among its subtrees.
         """
-        # Read the handout carefully to help get started identifying base cases,
-        # then write the outline of a recursive step.
-        #
-        # Programming tip: use "tuple unpacking assignment" to easily extract
-        # elements of a rectangle, as follows.
-        # x, y, width, height = rect
+        self._layout_levels(rect, engine, False)
+
+    def update_changed_rectangles(self, rect: Tuple[int, int, int, int],
+                                  engine: LayoutEngine = SLICE_AND_DICE) \
+            -> None:
+        """Update the rectangles in this tree and its descendents like
+        update_rectangles, but skip every subtree whose rectangle stays the
+        same and whose data_size and subtrees did not change since its
+        rectangles were last updated.
+
+        Changes made by change_size and move are tracked, so there is no need
+        to call update_data_sizes first.
+
+        Precondition: the rectangles were last updated with <engine>.
+
+        >>> leaves = [TMTree(str(i), [], i + 1) for i in range(6)]
+        >>> tree = TMTree('root', [TMTree('a', leaves[:3]),
+        ...                        TMTree('b', leaves[3:])])
+        >>> tree.update_rectangles((0, 0, 100, 60))
+        >>> leaves[4].change_size(0.5)
+        >>> leaves[0].move(tree._subtrees[1])
+        >>> tree.update_changed_rectangles((0, 0, 100, 60))
+        >>> changed = [tree.data_size] + [t.rect for t in [tree] + leaves]
+        >>> tree.update_data_sizes()
+        24
+        >>> tree.update_rectangles((0, 0, 100, 60))
+        >>> changed == [tree.data_size] + [t.rect for t in [tree] + leaves]
+        True
+
+        The same holds for random sequences of changes, with either engine:
+
+        >>> import copy
+        >>> import random
+        >>> from layouts import SQUARIFIED
+        >>> rng = random.Random(148)
+        >>> rect = (0, 0, 300, 200)
+        >>> same = []
+        >>> for engine in [SLICE_AND_DICE, SQUARIFIED]:
+        ...     for _ in range(10):
+        ...         leaves = [TMTree(str(i), [], rng.randint(1, 50))
+        ...                   for i in range(12)]
+        ...         folders = [TMTree(name, leaves[4 * i:4 * i + 4])
+        ...                    for i, name in enumerate('acd')]
+        ...         tree = TMTree('root', [folders[0],
+        ...                                TMTree('b', folders[1:])])
+        ...         nodes = [tree] + folders + leaves
+        ...         tree.update_rectangles(rect, engine)
+        ...         for _ in range(8):
+        ...             for _ in range(5):
+        ...                 node = rng.choice(nodes)
+        ...                 action = rng.randrange(5)
+        ...                 if action == 0:
+        ...                     node.change_size(rng.uniform(-0.9, 0.9))
+        ...                 elif action == 1:
+        ...                     node.move(rng.choice(nodes))
+        ...                 elif action == 2:
+        ...                     node.expand()
+        ...                 elif action == 3:
+        ...                     node.expand_all()
+        ...                 else:
+        ...                     node.collapse()
+        ...             tree.update_changed_rectangles(rect, engine)
+        ...             expected = copy.deepcopy(tree)
+        ...             _ = expected.update_data_sizes()
+        ...             expected.update_rectangles(rect, engine)
+        ...             same.append(tree.get_rectangles()
+        ...                         == expected.get_rectangles())
+        >>> len(same), all(same)
+        (160, True)
+        """
+        self._layout_levels(rect, engine, True)
 
-        # base case
-        if self.is_empty():
-            return None
-        elif self._subtrees == []:
-            self.rect = rect
-            return None
-        # case vertical partition
-        self.rect = rect
-        x, y, width, height = rect
-        if width > height:
-            x_kept = x
-            for i in range(len(self._subtrees) - 1):
-                if self.data_size != 0:
-                    partiton = self._subtrees[i].data_size / self.data_size
-                else:
-                    partiton = 0
-                new_rect = x_kept, y, math.floor(width * partiton), height
-                # change x to new x_kept
-                x_kept += math.floor(width * partiton)
-                # recursive call on each subtree of subtree[i]
-                self._subtrees[i].update_rectangles(new_rect)
-            # last rectangle has leftover width/height
-            last_subtree = self._subtrees[len(self._subtrees) - 1]
-            new_rect = x_kept, y, x + width - x_kept, height
-            # recursive call on subtree of last subtree
-            last_subtree.update_rectangles(new_rect)
-            return None
-        # case horizontal partition
-        else:
-            self.rect = rect
-            y_kept = y
-            for i in range(len(self._subtrees) - 1):
-                if self.data_size != 0:
-                    partiton = self._subtrees[i].data_size / self.data_size
-                else:
-                    partiton = 0
-                new_rect = x, y_kept, width, math.floor(height * partiton)
-                # change y to new y_kept
-                y_kept += math.floor(height * partiton)
-                # recursive call on each subtree of subtree[i]
-                self._subtrees[i].update_rectangles(new_rect)
-            # last rectangle has leftover width/height
-            last_subtree = self._subtrees[len(self._subtrees) - 1]
-            new_rect = x, y_kept, width, y + height - y_kept
-            # recursive call on subtree of last subtree
-            last_subtree.update_rectangles(new_rect)
-            return None
+    def _layout_levels(self, rect: Tuple[int, int, int, int],
+                       engine: LayoutEngine, changed_only: bool) -> None:
+        """Set the rectangle of this tree to <rect>, and lay out its
+        descendents with <engine>, one level of the tree at a time.
 
-    def get_rectangles(self) -> List[Tuple[Tuple[int, int, int, int],
-                                           Tuple[int, int, int]]]:
+        If <changed_only>, skip every subtree whose rectangle stays the same
+        and that is not marked as changed.
+
+        Working breadth-first lets <engine> lay out all the trees of a level
+        at once, and does not recurse, so that very deep trees do not reach
+        the recursion limit.
+        """
+        trees, rects = [self], [rect]
+        visits = 0
+        while trees != []:
+            parents = []
+            for tree, tree_rect in zip(trees, rects):
+                if tree.is_empty() or (changed_only and not tree._dirty
+                                       and tree.rect == tree_rect):
+                    continue
+                tree.rect = tree_rect
+                tree._dirty = False
+                if tree._subtrees != []:
+                    parents.append(tree)
+            trees = [subtree for tree in parents for subtree in tree._subtrees]
+            visits += len(trees)
+            rects = engine.layout_level(
+                [tree.rect for tree in parents],
+                [len(tree._subtrees) for tree in parents],
+                [subtree.data_size for subtree in trees],
+                [tree.data_size for tree in parents])
+        if NODE_VISITS.enabled:
+            NODE_VISITS.count += visits
+
+    def get_rectangles(self, min_size: int = 0) \
+            -> List[Tuple[Tuple[int, int, int, int], Tuple[int, int, int]]]:
         """Return a list with tuples for every leaf in the displayed-tree
         rooted at this tree. Each tuple consists of a tuple that defines the
         appropriate pygame rectangle to display for a leaf, and the colour
         to fill it with.
+
+        If <min_size> is positive, only return the leaves of the
+        displayed-tree as it would be if every subtree whose rectangle is
+        less than <min_size> pixels wide or high were collapsed: such a
+        subtree is drawn as one rectangle of its own colour, instead of one
+        for each leaf it absorbs. Subtrees whose rectangle is empty are left
+        out altogether, as they would not be drawn.
+
+        >>> leaves = [TMTree(str(i), [], size) for i, size in
+        ...           enumerate([100, 1, 1])]
+        >>> tree = TMTree('root', [TMTree('big', leaves[:1]),
+        ...                        TMTree('small', leaves[1:])])
+        >>> tree.update_rectangles((0, 0, 102, 10))
+        >>> tree.expand_all()
+        >>> [rect for rect, _ in tree.get_rectangles()]
+        [(0, 0, 100, 10), (100, 0, 2, 5), (100, 5, 2, 5)]
+        >>> [rect for rect, _ in tree.get_rectangles(3)]
+        [(0, 0, 100, 10), (100, 0, 2, 10)]
         """
-        if self.is_empty() or self.data_size == 0:
-            return []
-        # base case displayed-tree's leave
-        elif not self._expanded or self._subtrees == []:
-            rect_color = self.rect, self._colour
-            return [rect_color]
-        # recursive case
-        else:
-            lst = []
-            for subtree in self._subtrees:
-                lst.extend(subtree.get_rectangles())
-            return lst
+        rectangles = []
+        for tree in self.get_displayed_leaves(min_size):
+            if tree.data_size != 0:
+                rectangles.append((tree.rect, tree._colour))
+        return rectangles
+
+    def get_rectangle_arrays(self, min_size: int = 0) -> np.ndarray:
+        """Return the rectangles and colours of get_rectangles(<min_size>)
+        as one contiguous array of shape (n, 7), with one row
+        (x, y, width, height, red, green, blue) per rectangle, in order.
+
+        >>> tree = TMTree('root', [TMTree('a', [], 1), TMTree('b', [], 3)])
+        >>> tree.update_rectangles((0, 0, 40, 10))
+        >>> tree.expand()
+        >>> arrays = tree.get_rectangle_arrays()
+        >>> arrays[:, :4]
+        array([[ 0,  0, 10, 10],
+               [10,  0, 30, 10]], dtype=int32)
+        >>> colours = [colour for _, colour in tree.get_rectangles()]
+        >>> [tuple(row[4:]) for row in arrays.tolist()] == colours
+        True
+        """
+        # NumPy converts a flat list of ints much faster than a list of tuples
+        values = []
+        for tree in self.get_displayed_leaves(min_size):
+            if tree.data_size != 0:
+                values += tree.rect
+                values += tree._colour
+        return np.array(values, dtype=np.int32).reshape(-1, 7)
+
+    def get_displayed_leaves(self, min_size: int = 0) -> List[TMTree]:
+        """Return every leaf in the displayed-tree rooted at this tree, in
+        order, including those whose data_size is 0.
+
+        If <min_size> is positive, stop at subtrees whose rectangle is less
+        than <min_size> pixels wide or high, and leave out those whose
+        rectangle is empty, as get_rectangles does.
+        """
+        leaves = []
+        stack = [self]
+        visits = 0
+        while stack != []:
+            tree = stack.pop()
+            if tree.is_empty():
+                continue
+            _, _, width, height = tree.rect
+            if min_size > 0 and (width == 0 or height == 0):
+                continue
+            elif not tree._expanded or tree._subtrees == [] \
+                    or width < min_size or height < min_size:
+                leaves.append(tree)
+            else:
+                stack.extend(reversed(tree._subtrees))
+                visits += len(tree._subtrees)
+        if NODE_VISITS.enabled:
+            NODE_VISITS.count += visits
+        return leaves
+
+    def count_leaves(self) -> int:
+        """Return the number of leaves in this tree, whether they are
+        displayed or not; e.g. the number of leaves absorbed by a subtree
+        that get_rectangles draws as a single rectangle.
+        """
+        count = 0
+        stack = [self]
+        visits = 0
+        while stack != []:
+            tree = stack.pop()
+            if tree._subtrees != []:
+                stack.extend(tree._subtrees)
+                visits += len(tree._subtrees)
+            elif not tree.is_empty():
+                count += 1
+        if NODE_VISITS.enabled:
+            NODE_VISITS.count += visits
+        return count
 
     def get_tree_at_position(self, pos: Tuple[int, int]) -> Optional[TMTree]:
         """Return the leaf in the displayed-tree rooted at this tree whose
@@ -214,7 +402,7 @@ class TMTree:
             x, y, width, height = rect.rect
             assert isinstance(height, int)
             # if point on right or bottom edge
-            if x_in == x + width or y_in == y + width:
+            if x_in == x + width or y_in == y + height:
                 lst2.append(rect)
         if len(lst2) == 1:
             return lst2[0]
@@ -226,7 +414,7 @@ class TMTree:
             dist_origin_lst = []
             for rect in lst2:
                 x, y, width, height = rect.rect
-                dist_origin_lst.append(x ^ 2 + y ^ 2)
+                dist_origin_lst.append(x ** 2 + y ** 2)
             return lst2[dist_origin_lst.index(min(dist_origin_lst))]
         # if not tie at lst2
         else:
@@ -235,7 +423,7 @@ class TMTree:
             assert len(lst) >= 1
             for rect in lst:
                 x, y, width, height = rect.rect
-                dist_origin_lst.append(x ^ 2 + y ^ 2)
+                dist_origin_lst.append(x ** 2 + y ** 2)
             return lst[dist_origin_lst.index(min(dist_origin_lst))]
 
     def update_data_sizes(self) -> int:
@@ -258,16 +446,17 @@ class TMTree:
     def move(self, destination: TMTree) -> None:
         """If this tree is a leaf, and <destination> is not a leaf, move this
         tree to be the last subtree of <destination>. Otherwise, do nothing.
+
+        The data_size of the old and new ancestors of this tree is updated,
+        and they are marked for update_changed_rectangles.
         """
         # if destination is empty or is a leaf
         if not destination.is_empty() and destination._subtrees != [] \
-                and self._subtrees == []:
-            destination._subtrees.append(self)
+                and self._subtrees == [] and self._parent_tree is not None:
             # remove it from its origin parent
-            self._parent_tree._subtrees.remove(self)
+            self._parent_tree._remove_subtree(self)
             # assign new parent to destination
-            self._parent_tree.data_size -= self.data_size
-            self._parent_tree = destination
+            destination._add_subtree(self)
             return None
         else:
             return None
@@ -276,7 +465,8 @@ class TMTree:
         """Change the value of this tree's data_size attribute by <factor>.
 
         Always round up the amount to change, so that it's an int, and
-        some change is made.
+        some change is made. The data_size of this tree's ancestors is
+        updated, and they are marked for update_changed_rectangles.
 
         Do nothing if this tree is not a leaf.
         """
@@ -288,10 +478,9 @@ class TMTree:
             amount = math.ceil(abs(self.data_size * factor))
             if factor < 0:
                 amount = -1 * amount
-            # temp = self.data_size
-            self.data_size += amount
-            if self.data_size < 1:
-                self.data_size = 1
+            # the size cannot go below 1
+            amount = max(amount, 1 - self.data_size)
+            self._add_to_size(amount)
             return None
         else:
             return None
@@ -363,15 +552,53 @@ class TMTree:
         """
         Change expanded to False for this tree and all its subtrees
         """
-        if self.is_empty():
-            return None
-        elif self._subtrees == []:
-            return None
-        else:
+        stack = [self]
+        visits = 0
+        while stack != []:
+            tree = stack.pop()
+            if tree._subtrees != []:
+                tree._expanded = False
+                stack.extend(tree._subtrees)
+                visits += len(tree._subtrees)
+        if NODE_VISITS.enabled:
+            NODE_VISITS.count += visits
+
+    def _add_to_size(self, amount: int) -> None:
+        """Add <amount> to the data_size of this tree and of each of its
+        ancestors, and mark them as changed since their rectangles were last
+        updated.
+        """
+        tree = self
+        visits = -1
+        while tree is not None:
+            tree.data_size += amount
+            tree._dirty = True
+            tree = tree._parent_tree
+            visits += 1
+        if NODE_VISITS.enabled:
+            NODE_VISITS.count += visits
+
+    def _add_subtree(self, subtree: TMTree) -> None:
+        """Add <subtree> as the last subtree of this tree, and update the
+        data_size of this tree and of its ancestors.
+
+        Precondition: <subtree> has no parent tree.
+        """
+        self._subtrees.append(subtree)
+        subtree._parent_tree = self
+        self._add_to_size(subtree.data_size)
+
+    def _remove_subtree(self, subtree: TMTree) -> None:
+        """Remove <subtree> from the subtrees of this tree, and update the
+        data_size of this tree and of its ancestors.
+
+        Precondition: <subtree> is in self._subtrees.
+        """
+        self._subtrees.remove(subtree)
+        subtree._parent_tree = None
+        if self._subtrees == []:
             self._expanded = False
-            for subtrees in self._subtrees:
-                subtrees._collapse_root()
-            return None
+        self._add_to_size(-subtree.data_size)
 
     # Methods for the string representation
     def get_path_string(self, final_node: bool = True) -> str:
@@ -460,6 +687,7 @@ if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
         'allowed-import-modules': [
-            'python_ta', 'typing', 'math', 'random', 'os', '__future__'
+            'python_ta', 'typing', 'math', 'random', 'os', 'layouts', 'numpy',
+            '__future__'
         ]
     })
@@ -1,7 +1,22 @@
-from typing import Optional, Tuple
+from __future__ import annotations
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
 import pygame
-from tm_trees import TMTree, FileSystemTree
-from papers import PaperTree
+from tm_trees import TMTree
+from papers import PaperTable, BY_YEAR, BY_CATEGORY, \
+    build_compact_paper_tree
+from fs_scanner import FileSystemScanner
+from fs_watch import FileSystemWatcher
+from lazy_fs import LazyFileSystemTree, SizeAggregator
+from background_scan import BackgroundScan
+from du_import import import_dump
+from layouts import LayoutEngine, SLICE_AND_DICE
+from spatial_index import SpatialIndex
+from surface_fill import fill_rectangles
+from profiling import Profiler, no_phase
+from snapshot import load_snapshot, save_snapshot
 
 
 # Screen dimensions and coordinates
@@ -15,31 +30,101 @@ TREEMAP_HEIGHT = HEIGHT - FONT_HEIGHT  # The height of the treemap display.
 # Font to use for the treemap program.
 FONT_FAMILY = 'Consolas'
 
-
-def run_visualisation(tree: TMTree) -> None:
-    """Display an interactive graphical display of the given tree's treemap.
+# The width, in pixels, of the outline of the selected and hovered rectangles.
+SELECTED_WIDTH = 5
+HOVER_WIDTH = 2
+
+# The size, in pixels, below which TreemapRenderer draws a subtree as a single
+# rectangle. At 1, only subtrees that would not be drawn at all are skipped.
+DETAIL_SIZE = 1
+
+# The largest number of frames drawn per second when none is given.
+DEFAULT_FPS = 60
+
+# The number of most recent frames whose times a FrameTimer keeps.
+RECENT_FRAMES = 1000
+
+# The environment variable that turns profiling on when it holds the path of
+# the file to write the statistics to.
+PROFILE_VARIABLE = 'TREEMAP_PROFILE'
+
+# The grouping keys of the views of the papers data that the 'v' key cycles
+# through, starting with the first.
+PAPER_VIEWS = (BY_YEAR, BY_CATEGORY, ('top_category', 'year', 'subcategory'),
+               ('author',))
+
+# The fonts loaded by _get_font, keyed by their size.
+_FONTS: Dict[int, pygame.font.Font] = {}
+
+
+def run_visualisation(tree: TMTree,
+                      watcher: Optional[Union[FileSystemWatcher,
+                                              SizeAggregator,
+                                              BackgroundScan]] = None,
+                      engine: LayoutEngine = SLICE_AND_DICE,
+                      fps: int = DEFAULT_FPS,
+                      profile_path: Optional[str] = None,
+                      next_view: Optional[Callable[[], TMTree]] = None) \
+        -> FrameTimer:
+    """Display an interactive graphical display of the given tree's treemap,
+    laid out with <engine> and drawn at most <fps> times per second. Return
+    the time taken by each frame once the window is closed.
+
+    If <watcher> is given, use it to keep the tree up to date with the file
+    system while it is displayed, to give the folders of a
+    LazyFileSystemTree their final sizes as they are computed, or to add the
+    results of a BackgroundScan to the tree as they arrive.
+
+    If <profile_path> is given, or else if the environment variable
+    PROFILE_VARIABLE is set to a path, profile the visualiser and the main
+    methods of the tree, and write the statistics to that path as JSON once
+    the window is closed. Without it, nothing is profiled.
+
+    If <next_view> is given, pressing 'v' replaces the displayed tree with
+    the tree it returns.
     """
+    if profile_path is None:
+        profile_path = os.environ.get(PROFILE_VARIABLE)
+    profiler = None
+    if profile_path:
+        profiler = Profiler()
+        profiler.instrument(type(tree))
 
     # Setup pygame
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
 
     # Render the initial display of the static treemap.
-    render_display(screen, tree, None, None)
-    tree.update_rectangles((0, 0, WIDTH, HEIGHT - FONT_HEIGHT))
+    render_display(screen, tree, None, None,
+                   status=watcher.status() if watcher is not None else '')
+    tree.update_rectangles((0, 0, WIDTH, HEIGHT - FONT_HEIGHT), engine)
 
     # Start an event loop to respond to events.
-    event_loop(screen, tree)
+    try:
+        return event_loop(screen, tree, watcher, engine, fps, profiler,
+                          next_view)
+    finally:
+        if profiler is not None:
+            profiler.uninstrument()
+            profiler.dump(profile_path)
 
 
 def render_display(screen: pygame.Surface, tree: Optional[TMTree],
                    selected_node: Optional[TMTree],
-                   hover_node: Optional[TMTree]) -> None:
+                   hover_node: Optional[TMTree],
+                   profiler: Optional[Profiler] = None,
+                   status: str = '') -> None:
     """Render a treemap and text display to the given screen.
 
     Use the constants TREEMAP_HEIGHT and FONT_HEIGHT to divide the
-    screen vertically into the treemap and text comments.
+    screen vertically into the treemap and text comments. If <status> is
+    not empty, e.g. the progress of a scan, show it in the text display.
+
+    If <profiler> is given, record the time taken to draw the rectangles
+    and the text display in it.
     """
+    phase = profiler.phase if profiler is not None else no_phase
+
     # First, clear the screen
     pygame.draw.rect(screen, pygame.color.THECOLORS['black'],
                      (0, 0, WIDTH, HEIGHT))
@@ -47,18 +132,23 @@ def render_display(screen: pygame.Surface, tree: Optional[TMTree],
     subscreen = screen.subsurface((0, 0, WIDTH, TREEMAP_HEIGHT))
 
     # TODO: Uncomment this afer you have completed Task 2
-    for rect, colour in tree.get_rectangles():
-        # Note that the arguments are in the opposite order
-        pygame.draw.rect(subscreen, colour, rect)
+    with phase('render_display.rectangles'):
+        for rect, colour in tree.get_rectangles():
+            # Note that the arguments are in the opposite order
+            pygame.draw.rect(subscreen, colour, rect)
 
     # add the hover rectangle
     if selected_node is not None:
-        pygame.draw.rect(subscreen, (255, 255, 255), selected_node.rect, 5)
+        pygame.draw.rect(subscreen, (255, 255, 255), selected_node.rect,
+                         SELECTED_WIDTH)
     if hover_node is not None:
-        pygame.draw.rect(subscreen, (255, 255, 255), hover_node.rect, 2)
+        pygame.draw.rect(subscreen, (255, 255, 255), hover_node.rect,
+                         HOVER_WIDTH)
 
     # TODO: Uncomment this after you have completed Task 2
-    _render_text(screen, _get_display_text(selected_node))
+    with phase('render_display.text'):
+        _render_text(screen, _with_status(_get_display_text(selected_node),
+                                          status))
 
     # This must be called *after* all other pygame functions have run.
     pygame.display.flip()
@@ -68,7 +158,7 @@ def _render_text(screen: pygame.Surface, text: str) -> None:
     """Render text at the bottom of the display.
     """
     # The font we want to use
-    font = pygame.font.SysFont(FONT_FAMILY, FONT_HEIGHT - 8)
+    font = _get_font()
     text_surface = font.render(text, 1, pygame.color.THECOLORS['white'])
 
     # Where to render the text_surface
@@ -76,78 +166,451 @@ def _render_text(screen: pygame.Surface, text: str) -> None:
     screen.blit(text_surface, text_pos)
 
 
-def event_loop(screen: pygame.Surface, tree: TMTree) -> None:
+def _with_status(text: str, status: str) -> str:
+    """Return <text> followed by <status> in brackets, or only <text> if
+    <status> is empty.
+
+    >>> _with_status('home  (12)', 'scanning: 3 of 9 folders, 20 files')
+    'home  (12)   [scanning: 3 of 9 folders, 20 files]'
+    """
+    if status == '':
+        return text
+    return '{}   [{}]'.format(text, status)
+
+
+def _get_font() -> pygame.font.Font:
+    """Return the font of the text display, which is loaded only once.
+    """
+    size = FONT_HEIGHT - 8
+    if size not in _FONTS:
+        _FONTS[size] = pygame.font.SysFont(FONT_FAMILY, size)
+    return _FONTS[size]
+
+
+class TreemapRenderer:
+    """A renderer that draws a treemap and its text display to a screen,
+    redrawing only what changed since the last frame.
+
+    The rectangles of the treemap are written to the pixels of an off-screen
+    surface all at once with fill_rectangles. The surface is drawn again
+    only after invalidate is called, i.e. after the layout, the expanded
+    state or the sizes of the tree change. The outlines of the selected and
+    hovered rectangles are drawn over a copy of it on the screen. When they
+    move, only the areas they covered are restored from the off-screen
+    surface. The text display is rendered again only when its text changes.
+
+    Subtrees whose rectangle is less than <min_size> pixels wide or high
+    are drawn as a single rectangle, so that the time taken to draw the
+    treemap depends on the size of the screen rather than that of the tree.
+
+    === Public Attributes ===
+    screen:
+        The surface that the treemap and the text display are drawn to.
+    min_size:
+        The size passed to get_rectangles when the treemap is drawn.
+    overlay:
+        Text shown in the text display after that of the selected node, such
+        as the progress of a scan or a summary of a Profiler.
+
+    === Private Attributes ===
+    _treemap:
+        The off-screen copy of the treemap, without outlines.
+    _stale:
+        True iff <_treemap> must be drawn again before it is shown.
+    _outlines:
+        The areas of <screen> covered by outlines in the last frame.
+    _selected_node:
+        The selected node in the last frame.
+    _hover_node:
+        The hovered node in the last frame.
+    _text:
+        The text shown by the text display in the last frame, or None if
+        nothing has been shown yet.
+    _text_surface:
+        The rendered <_text>.
+
+    === Representation Invariants ===
+    - _text_surface is None iff _text is None
+    """
+
+    screen: pygame.Surface
+    min_size: int
+    overlay: str
+    _treemap: pygame.Surface
+    _stale: bool
+    _outlines: List[pygame.Rect]
+    _selected_node: Optional[TMTree]
+    _hover_node: Optional[TMTree]
+    _text: Optional[str]
+    _text_surface: Optional[pygame.Surface]
+
+    def __init__(self, screen: pygame.Surface,
+                 min_size: int = DETAIL_SIZE) -> None:
+        """Initialize a new renderer that draws to <screen>, drawing
+        subtrees less than <min_size> pixels wide or high as one rectangle.
+        """
+        self.screen = screen
+        self.min_size = min_size
+        self.overlay = ''
+        self._treemap = pygame.Surface((WIDTH, TREEMAP_HEIGHT), depth=32)
+        self._stale = True
+        self._outlines = []
+        self._selected_node = None
+        self._hover_node = None
+        self._text = None
+        self._text_surface = None
+
+    def invalidate(self) -> None:
+        """Record that the rectangles of the tree changed, so that the whole
+        treemap is drawn again by the next call to render.
+        """
+        self._stale = True
+
+    def render(self, tree: TMTree, selected_node: Optional[TMTree],
+               hover_node: Optional[TMTree]) -> List[pygame.Rect]:
+        """Update the display to show the treemap of <tree> with the given
+        selected and hovered nodes, like render_display, and return the
+        areas of the screen that were updated.
+
+        Return an empty list, and draw nothing, if nothing changed since
+        the last frame.
+        """
+        text = _with_status(_get_display_text(selected_node), self.overlay)
+        if not self._stale and selected_node is self._selected_node \
+                and hover_node is self._hover_node and text == self._text:
+            return []
+
+        if self._stale:
+            self._treemap.fill(pygame.color.THECOLORS['black'])
+            fill_rectangles(self._treemap,
+                            tree.get_rectangle_arrays(self.min_size))
+            self.screen.fill(pygame.color.THECOLORS['black'])
+            self.screen.blit(self._treemap, ORIGIN)
+            dirty = [self.screen.get_rect()]
+            self._stale = False
+            self._text = None
+        else:
+            # erase the outlines of the last frame
+            dirty = self._outlines
+            for area in dirty:
+                self.screen.blit(self._treemap, area, area)
+
+        self._outlines = []
+        for node, width in ((selected_node, SELECTED_WIDTH),
+                            (hover_node, HOVER_WIDTH)):
+            if node is not None:
+                pygame.draw.rect(self.screen, (255, 255, 255), node.rect,
+                                 width)
+                self._outlines.extend(self._outline_areas(node.rect, width))
+        dirty.extend(self._outlines)
+        self._selected_node = selected_node
+        self._hover_node = hover_node
+
+        if text != self._text:
+            self._text = text
+            self._text_surface = _get_font().render(
+                text, 1, pygame.color.THECOLORS['white'])
+            text_area = pygame.Rect(0, TREEMAP_HEIGHT, WIDTH, FONT_HEIGHT)
+            self.screen.fill(pygame.color.THECOLORS['black'], text_area)
+            self.screen.blit(self._text_surface,
+                             (0, HEIGHT - FONT_HEIGHT + 4))
+            dirty.append(text_area)
+
+        pygame.display.update(dirty)
+        return dirty
+
+    def _outline_areas(self, rect: Tuple[int, int, int, int],
+                       width: int) -> List[pygame.Rect]:
+        """Return the areas of the treemap covered by an outline of <width>
+        pixels drawn inside <rect>: one strip along each side.
+        """
+        x, y, rect_width, rect_height = rect
+        bounds = self._treemap.get_rect()
+        return [pygame.Rect(x, y, rect_width, width).clip(bounds),
+                pygame.Rect(x, y + rect_height - width, rect_width,
+                            width).clip(bounds),
+                pygame.Rect(x, y, width, rect_height).clip(bounds),
+                pygame.Rect(x + rect_width - width, y, width,
+                            rect_height).clip(bounds)]
+
+
+class FrameTimer:
+    """A record of the time taken by the frames of the event loop, from the
+    moment its events arrive until the display is updated, to check that the
+    visualisation responds within its frame budget.
+
+    === Public Attributes ===
+    budget:
+        The number of seconds that a frame may take.
+    frames:
+        The number of frames recorded.
+    total:
+        The total number of seconds taken by the frames recorded.
+    worst:
+        The number of seconds taken by the slowest frame recorded.
+    over_budget:
+        The number of frames recorded that took longer than <budget>.
+
+    === Private Attributes ===
+    _recent:
+        The number of seconds taken by each of the last RECENT_FRAMES frames
+        recorded.
+
+    === Representation Invariants ===
+    - budget > 0
+    - 0 <= over_budget <= frames
+    - len(_recent) == min(frames, RECENT_FRAMES)
+    """
+
+    budget: float
+    frames: int
+    total: float
+    worst: float
+    over_budget: int
+    _recent: Deque[float]
+
+    def __init__(self, fps: int = DEFAULT_FPS) -> None:
+        """Initialize a new empty timer for frames drawn <fps> times per
+        second.
+        """
+        self.budget = 1 / fps
+        self.frames = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.over_budget = 0
+        self._recent = deque(maxlen=RECENT_FRAMES)
+
+    def __str__(self) -> str:
+        """Return a summary of the frames recorded.
+
+        >>> timer = FrameTimer(50)
+        >>> for seconds in [0.01, 0.01, 0.03, 0.01]:
+        ...     timer.record(seconds)
+        >>> print(timer)
+        4 frames: mean 15.0ms, 95th percentile 30.0ms, worst 30.0ms, \
+1 over the 20.0ms budget
+        """
+        mean = self.total / self.frames if self.frames else 0.0
+        return '{} frames: mean {:.1f}ms, 95th percentile {:.1f}ms, ' \
+            'worst {:.1f}ms, {} over the {:.1f}ms budget'.format(
+                self.frames, mean * 1000, self.percentile(0.95) * 1000,
+                self.worst * 1000, self.over_budget, self.budget * 1000)
+
+    def record(self, seconds: float) -> None:
+        """Record a frame that took <seconds>.
+        """
+        self.frames += 1
+        self.total += seconds
+        self.worst = max(self.worst, seconds)
+        if seconds > self.budget:
+            self.over_budget += 1
+        self._recent.append(seconds)
+
+    def percentile(self, fraction: float) -> float:
+        """Return the number of seconds within which <fraction> of the
+        recent frames were drawn, or 0.0 if no frames were recorded.
+
+        Precondition: 0 <= fraction <= 1
+        """
+        if not self._recent:
+            return 0.0
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def event_loop(screen: pygame.Surface, tree: TMTree,
+               watcher: Optional[Union[FileSystemWatcher,
+                                       SizeAggregator,
+                                       BackgroundScan]] = None,
+               engine: LayoutEngine = SLICE_AND_DICE,
+               fps: int = DEFAULT_FPS,
+               profiler: Optional[Profiler] = None,
+               next_view: Optional[Callable[[], TMTree]] = None) \
+        -> FrameTimer:
     """Respond to events (mouse clicks, key presses) and update the display.
 
     Note that the event loop is an *infinite loop*: it continually waits for
     the next event, determines the event's type, and then updates the state
     of the visualisation or the tree itself, updating the display if necessary.
-    This loop ends only when the user closes the window.
+    This loop ends only when the user closes the window, and returns the
+    time taken by each frame.
+
+    The loop sleeps while there are no events. All the events that arrived
+    since the last frame are handled together: the mouse position is read
+    once per frame, and the rectangles are updated once per frame however
+    many resizes and moves there were. The display is drawn at most <fps>
+    times per second.
+
+    If <watcher> is given, poll it every <watcher.interval> seconds and
+    update the rectangles of the trees it changed, and show its status in
+    the text display. The treemap is laid out with <engine>.
+
+    The leaf under the mouse is found with a SpatialIndex, and the display
+    is drawn by a TreemapRenderer. Both are updated in full only after the
+    rectangles or the expanded state of the tree change, and the index is
+    only rebuilt once a click, a move or the hovered leaf needs it.
+
+    If <profiler> is given, record the time taken by each phase of every
+    frame in it, and show the busiest phases in the text display.
+
+    If <next_view> is given, pressing 'v' replaces the displayed tree with
+    the tree it returns, keeping its rectangles if they are up to date.
     """
     selected_node = None
+    last_poll = pygame.time.get_ticks()
+    index = None
+    hover_pos = None
+    hover_node = None
+    renderer = TreemapRenderer(screen)
+    clock = pygame.time.Clock()
+    timer = FrameTimer(fps)
+    phase = profiler.phase if profiler is not None else no_phase
+    last_summary = pygame.time.get_ticks()
+    status = watcher.status() if watcher is not None else ''
+    summary = ''
+
+    def current_index() -> SpatialIndex:
+        """Return the index of the displayed leaves, building it if the
+        leaves changed since it was last built.
+        """
+        nonlocal index
+        if index is None:
+            with phase('index'):
+                index = SpatialIndex(tree)
+        return index
 
     while True:
-        # Wait for an event
-        event = pygame.event.poll()
-        if event.type == pygame.QUIT:
-            return
-
-        # get the hover position and the corresponding node
-        hover_node = tree.get_tree_at_position(pygame.mouse.get_pos())
-
-        if event.type == pygame.MOUSEBUTTONUP:
-            selected_node = \
-                _handle_click(event.button, event.pos, tree, selected_node)
-
-        elif event.type == pygame.KEYUP and selected_node is not None:
-            if event.key == pygame.K_UP:
-                pass
-                # TODO: Uncomment once you have completed Task 4
-                selected_node.change_size(0.01)
-                tree.update_data_sizes()
-                tree.update_rectangles((0, 0, WIDTH, HEIGHT - FONT_HEIGHT))
-
-            elif event.key == pygame.K_DOWN:
-                pass
-                # TODO: Uncomment once you have completed Task 4
-                selected_node.change_size(-0.01)
-                tree.update_data_sizes()
-                tree.update_rectangles((0, 0, WIDTH, HEIGHT - FONT_HEIGHT))
-
-            elif event.key == pygame.K_m:
-                pass
-                # TODO: Uncomment once you have completed Task 4
-                selected_node.move(hover_node)
-                tree.update_data_sizes()
-                tree.update_rectangles((0, 0, WIDTH, HEIGHT - FONT_HEIGHT))
-
-            elif event.key == pygame.K_e:
-                pass
-                # TODO: Uncomment once you have completed Task 5
-                selected_node.expand()
-
-            elif event.key == pygame.K_a:
-                pass
-                # TODO: Uncomment once you have completed Task 5
-                selected_node.expand_all()
-
-            elif event.key == pygame.K_c:
-                pass
-                # TODO: Uncomment once you have completed Task 5
-                selected_node.collapse()
-
-            elif event.key == pygame.K_x:
-                pass
-                # TODO: Uncomment once you have completed Task 5
-                selected_node.collapse_all()
-
-        # Update display
-        render_display(screen, tree, selected_node, hover_node)
-
-
-def _handle_click(button: int, pos: Tuple[int, int], tree: TMTree,
+        # Wait for an event, or until the next poll of the watcher
+        if watcher is None:
+            timeout = 0
+        else:
+            timeout = max(1, int(last_poll + watcher.interval * 1000
+                                 - pygame.time.get_ticks()))
+        events = [pygame.event.wait(timeout)] + pygame.event.get()
+        start = time.perf_counter()
+        relayout = False
+
+        with phase('events'):
+            for event in events:
+                if event.type == pygame.QUIT:
+                    return timer
+
+                # the rectangles are only updated once all events are
+                # handled, so the index matches what is on the screen
+                if event.type == pygame.MOUSEBUTTONUP:
+                    selected_node = _handle_click(event.button, event.pos,
+                                                  current_index(),
+                                                  selected_node)
+
+                elif event.type == pygame.KEYUP and event.key == pygame.K_v \
+                        and next_view is not None:
+                    with phase('view'):
+                        tree = next_view()
+                        # lay the new view out at once, so that the events
+                        # after this one in the batch hit its leaves
+                        tree.update_changed_rectangles(
+                            (0, 0, WIDTH, HEIGHT - FONT_HEIGHT), engine)
+                    selected_node = None
+                    index = None
+                    renderer.invalidate()
+
+                elif event.type == pygame.KEYUP and selected_node is not None:
+                    if event.key == pygame.K_UP:
+                        pass
+                        # TODO: Uncomment once you have completed Task 4
+                        selected_node.change_size(0.01)
+                        relayout = True
+
+                    elif event.key == pygame.K_DOWN:
+                        pass
+                        # TODO: Uncomment once you have completed Task 4
+                        selected_node.change_size(-0.01)
+                        relayout = True
+
+                    elif event.key == pygame.K_m:
+                        pass
+                        # TODO: Uncomment once you have completed Task 4
+                        destination = current_index().get_tree_at_position(
+                            pygame.mouse.get_pos())
+                        if destination is not None:
+                            selected_node.move(destination)
+                            relayout = True
+
+                    elif event.key == pygame.K_e:
+                        pass
+                        # TODO: Uncomment once you have completed Task 5
+                        selected_node.expand()
+                        # a lazy tree lists the folder on its first expand
+                        relayout = True
+
+                    elif event.key == pygame.K_a:
+                        pass
+                        # TODO: Uncomment once you have completed Task 5
+                        selected_node.expand_all()
+                        relayout = True
+
+                    elif event.key == pygame.K_c:
+                        pass
+                        # TODO: Uncomment once you have completed Task 5
+                        selected_node.collapse()
+
+                    elif event.key == pygame.K_x:
+                        pass
+                        # TODO: Uncomment once you have completed Task 5
+                        selected_node.collapse_all()
+
+                    # every key above may change the displayed leaves
+                    index = None
+                    renderer.invalidate()
+
+        # apply the changes made to the file system since the last poll
+        if watcher is not None and \
+                pygame.time.get_ticks() - last_poll >= watcher.interval * 1000:
+            last_poll = pygame.time.get_ticks()
+            with phase('watcher'):
+                changes = watcher.poll()
+                status = watcher.status()
+            if changes:
+                relayout = True
+                if selected_node is not None and \
+                        not watcher.is_attached(selected_node):
+                    selected_node = None
+
+        if relayout:
+            with phase('relayout'):
+                tree.update_changed_rectangles(
+                    (0, 0, WIDTH, HEIGHT - FONT_HEIGHT), engine)
+            index = None
+            renderer.invalidate()
+
+        # get the hover position and the corresponding node, unless neither
+        # the mouse nor the displayed leaves moved
+        if index is None or pygame.mouse.get_pos() != hover_pos:
+            hover_pos = pygame.mouse.get_pos()
+            hover_index = current_index()
+            with phase('hit_test'):
+                hover_node = hover_index.get_tree_at_position(hover_pos)
+
+        # show the busiest phases in the text display, once per second
+        if profiler is not None \
+                and pygame.time.get_ticks() - last_summary >= 1000:
+            last_summary = pygame.time.get_ticks()
+            summary = profiler.summary()
+        renderer.overlay = '  '.join(text for text in (status, summary)
+                                     if text != '')
+
+        # Update display, unless nothing changed
+        with phase('render'):
+            dirty = renderer.render(tree, selected_node, hover_node)
+        if dirty:
+            timer.record(time.perf_counter() - start)
+            clock.tick(fps)
+
+
+def _handle_click(button: int, pos: Tuple[int, int], index: SpatialIndex,
                   old_selected_leaf: Optional[TMTree]) -> Optional[TMTree]:
-    """Return the new selection after handling the mouse event.
+    """Return the new selection after handling the mouse event, using
+    <index> to find the leaf that was clicked.
 
     We need to use old_selected_leaf to handle the case when the selected
     leaf is left-clicked again.
@@ -157,7 +620,7 @@ def _handle_click(button: int, pos: Tuple[int, int], tree: TMTree,
 
     # left mouse click
     if button == 1:
-        selected_leaf = tree.get_tree_at_position(pos)
+        selected_leaf = index.get_tree_at_position(pos)
         if selected_leaf is None:
             return old_selected_leaf
         elif selected_leaf is old_selected_leaf:
@@ -178,30 +641,128 @@ def _get_display_text(leaf: Optional[TMTree]) -> str:
         return leaf.get_path_string() + '  ({})'.format(leaf.data_size)
 
 
-def run_treemap_file_system(path: str) -> None:
-    """Run a treemap visualisation for the given path's file structure.
+def run_treemap_file_system(path: str,
+                            scanner: Optional[FileSystemScanner] = None,
+                            watch: bool = False, compact: bool = False,
+                            engine: LayoutEngine = SLICE_AND_DICE,
+                            snapshot: Optional[str] = None,
+                            lazy: bool = False,
+                            progressive: bool = False) -> FrameTimer:
+    """Run a treemap visualisation for the given path's file structure, and
+    return the time taken by each frame once the window is closed.
+
+    Use <scanner> to read the file structure if it is given, e.g. to reuse a
+    ScanIndex from an earlier run, or to prune it; it is also used to list
+    folders in every mode below. If <watch> is True, keep the treemap up to
+    date with changes made to the file structure while it is displayed.
+    If <compact> is True, store the tree in a CompactTreeStore, which uses
+    much less memory for very large file structures. Lay the treemap out
+    with <engine>.
+
+    If <snapshot> is the path of an existing snapshot file, display the tree
+    saved in it instead of scanning <path>. If it is the path of a file that
+    does not exist yet, save the scanned tree to it first.
+
+    If <lazy> is True, build a LazyFileSystemTree instead of scanning the
+    whole of <path>: folders are only read when they are first expanded,
+    and their sizes are added up in the background and shown as they
+    arrive.
+
+    If <progressive> is True and <path> is a folder, scan it with a
+    BackgroundScan, and show the tree as soon as the window opens: folders
+    are added as they are read, top levels first, and the progress of the
+    scan is shown in the text display until it is done.
 
     Precondition: <path> is a valid path to a file or folder.
+    Precondition: <watch> and <compact> are not both True.
+    Precondition: <watch> is False if <snapshot> is an existing file.
+    Precondition: if <lazy> or <progressive> is True, then <watch>,
+    <compact> and <snapshot> are not given, and they are not both True.
+    """
+    if scanner is None:
+        scanner = FileSystemScanner()
+    if progressive and os.path.isdir(path):
+        scan = BackgroundScan(path, scanner=scanner)
+        return run_visualisation(scan.tree, scan, engine)
+    if lazy:
+        lazy_tree = LazyFileSystemTree(path, SizeAggregator(scanner=scanner))
+        return run_visualisation(lazy_tree, lazy_tree.aggregator, engine)
+    if snapshot is not None and os.path.exists(snapshot):
+        return run_visualisation(load_snapshot(snapshot), engine=engine)
+    if compact:
+        file_tree = scanner.scan_compact(path)
+    else:
+        file_tree = scanner.scan(path)
+    if snapshot is not None:
+        save_snapshot(file_tree, snapshot)
+    if watch:
+        return run_visualisation(
+            file_tree, FileSystemWatcher(file_tree, path, scanner=scanner),
+            engine)
+    return run_visualisation(file_tree, engine=engine)
+
+
+def run_treemap_dump(path: str, dump_format: Optional[str] = None,
+                     engine: LayoutEngine = SLICE_AND_DICE) -> FrameTimer:
+    """Run a treemap visualisation for the file structure described by the
+    du, find or ncdu dump at <path>, of <dump_format> if it is given, as in
+    import_dump, laid out with <engine>.
+
+    The file structure itself is never read, so the dump may come from
+    another machine. Return the time taken by each frame once the window is
+    closed.
     """
-    file_tree = FileSystemTree(path)
-    run_visualisation(file_tree)
+    return run_visualisation(import_dump(path, dump_format), engine=engine)
 
 
-def run_treemap_papers() -> None:
-    """Run a treemap visualization for CS Education research papers data.
+def run_treemap_papers(compact: bool = False,
+                       engine: LayoutEngine = SLICE_AND_DICE,
+                       snapshot: Optional[str] = None) -> FrameTimer:
+    """Run a treemap visualization for CS Education research papers data,
+    laid out with <engine>, and return the time taken by each frame once the
+    window is closed.
 
     You can try changing the value of the named argument by_year, but the
-    others should stay the same.
+    others should stay the same. If <compact> is True, store the tree in a
+    CompactTreeStore instead of creating a PaperTree for every paper.
+
+    Otherwise, the data is read once into a PaperTable, and pressing 'v'
+    switches to the next of PAPER_VIEWS.
+
+    If <snapshot> is the path of an existing snapshot file, display the tree
+    saved in it instead of reading the data. If it is the path of a file
+    that does not exist yet, save the tree grouped by year to it first.
     """
-    paper_tree = PaperTree('CS1', [], all_papers=True, by_year=True)
-    run_visualisation(paper_tree)
+    if snapshot is not None and os.path.exists(snapshot):
+        return run_visualisation(load_snapshot(snapshot), engine=engine)
+    if compact:
+        paper_tree = build_compact_paper_tree('CS1', by_year=True)
+        if snapshot is not None:
+            save_snapshot(paper_tree, snapshot)
+        return run_visualisation(paper_tree, engine=engine)
+    table = PaperTable('CS1', cache_size=len(PAPER_VIEWS))
+    views = deque(PAPER_VIEWS)
+    if snapshot is not None:
+        save_snapshot(table.tree(views[0]), snapshot)
+
+    def next_view() -> TMTree:
+        """Return the tree of the next view of the papers data."""
+        views.rotate(-1)
+        return table.tree(views[0])
+
+    return run_visualisation(table.tree(views[0]), engine=engine,
+                             next_view=next_view)
 
 
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
         'allowed-import-modules': [
-            'python_ta', 'typing', 'pygame', 'tm_trees', 'papers'
+            'python_ta', 'typing', 'pygame', 'tm_trees', 'papers',
+            'fs_scanner', 'fs_watch', 'lazy_fs', 'background_scan',
+            'du_import', 'layouts', 'spatial_index', 'surface_fill',
+            'profiling', 'snapshot', 'os', 'time', 'collections',
+            '__future__'
         ],
         'generated-members': 'pygame.*'
     })